@@ -0,0 +1,148 @@
+import argparse
+import contextlib
+import io
+import json
+import subprocess
+import time
+
+import pandas as pd
+
+from src.config import BENCH_DIR, BENCH_RESULTS_PATH, OUTPUT_FORMAT, TRANSFORM_WORKERS, QUIET, PROJECT_ROOT, EMBEDDING_CHUNK_SIZE
+from src.bench.generate import SIZES, dataset_path, write_transactions
+from src.etl import transform as T
+from src.etl.artifacts import artifact_path
+from src.etl.extract import extract_transactions
+from src.etl.load import load_data
+from src.etl.parallel import transform_transactions_parallel
+from src.graph.embeddings import build_embeddings, export_vector_csv
+from src.metrics import RUN_ID, peak_rss_mb, rss_delta
+from src.randomforest.model_random_forest import _load_xy, _build_pipeline, _train_test_split
+
+# Benchmark der ganzen Pipeline auf synthetischen Datensätzen (src/bench/generate.py):
+# Extract, jeder Transform-Helper einzeln (Reihenfolge wie transform_transactions), load_data,
+# Random-Forest-Fit/-Predict und Embedding-Export. Jeder Schritt wird als JSON-Zeile an
+# BENCH_RESULTS_PATH angehängt; --compare vergleicht den letzten Lauf mit dem vorherigen.
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _timed(steps: list, step: str, func, *args):
+    # Konsolenausgaben der Helper unterdrücken, ihre Berechnung zählt mit (außer mit QUIET)
+    with contextlib.redirect_stdout(io.StringIO()):
+        peak_before = peak_rss_mb()
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = func(*args)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+    out = result[0] if isinstance(result, tuple) and result else result
+    peak = peak_rss_mb()
+    steps.append({
+        "step": step,
+        "wall_s": round(wall, 4),
+        "cpu_s": round(cpu, 4),
+        "process_peak_rss_mb": peak,
+        "peak_rss_delta_mb": rss_delta(peak_before, peak),
+        "rows_out": len(out) if isinstance(out, pd.DataFrame) else None,
+    })
+    print(f" {step:<32} {wall:>9.3f}s")
+    return result
+
+
+def benchmark(size: str, rf_rows: int = 200_000) -> list[dict]:
+    path = dataset_path(size)
+    if not path.exists():
+        print(f"\n Erzeuge Datensatz {path}")
+        write_transactions(path, SIZES[size])
+
+    print(f"\n === Benchmark {size} ===")
+    steps = []
+
+    raw = _timed(steps, "extract", extract_transactions, path)
+
+    df = raw.copy()
+    _timed(steps, "_print_missing_values", T._print_missing_values, df)
+    _timed(steps, "_print_binary_feature_validation", T._print_binary_feature_validation, df)
+    df = _timed(steps, "_convert_and_filter_timestamp", T._convert_and_filter_timestamp, df)
+    df = _timed(steps, "_deduplicate_transactions", T._deduplicate_transactions, df)
+    df = _timed(steps, "_convert_numeric_columns", T._convert_numeric_columns, df)
+    clean, rejects = _timed(steps, "_split_rejects_and_clean", T._split_rejects_and_clean, df)
+    _timed(steps, "_print_empty_string_checks", T._print_empty_string_checks, clean)
+    clean, _obj_cols = _timed(steps, "_normalize_categorical_columns", T._normalize_categorical_columns, clean)
+    users = _timed(steps, "_user_aggregation", T._user_aggregation, clean)
+    clean = _timed(steps, "_feature_engineering", T._feature_engineering, clean)
+    clean = _timed(steps, "_reorder_columns", T._reorder_columns, clean)
+
+    if TRANSFORM_WORKERS > 1:
+        _timed(steps, f"transform_parallel_{TRANSFORM_WORKERS}", transform_transactions_parallel, raw)
+
+    out_dir = BENCH_DIR / "out" / size
+    _timed(steps, "load_data", load_data, clean, rejects, users, out_dir)
+
+    # Random Forest auf einer Stichprobe, damit 10M-Läufe in vertretbarer Zeit fertig werden
+    X, y = _timed(steps, "rf_load", _load_xy, artifact_path(out_dir, "clean_transactions", OUTPUT_FORMAT))
+    if len(X) > rf_rows:
+        X = X.sample(rf_rows, random_state=42)
+        y = y.loc[X.index]
+    X_train, X_test, y_train, _y_test = _train_test_split(X, y)
+    model = _build_pipeline()
+    _timed(steps, "rf_fit", model.fit, X_train, y_train)
+    _timed(steps, "rf_predict", model.predict_proba, X_test)
+
+    embedding_dir = out_dir / "embeddings"
+    _timed(steps, "embedding_export", build_embeddings, artifact_path(out_dir, "clean_transactions", OUTPUT_FORMAT), embedding_dir, None, EMBEDDING_CHUNK_SIZE, True)
+    _timed(steps, "embedding_vector_csv", export_vector_csv, out_dir / "transactions_vec.csv", embedding_dir)
+
+    run = {
+        "run_id": RUN_ID,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "dataset": size,
+        "rows": len(raw),
+        "format": OUTPUT_FORMAT,
+        "transform_workers": TRANSFORM_WORKERS,
+        "quiet": QUIET,
+        "rf_rows": min(rf_rows, len(X)),
+    }
+    records = [{**run, **step} for step in steps]
+
+    BENCH_RESULTS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(BENCH_RESULTS_PATH, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    return records
+
+
+def compare(path=BENCH_RESULTS_PATH) -> None:
+    # Letzter gegen vorletzten Lauf pro Datensatz, Wall-Zeit je Schritt
+    results = pd.read_json(path, lines=True)
+    for dataset, runs in results.groupby("dataset"):
+        run_ids = runs.drop_duplicates("run_id").sort_values("time")["run_id"].tolist()
+        if len(run_ids) < 2:
+            print(f"\n {dataset}: nur ein Lauf vorhanden")
+            continue
+
+        before, after = (runs[runs["run_id"] == r].set_index("step")["wall_s"] for r in run_ids[-2:])
+        table = pd.DataFrame({"vorher_s": before, "nachher_s": after})
+        table["faktor"] = (table["vorher_s"] / table["nachher_s"]).round(2)
+        print(f"\n === {dataset}: {run_ids[-2]} -> {run_ids[-1]} ===")
+        print(table.to_string())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline-Benchmark auf synthetischen Daten")
+    parser.add_argument("--sizes", nargs="+", default=["100k"], choices=list(SIZES))
+    parser.add_argument("--rf-rows", type=int, default=200_000, help="Stichprobe für Random-Forest-Fit/-Predict")
+    parser.add_argument("--compare", action="store_true", help="nur letzten und vorletzten Lauf vergleichen")
+    args = parser.parse_args()
+
+    if not args.compare:
+        for size in args.sizes:
+            benchmark(size, args.rf_rows)
+    compare()
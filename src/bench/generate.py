@@ -0,0 +1,194 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import BENCH_DIR
+
+# Synthetischer Generator für transactions.csv (gleiche Spalten wie die Rohdaten).
+# - realistische Kardinalitäten: ~10 Transaktionen pro User mit schiefer Aktivität,
+#   wenige Ausprägungen für Kategorien inkl. unsauberer Schreibweisen ("tokyo ", " ATM Withdrawal")
+# - Fraud hängt von Risk_Score, Vorbetrug, Fehlversuchen, IP-Flag und Betrag/Kontostand ab,
+#   der Achsenabschnitt wird auf die gewünschte Fraud-Rate kalibriert
+# - eingestreute Dirty-Rows (ungültige Timestamps, negative Beträge, fehlende IDs/Labels/Werte)
+#   und erneut gelieferte Transaktionen mit späterem Timestamp (Duplikate)
+# Große Dateien werden in Blöcken geschrieben, der Speicherbedarf hängt nur von chunk_rows ab.
+
+SIZES = {"100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+CATEGORIES = {
+    "Transaction_Type": (["POS", "Online", "ATM Withdrawal", "Bank Transfer"], [0.35, 0.35, 0.15, 0.15]),
+    "Device_Type": (["Mobile", "Laptop", "Tablet"], [0.55, 0.3, 0.15]),
+    "Location": (["Tokyo", "London", "Sydney", "New York", "Mumbai"], [0.2, 0.2, 0.2, 0.2, 0.2]),
+    "Merchant_Category": (["Groceries", "Restaurants", "Clothing", "Electronics", "Travel"], [0.3, 0.25, 0.2, 0.15, 0.1]),
+    "Card_Type": (["Visa", "Mastercard", "Amex", "Discover"], [0.45, 0.35, 0.12, 0.08]),
+    "Authentication_Method": (["PIN", "Password", "OTP", "Biometric"], [0.3, 0.3, 0.25, 0.15]),
+}
+
+COLUMNS = [
+    "Transaction_ID", "User_ID", "Transaction_Amount", "Transaction_Type", "Timestamp", "Account_Balance",
+    "Device_Type", "Location", "Merchant_Category", "IP_Address_Flag", "Previous_Fraudulent_Activity",
+    "Daily_Transaction_Count", "Avg_Transaction_Amount_7d", "Failed_Transaction_Count_7d", "Card_Type",
+    "Card_Age", "Transaction_Distance", "Authentication_Method", "Risk_Score", "Is_Weekend", "Fraud_Label",
+]
+
+START = pd.Timestamp("2023-01-01")
+DAYS = 90
+
+
+def _messy(values: np.ndarray, rng: np.random.Generator, rate: float = 0.05) -> np.ndarray:
+    # Ein Teil der Werte mit Leerzeichen/anderer Schreibweise, wie in den echten Rohdaten
+    values = values.astype(object)
+    mask = rng.random(len(values)) < rate
+    values[mask] = [f" {v.lower()} " if i % 2 else f"{v} " for i, v in enumerate(values[mask])]
+    return values
+
+
+def _fraud_logit(df: pd.DataFrame) -> np.ndarray:
+    ratio = (df["Transaction_Amount"] / df["Account_Balance"]).clip(upper=1).to_numpy()
+    return (
+        3.0 * df["Risk_Score"].to_numpy()
+        + 0.8 * df["Previous_Fraudulent_Activity"].to_numpy()
+        + 0.4 * df["Failed_Transaction_Count_7d"].to_numpy()
+        + 0.7 * df["IP_Address_Flag"].to_numpy()
+        + 4.0 * ratio
+        + 0.3 * (df["Transaction_Type"].str.strip().str.lower() == "online").to_numpy()
+    )
+
+
+def _calibrate(logit: np.ndarray, fraud_rate: float) -> float:
+    # Achsenabschnitt per Bisektion, so dass die mittlere Fraud-Wahrscheinlichkeit fraud_rate ist
+    low, high = -30.0, 30.0
+    for _ in range(60):
+        mid = (low + high) / 2
+        if (1 / (1 + np.exp(-(logit + mid)))).mean() < fraud_rate:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def _inject_dirty(df: pd.DataFrame, rng: np.random.Generator, dirty_rate: float) -> pd.DataFrame:
+    n = len(df)
+    kinds = [
+        ("Timestamp", "not a date"),
+        ("Transaction_Amount", -abs(df["Transaction_Amount"].to_numpy())),
+        ("Transaction_ID", np.nan),
+        ("User_ID", np.nan),
+        ("Fraud_Label", np.nan),
+        ("Card_Age", np.nan),
+        ("Transaction_Distance", -1.0),
+    ]
+    for col, value in kinds:
+        rows = rng.random(n) < dirty_rate / len(kinds)
+        if not rows.any():
+            continue
+        if col == "Fraud_Label":
+            # int8 kann kein NaN -> Werte bleiben ganzzahlig in der CSV
+            df[col] = df[col].astype(object)
+        df.loc[rows, col] = value[rows] if isinstance(value, np.ndarray) else value
+    return df
+
+
+def generate_transactions(
+    n_rows: int,
+    fraud_rate: float = 0.03,
+    dirty_rate: float = 0.002,
+    duplicate_rate: float = 0.01,
+    users: int | None = None,
+    seed: int = 0,
+    id_offset: int = 0,
+) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    users = users or max(1, n_rows // 10)
+
+    # Schiefe User-Aktivität (lognormal verteilte Gewichte), fester Kontostand pro User
+    user_rng = np.random.default_rng(0)
+    weights = np.exp(user_rng.normal(0, 1, users))
+    balances = np.exp(user_rng.normal(9.5, 1.2, users)).round(2)
+    user = rng.choice(users, n_rows, p=weights / weights.sum())
+
+    ts = START + pd.to_timedelta(rng.integers(0, DAYS * 86_400, n_rows), unit="s")
+    amount = rng.lognormal(3.8, 1.0, n_rows).round(2)
+
+    df = pd.DataFrame({
+        "Transaction_ID": "TXN_" + pd.Series(np.arange(id_offset, id_offset + n_rows)).astype(str),
+        "User_ID": "USER_" + pd.Series(user).astype(str),
+        "Transaction_Amount": amount,
+        "Timestamp": ts,
+        "Account_Balance": (balances[user] * rng.uniform(0.8, 1.2, n_rows)).round(2),
+        "IP_Address_Flag": (rng.random(n_rows) < 0.05).astype(np.int8),
+        "Previous_Fraudulent_Activity": (rng.random(n_rows) < 0.1).astype(np.int8),
+        "Daily_Transaction_Count": rng.poisson(4, n_rows) + 1,
+        "Avg_Transaction_Amount_7d": (amount * rng.uniform(0.5, 1.5, n_rows)).round(2),
+        "Failed_Transaction_Count_7d": rng.poisson(0.8, n_rows),
+        "Card_Age": rng.integers(1, 240, n_rows).astype(float),
+        "Transaction_Distance": rng.exponential(300, n_rows).round(2),
+        "Risk_Score": rng.beta(2, 5, n_rows).round(4),
+        "Is_Weekend": (ts.dayofweek >= 5).astype(np.int8),
+    })
+    for col, (values, p) in CATEGORIES.items():
+        df[col] = _messy(rng.choice(values, n_rows, p=p), rng)
+
+    logit = _fraud_logit(df)
+    prob = 1 / (1 + np.exp(-(logit + _calibrate(logit, fraud_rate))))
+    df["Fraud_Label"] = (rng.random(n_rows) < prob).astype(np.int8)
+
+    # Erneut gelieferte Transaktionen: gleiche ID und User, späterer Timestamp, teils geänderter Betrag
+    dup_rows = rng.random(n_rows) < duplicate_rate
+    dups = df[dup_rows].copy()
+    dups["Timestamp"] = dups["Timestamp"] + pd.to_timedelta(rng.integers(1, 3_600, len(dups)), unit="s")
+    dups["Transaction_Amount"] = np.where(rng.random(len(dups)) < 0.5, dups["Transaction_Amount"],
+                                          (dups["Transaction_Amount"] * 1.01).round(2))
+    df = pd.concat([df, dups], ignore_index=True).sample(frac=1, random_state=seed).reset_index(drop=True)
+
+    df["Timestamp"] = df["Timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    df = _inject_dirty(df, rng, dirty_rate)
+    return df[COLUMNS]
+
+
+def write_transactions(path, n_rows: int, chunk_rows: int = 1_000_000, seed: int = 0, **kwargs) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+
+    # User-Anzahl für die ganze Datei festlegen, damit sich User über Blöcke verteilen
+    users = kwargs.pop("users", None) or max(1, n_rows // 10)
+
+    written = 0
+    for block, start in enumerate(range(0, n_rows, chunk_rows)):
+        rows = min(chunk_rows, n_rows - start)
+        df = generate_transactions(rows, users=users, seed=seed + block, id_offset=start, **kwargs)
+        df.to_csv(tmp, mode="w" if block == 0 else "a", header=block == 0, index=False)
+        written += len(df)
+        print(f" {written:,} Zeilen geschrieben")
+
+    tmp.replace(path)
+    return path
+
+
+def dataset_path(size: str) -> Path:
+    return BENCH_DIR / f"transactions_{size}.csv"
+
+
+def _parse_rows(value: str) -> int:
+    return SIZES[value.lower()] if value.lower() in SIZES else int(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetische transactions.csv erzeugen")
+    parser.add_argument("--rows", default="100k", help="Zeilen oder 100k / 1m / 10m")
+    parser.add_argument("--out", type=Path, help="Zieldatei (Standard: data/bench/transactions_<rows>.csv)")
+    parser.add_argument("--fraud-rate", type=float, default=0.03)
+    parser.add_argument("--dirty-rate", type=float, default=0.002)
+    parser.add_argument("--duplicate-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    out = args.out or dataset_path(args.rows.lower())
+    write_transactions(
+        out, _parse_rows(args.rows),
+        fraud_rate=args.fraud_rate, dirty_rate=args.dirty_rate, duplicate_rate=args.duplicate_rate, seed=args.seed
+    )
+    print(f"\n Datensatz geschrieben: {out}")
@@ -0,0 +1,281 @@
+import contextlib
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+from src.config import CACHE_DIR, CACHE_MAX_BYTES, USE_STAGE_CACHE
+
+try:
+    import fcntl
+except ImportError:  # Windows: kein Reflink, Hardlink bzw. Kopie
+    fcntl = None
+
+# Stage-Cache: jede Stage bekommt einen Schlüssel aus den Inhalts-Hashes ihrer Eingaben,
+# ihres Codes und ihrer Konfiguration. Existiert dazu ein Eintrag, werden die gespeicherten
+# Ausgaben zurückgeschrieben (falls nötig) und die Stage übersprungen.
+# Einträge liegen unter CACHE_DIR/<stage>/<schlüssel>/manifest.json (Hashes der Ausgabedateien),
+# die Dateien selbst inhaltsadressiert unter CACHE_DIR/_objects/ (Reflink/Hardlink statt Kopie).
+# Die ältesten (zuletzt benutzt) werden gelöscht, sobald der Cache größer als CACHE_MAX_BYTES ist.
+
+_HASH_MEMO_PATH = CACHE_DIR / "_file_hashes.json"
+_OBJECTS_DIR = CACHE_DIR / "_objects"
+_BLOCK_SIZE = 1 << 20
+# ioctl FICLONE (Linux): Datei als Reflink anlegen
+_FICLONE = 0x40049409
+
+
+def _load_memo() -> dict:
+    # Datei-Hashes nach (Größe, mtime) merken, damit große Dateien nicht bei jedem Lauf neu gelesen werden
+    if _HASH_MEMO_PATH.exists():
+        return json.loads(_HASH_MEMO_PATH.read_text())
+    return {}
+
+
+def _save_memo(memo: dict) -> None:
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = _HASH_MEMO_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps(memo))
+    tmp.replace(_HASH_MEMO_PATH)
+
+
+def _file_hash(path: Path, memo: dict) -> str:
+    stat = path.stat()
+    cached = memo.get(str(path))
+    if cached is not None and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+        return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_BLOCK_SIZE), b""):
+            digest.update(block)
+    memo[str(path)] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+    return digest.hexdigest()
+
+
+def content_hash(path, memo: dict) -> str:
+    # Datei: Hash des Inhalts; Verzeichnis: Hash über alle Dateien (ohne __pycache__)
+    path = Path(path)
+    if path.is_file():
+        return _file_hash(path, memo)
+    if not path.is_dir():
+        return "missing"
+
+    digest = hashlib.sha256()
+    for file in sorted(p for p in path.rglob("*") if p.is_file() and "__pycache__" not in p.parts):
+        digest.update(f"{file.relative_to(path).as_posix()}:{_file_hash(file, memo)}\n".encode())
+    return digest.hexdigest()
+
+
+def stage_key(name: str, inputs, code, config, memo: dict) -> str:
+    parts = {
+        "stage": name,
+        "inputs": [content_hash(p, memo) for p in inputs],
+        "code": [content_hash(p, memo) for p in code],
+        "config": config or {},
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _files(path: Path) -> list[tuple[str, Path]]:
+    # Datei: sie selbst; Verzeichnis: alle Dateien mit relativem Pfad
+    if path.is_file():
+        return [("", path)]
+    return [(f.relative_to(path).as_posix(), f) for f in sorted(p for p in path.rglob("*") if p.is_file())]
+
+
+def _place(src: Path, dst: Path) -> None:
+    # Ohne volle Kopie: Reflink (Copy-on-Write) wo das Dateisystem es kann, sonst Hardlink,
+    # über Dateisystemgrenzen hinweg kopieren. Über eine temporäre Datei, damit dst nie halb
+    # geschrieben ist und ein bestehendes dst (evtl. selbst ein Link) nicht überschrieben wird
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(dst.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    try:
+        if fcntl is None:
+            raise OSError
+        with open(src, "rb") as fsrc, open(tmp, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+    except OSError:
+        tmp.unlink(missing_ok=True)
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copy2(src, tmp)
+    tmp.replace(dst)
+
+
+def _detach(outputs) -> None:
+    # Ausgaben, die als Hardlink auf ein Objekt zeigen, vor dem Lauf durch eigene Kopien ersetzen:
+    # Stages schreiben ihre Ausgaben an Ort und Stelle und würden sonst das Objekt mit überschreiben
+    for output in outputs:
+        output = Path(output)
+        if not output.exists():
+            continue
+        for _rel, file in _files(output):
+            if file.stat().st_nlink > 1:
+                tmp = file.with_name(file.name + ".tmp")
+                shutil.copy2(file, tmp)
+                tmp.replace(file)
+
+
+def _object(digest: str) -> Path:
+    return _OBJECTS_DIR / digest[:2] / digest
+
+
+def _read_manifest(entry: Path) -> dict | None:
+    path = entry / "manifest.json"
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+def _write_manifest(entry: Path, manifest: dict) -> None:
+    entry.mkdir(parents=True, exist_ok=True)
+    tmp = entry / "manifest.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2))
+    tmp.replace(entry / "manifest.json")
+
+
+def _valid(manifest: dict, memo: dict) -> bool:
+    # Gespeicherte Objekte an Ort und Stelle prüfen: ein Hardlink teilt sich den Inhalt mit der
+    # Ausgabe, schreibt eine Stage die Ausgabe später an Ort und Stelle neu, ist das Objekt verändert
+    for output in manifest["outputs"]:
+        if "files" not in output:
+            # Eintrag im alten Format (kopierte Ausgaben)
+            return False
+        for digest in output["files"].values():
+            obj = _object(digest)
+            if not obj.exists() or _file_hash(obj, memo) != digest:
+                return False
+    return True
+
+
+def _restore(manifest: dict, memo: dict) -> None:
+    # Nur Ausgaben zurückschreiben, die fehlen oder inzwischen anders aussehen
+    for output in manifest["outputs"]:
+        target = Path(output["path"])
+        if content_hash(target, memo) == output["hash"]:
+            continue
+        if target.is_dir():
+            shutil.rmtree(target)
+        for rel, digest in output["files"].items():
+            _place(_object(digest), target / rel if rel else target)
+        print(f" Aus dem Cache wiederhergestellt: {target}")
+
+
+def _store(entry: Path, name: str, key: str, outputs, stdout: str, memo: dict) -> None:
+    # Inhaltsadressiert: jede Datei einmal unter _objects/<hash>, der Eintrag selbst ist nur das Manifest.
+    # Unveränderte Ausgaben verschiedener Einträge teilen sich dieselben Objekte
+    stored = []
+    for output in outputs:
+        output = Path(output)
+        files = {}
+        for rel, file in _files(output):
+            digest = _file_hash(file, memo)
+            obj = _object(digest)
+            if not obj.exists() or _file_hash(obj, memo) != digest:
+                _place(file, obj)
+            files[rel] = digest
+        stored.append({"path": str(output), "hash": content_hash(output, memo), "files": files})
+
+    now = time.time()
+    _write_manifest(entry, {
+        "stage": name,
+        "key": key,
+        "outputs": stored,
+        "stdout": stdout,
+        "created": now,
+        "last_used": now,
+    })
+
+
+def evict(max_bytes: int = CACHE_MAX_BYTES) -> None:
+    # LRU: zuletzt benutzte Einträge behalten, bis die Objekte, auf die sie verweisen, zusammen unter
+    # max_bytes liegen; danach Objekte ohne Verweis löschen
+    entries = []
+    for path in CACHE_DIR.glob("*/*/manifest.json"):
+        manifest = json.loads(path.read_text())
+        if any("files" not in output for output in manifest["outputs"]):
+            shutil.rmtree(path.parent)
+            continue
+        digests = {d for output in manifest["outputs"] for d in output["files"].values()}
+        entries.append((manifest["last_used"], digests, path.parent))
+    entries.sort(key=lambda e: e[0], reverse=True)
+
+    sizes = {}
+    for _used, digests, _entry in entries:
+        for digest in digests:
+            obj = _object(digest)
+            sizes[digest] = obj.stat().st_size if obj.exists() else 0
+
+    referenced, total = set(), 0
+    for _used, digests, entry in entries:
+        added = sum(sizes[d] for d in digests - referenced)
+        if total + added > max_bytes and total:
+            shutil.rmtree(entry)
+            print(f" Cache-Eintrag entfernt: {entry.parent.name}/{entry.name[:12]} ({added / 1024**2:.1f} MB)")
+            continue
+        referenced |= digests
+        total += added
+
+    for obj in _OBJECTS_DIR.glob("*/*"):
+        if obj.name not in referenced:
+            obj.unlink()
+
+
+class _Tee(io.StringIO):
+    # Ausgabe mitschreiben und gleichzeitig anzeigen
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+
+    def write(self, s):
+        self.stream.write(s)
+        return super().write(s)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def run_cached(name: str, run, inputs=(), code=(), config=None, outputs=(), capture_stdout: bool = False):
+    if not USE_STAGE_CACHE:
+        return run()
+
+    memo = _load_memo()
+    key = stage_key(name, inputs, code, config, memo)
+    entry = CACHE_DIR / name / key
+
+    manifest = _read_manifest(entry)
+    if manifest is not None and not _valid(manifest, memo):
+        # Gespeicherte Dateien verändert oder gelöscht -> Eintrag verwerfen, Stage neu ausführen
+        shutil.rmtree(entry)
+        manifest = None
+    if manifest is not None:
+        print(f"\n Stage '{name}' unverändert – überspringe (Cache {key[:12]})")
+        _restore(manifest, memo)
+        if manifest["stdout"]:
+            print(manifest["stdout"], end="")
+        manifest["last_used"] = time.time()
+        _write_manifest(entry, manifest)
+        _save_memo(memo)
+        return None
+
+    _detach(outputs)
+    if capture_stdout:
+        tee = _Tee(sys.stdout)
+        with contextlib.redirect_stdout(tee):
+            result = run()
+        stdout = tee.getvalue()
+    else:
+        result = run()
+        stdout = ""
+
+    # Nur vollständige Ergebnisse cachen
+    if all(Path(p).exists() for p in outputs):
+        _store(entry, name, key, outputs, stdout, memo)
+        evict()
+    _save_memo(memo)
+    return result
@@ -9,9 +9,131 @@ OUTPUT_DIR = DATA_DIR / "cleaned"
 
 DATA_PATH = DATA_DIR / "transactions.csv"
 
-CLEAN_TRANSACTIONS_PATH = OUTPUT_DIR / "clean_transactions.csv"
-REJECTS_PATH = OUTPUT_DIR / "rejects.csv"
-USER_AGG_PATH = OUTPUT_DIR / "user_aggregation.csv"
+# Ausgabeformat der Artefakte: "csv" (Text) oder "feather" (binär, spaltenbasiert, memory-mapbar)
+# Alle Leser (Explore, Random Forest, Neo4j) erkennen das Format an der Dateiendung
+OUTPUT_FORMAT = "csv"
+OUTPUT_SUFFIX = ".feather" if OUTPUT_FORMAT == "feather" else ".csv"
+
+# ETL-Modus: "full" lädt die komplette CSV, "stream" verarbeitet sie in Chunks
+# (Speicherbedarf hängt dann von CHUNK_SIZE ab, nicht von der Dateigröße),
+# "incremental" schreibt Tages-Partitionen und verarbeitet nur die seit dem letzten Lauf angehängten Zeilen
+ETL_MODE = "full"
+CHUNK_SIZE = 100_000
+
+# Prozesse für den Transform im Modus "full" (Partitionen nach User_ID-Hash), 1 = single-process
+TRANSFORM_WORKERS = 1
+
+# Inkrementeller Modus: eine Datei pro Tag (aus Timestamp) + Manifest (verarbeiteter Byte-Offset der
+# Quelle, Partitionen, User-State), das als Letztes geschrieben wird
+PARTITIONS_DIR = OUTPUT_DIR / "partitions"
+MANIFEST_PATH = PARTITIONS_DIR / "_manifest.json"
+
+# Persistenter Transaction_ID-Index (sortierte Hashes + Bloom-Filter) für Deduplication über Läufe
+TX_INDEX_DIR = PARTITIONS_DIR / "_txindex"
+TX_INDEX_FP_RATE = 0.01
+# Neue IDs werden bis zu dieser Anzahl unsortiert gepuffert, dann sortiert und mit dem Lauf auf der Platte gemergt
+TX_INDEX_BUFFER_ROWS = 1_000_000
+
+if ETL_MODE == "incremental":
+    # Leser lesen alle Partitionen eines Verzeichnisses
+    CLEAN_TRANSACTIONS_PATH = PARTITIONS_DIR / "clean_transactions"
+    REJECTS_PATH = PARTITIONS_DIR / "rejects"
+else:
+    CLEAN_TRANSACTIONS_PATH = OUTPUT_DIR / f"clean_transactions{OUTPUT_SUFFIX}"
+    REJECTS_PATH = OUTPUT_DIR / f"rejects{OUTPUT_SUFFIX}"
+USER_AGG_PATH = OUTPUT_DIR / f"user_aggregation{OUTPUT_SUFFIX}"
+
+# Zusätzliche User-Aggregate (Ausgabename -> (Spalte, Funktion)), z.B.
+#   "Amount_Median": ("Transaction_Amount", "q50"),
+#   "Amount_P90": ("Transaction_Amount", "q90"),
+#   "First_Seen_Hour": ("Timestamp", "first_hour"),
+#   "Last_Seen_Hour": ("Timestamp", "last_hour"),
+# Quantile sind im Streaming- und inkrementellen Modus nicht verfügbar (Fehler beim Start)
+USER_AGG_EXTRAS = {}
+
+# Stichprobengröße für den Speichervergleich (pandas-Inferenz vs. deklariertes Schema)
+SCHEMA_SAMPLE_ROWS = 10_000
+
+# Stage-Cache (main.py): Stages mit unveränderten Eingaben, Code und Konfiguration werden übersprungen;
+# älteste Einträge werden gelöscht, sobald der Cache größer als CACHE_MAX_BYTES ist
+USE_STAGE_CACHE = True
+CACHE_DIR = DATA_DIR / "cache"
+CACHE_MAX_BYTES = 2 * 1024**3
+
+# Parallele Stages nach dem ETL (Neo4j, Explore, Random Forest) im Prozess-Pool; 1 = nacheinander
+MAX_PARALLEL_STAGES = 3
+
+# Messwerte pro Helper-Funktion (Zeit, CPU, Peak-RSS, Zeilen, Rejects) als JSON-Zeilen; None = aus
+METRICS_PATH = OUTPUT_DIR / "metrics.jsonl"
+# QUIET = True überspringt Diagnose-Ausgaben (info(), head(), NaN-Zählungen, Spaltenlisten) komplett
+QUIET = False
+
+# Explore (src/explore/explore.py): Figuren aus vorab berechneten Zusammenfassungen (Zähler, Quantile,
+# KDE) statt aus allen Zeilen. EXPLORE_RENDER: "html" (ein eigenständiger Report unter EXPLORE_DIR),
+# "png" (ein Bild pro Figur, benötigt kaleido) oder "show" (Browser). Quantile und KDE auf einer
+# Stichprobe von höchstens EXPLORE_MAX_ROWS Zeilen pro Klasse, KDE auf EXPLORE_KDE_POINTS Punkten
+EXPLORE_RENDER = "html"
+EXPLORE_DIR = OUTPUT_DIR / "explore"
+EXPLORE_MAX_ROWS = 1_000_000
+EXPLORE_KDE_POINTS = 512
+
+# Random Forest: gespeicherte Pipeline (ColumnTransformer + Modell) und Scores aus dem Batch-Scoring
+MODEL_DIR = DATA_DIR / "models"
+MODEL_PATH = MODEL_DIR / "random_forest.joblib"
+# Modell-Backend für die Pipeline (src/randomforest/backends.py): "random_forest" oder "hist_gb"
+MODEL_BACKEND = "random_forest"
+# Negatives Downsampling beim Training: alle Frauds, nur dieser Anteil der Nicht-Frauds (1.0 = aus);
+# die Wahrscheinlichkeiten werden beim Scoring auf die Originalverteilung zurückgerechnet
+NEG_SAMPLE_RATE = 1.0
+# Graph-Features aus dem In-Prozess-Graphen (src/graph/memgraph.py) als zusätzliche Modell-Features;
+# Fraud-Anteile mit GRAPH_SMOOTHING Pseudo-Zeilen geglättet, beim Training Out-of-Fold über GRAPH_FOLDS
+USE_GRAPH_FEATURES = False
+GRAPH_SMOOTHING = 20.0
+GRAPH_FOLDS = 5
+# Kreuzvalidierung/Tuning (src/randomforest/tuning.py): Features werden einmal kodiert und unter
+# TUNE_DIR memory-mapped abgelegt; Successive Halving mit n_estimators als Ressource
+TUNE_DIR = MODEL_DIR / "tuning"
+CV_FOLDS = 5
+TUNE_JOBS = -1
+TUNE_GRID = {"min_samples_leaf": [1, 2, 5, 10, 20], "max_features": ["sqrt", 0.5]}
+TUNE_MIN_ESTIMATORS = 50
+TUNE_MAX_ESTIMATORS = 500
+# Feature Importances (src/randomforest/importance.py): Permutation auf höchstens IMPORTANCE_MAX_ROWS
+# Testzeilen, IMPORTANCE_REPEATS Wiederholungen pro Feature (0 = nur Impurity), parallel in Threads
+IMPORTANCE_DIR = MODEL_DIR / "importance"
+# Bericht des zuletzt in der Pipeline trainierten Modells
+IMPORTANCE_REPORT_PATH = MODEL_DIR / "feature_importance.json"
+IMPORTANCE_REPEATS = 5
+IMPORTANCE_MAX_ROWS = 50_000
+IMPORTANCE_JOBS = -1
+# Kompakter Export des Forests als memory-mapped Arrays (src/randomforest/compact.py)
+COMPACT_MODEL_DIR = MODEL_DIR / "random_forest_compact"
+SCORES_PATH = OUTPUT_DIR / f"fraud_scores{OUTPUT_SUFFIX}"
+
+# Online-Scoring-Server (src/randomforest/serve.py): Micro-Batches bis SERVE_MAX_BATCH Zeilen
+# oder SERVE_MAX_WAIT_MS Wartezeit
+SERVE_HOST = "127.0.0.1"
+SERVE_PORT = 8765
+SERVE_MAX_BATCH = 64
+SERVE_MAX_WAIT_MS = 2.0
+
+# Benchmarks (src/bench): synthetische Datensätze und Ergebnisse (JSON-Zeilen pro Schritt)
+BENCH_DIR = DATA_DIR / "bench"
+BENCH_RESULTS_PATH = BENCH_DIR / "results.jsonl"
+
+# kNN über Embeddings ohne Neo4j (src/graph/knn.py): exakte Suche in Blöcken von KNN_BLOCK_ROWS
+# Vektoren; ab KNN_EXACT_MAX_ROWS IVF-Index mit KNN_IVF_LISTS Listen (None = Wurzel aus n),
+# pro Anfrage werden KNN_IVF_PROBES Listen durchsucht
+KNN_BLOCK_ROWS = 16_384
+KNN_EXACT_MAX_ROWS = 2_000_000
+KNN_IVF_LISTS = None
+KNN_IVF_PROBES = 8
+
+# Embeddings (src/graph/embeddings.py): StandardScaler inkrementell über Chunks von EMBEDDING_CHUNK_SIZE
+# Zeilen, Vektoren als float32-Binärdatei + Transaction_IDs unter EMBEDDING_DIR; der gespeicherte
+# Scaler bettet neue Transaktionen ein, ohne neu zu fitten
+EMBEDDING_DIR = OUTPUT_DIR / "embeddings"
+EMBEDDING_CHUNK_SIZE = 250_000
 
 # Neo4j configuration (Platzhalter ersetzen!)
 
@@ -21,3 +143,12 @@ NEO4J_PASSWORD = "<your_neo4j_password>"
 
 # Absolute path to Neo4j import directory
 NEO4J_IMPORT_PATH = Path("<path_to_neo4j_import>/transactions_vec.csv")
+
+# Import-Modus: "unwind" (Constraints, Dimensionsknoten einmal, Transaktionen in UNWIND-Batches über
+# den Treiber, fortsetzbar über NEO4J_CHECKPOINT_PATH) oder "load_csv" (CSV über NEO4J_IMPORT_PATH)
+NEO4J_IMPORT_MODE = "unwind"
+NEO4J_BATCH_SIZE = 5_000
+NEO4J_WRITERS = 4
+NEO4J_CHECKPOINT_PATH = OUTPUT_DIR / "neo4j_import.checkpoint"
+# Nebenläufige Report-Abfragen (src/graph/report.py): Threads = Verbindungen im Pool des Treibers
+NEO4J_REPORT_WORKERS = 6
@@ -0,0 +1,140 @@
+import re
+
+import pandas as pd
+
+# Vektorisierte Aggregations-Engine: alle Aggregate werden über groupby-Reduktionen
+# (C-Implementierung in pandas) berechnet, ohne Python-Callbacks pro Gruppe.
+#
+# Eine Aggregation ist {Ausgabename: (Spalte, Funktion)} mit den Funktionen
+#   count, sum, mean, min, max  – zusammenführbar über Chunks
+#   first_hour, last_hour       – erster/letzter Zeitpunkt auf die Stunde abgerundet (zusammenführbar)
+#   mode                        – häufigster Wert, bei Gleichstand der kleinste (zusammenführbar)
+#   q<Prozent>, z.B. q50, q90   – Quantil; nur zusammenführbar, wenn jede Gruppe vollständig in einem
+#                                 Teil-Aggregat liegt (z.B. Partitionen nach User_ID), sonst Fehler
+
+# Funktion -> (Reduktion im Teil-Aggregat, Reduktion beim Zusammenführen)
+_MERGEABLE = {
+    "count": ("count", "sum"),
+    "sum": ("sum", "sum"),
+    "min": ("min", "min"),
+    "max": ("max", "max"),
+    "first_hour": ("min", "min"),
+    "last_hour": ("max", "max"),
+}
+
+_QUANTILE = re.compile(r"^q(\d{1,2}(\.\d+)?)$")
+
+
+def _quantile(func: str) -> float | None:
+    match = _QUANTILE.match(func)
+    return float(match.group(1)) / 100 if match else None
+
+
+def value_counts_by(df: pd.DataFrame, key: str, col: str) -> pd.Series:
+    # Gruppierte Häufigkeiten pro (key, Wert)
+    return df.groupby([key, col], observed=True).size().rename("Count")
+
+
+def argmax_by(counts: pd.Series) -> pd.Series:
+    # Ein Argmax pro Gruppe: höchster Zähler, bei Gleichstand der kleinste Wert (deterministisch)
+    key, col = counts.index.names
+    # Nach Werten sortieren, nicht nach Kategorie-Reihenfolge (category-Spalten je Chunk verschieden)
+    frame = counts.reset_index().sort_values(
+        [key, col], kind="stable",
+        key=lambda s: s.astype(object) if isinstance(s.dtype, pd.CategoricalDtype) else s
+    )
+    group_max = frame.groupby(key, observed=True)["Count"].transform("max")
+    top = frame[frame["Count"].eq(group_max)].drop_duplicates(subset=key, keep="first")
+    return top.set_index(key)[col]
+
+
+def partial_aggregate(df: pd.DataFrame, key: str, specs: dict) -> tuple[pd.DataFrame, dict]:
+    named = {}
+    modes = {}
+    quantiles = []
+
+    for name, (col, func) in specs.items():
+        if func in _MERGEABLE:
+            named[name] = (col, _MERGEABLE[func][0])
+        elif func == "mean":
+            named[f"{name}__sum"] = (col, "sum")
+            named[f"{name}__count"] = (col, "count")
+        elif func == "mode":
+            modes[name] = value_counts_by(df, key, col)
+        elif _quantile(func) is not None:
+            quantiles.append((name, col, _quantile(func)))
+        else:
+            raise ValueError(f"Unbekannte Aggregationsfunktion: {func}")
+
+    grouped = df.groupby(key, observed=True)
+    state = grouped.agg(**named) if named else pd.DataFrame(index=grouped.size().index)
+
+    # Quantile über die groupby-Quantilfunktion (ebenfalls ohne Python-Callback pro Gruppe)
+    for name, col, q in quantiles:
+        state[f"{name}__final"] = grouped[col].quantile(q)
+
+    return state, modes
+
+
+def check_mergeable(specs: dict, overlap: bool = True) -> None:
+    # Quantile einer Gruppe, deren Zeilen auf mehrere Teil-Aggregate verteilt sind, wären falsch
+    quantiles = [name for name, (_col, func) in specs.items() if _quantile(func) is not None]
+    if quantiles and overlap:
+        raise ValueError(
+            f"Quantil-Aggregate {quantiles} lassen sich nicht über Chunks zusammenführen – "
+            "ETL_MODE = \"full\" verwenden oder aus USER_AGG_EXTRAS entfernen"
+        )
+
+
+def merge_partials(left: tuple[pd.DataFrame, dict] | None, right: tuple[pd.DataFrame, dict], specs: dict):
+    if left is None:
+        return right
+
+    state = pd.concat([left[0], right[0]])
+    key = state.index.name
+
+    reducers = {}
+    for name, (_col, func) in specs.items():
+        if func in _MERGEABLE:
+            reducers[name] = _MERGEABLE[func][1]
+        elif func == "mean":
+            reducers[f"{name}__sum"] = "sum"
+            reducers[f"{name}__count"] = "sum"
+
+    # Quantile lassen sich nur übernehmen, wenn keine Gruppe in beiden Teilen vorkommt
+    finals = [c for c in state.columns if c.endswith("__final")]
+    if finals:
+        check_mergeable(specs, overlap=not left[0].index.intersection(right[0].index).empty)
+        reducers.update({c: "first" for c in finals})
+
+    grouped = state.groupby(level=key, observed=True)
+    state = grouped.agg(reducers) if reducers else pd.DataFrame(index=state.index.unique().sort_values())
+
+    modes = {
+        name: pd.concat([left[1][name], right[1][name]]).groupby(level=[0, 1], observed=True).sum()
+        for name in left[1]
+    }
+    return state, modes
+
+
+def finalize(partials: tuple[pd.DataFrame, dict], specs: dict) -> pd.DataFrame:
+    state, modes = partials
+    result = pd.DataFrame(index=state.index)
+
+    for name, (_col, func) in specs.items():
+        if func in ("count", "sum", "min", "max"):
+            result[name] = state[name]
+        elif func in ("first_hour", "last_hour"):
+            result[name] = state[name].dt.floor("h")
+        elif func == "mean":
+            result[name] = state[f"{name}__sum"] / state[f"{name}__count"]
+        elif func == "mode":
+            result[name] = argmax_by(modes[name]).reindex(state.index)
+        elif f"{name}__final" in state.columns:
+            result[name] = state[f"{name}__final"]
+
+    return result.reset_index()
+
+
+def aggregate(df: pd.DataFrame, key: str, specs: dict) -> pd.DataFrame:
+    return finalize(partial_aggregate(df, key, specs), specs)
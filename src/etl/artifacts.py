@@ -0,0 +1,117 @@
+from pathlib import Path
+
+import pandas as pd
+
+from src.config import OUTPUT_FORMAT, CHUNK_SIZE
+from src.etl.schema import ARROW_TYPES, REJECT_ARROW_TYPES
+
+# Dateiendung je Ausgabeformat
+SUFFIXES = {
+    "csv": ".csv",
+    "feather": ".feather",
+}
+
+
+def artifact_path(output_dir, name: str, fmt: str = OUTPUT_FORMAT) -> Path:
+    return Path(output_dir) / f"{name}{SUFFIXES[fmt]}"
+
+
+def write_table(df: pd.DataFrame, path) -> None:
+    path = Path(path)
+    if path.suffix == ".feather":
+        # Unkomprimiert, damit Leser die Datei memory-mappen können
+        df.reset_index(drop=True).to_feather(path, compression="uncompressed")
+    else:
+        df.to_csv(path, index=False)
+
+
+def read_table(path, columns: list[str] | None = None) -> pd.DataFrame:
+    path = Path(path)
+    if path.is_dir():
+        # Partitioniertes Artefakt: alle Partitionen in Dateinamen-Reihenfolge
+        parts = [read_table(p, columns) for p in sorted(path.iterdir()) if p.suffix in SUFFIXES.values()]
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=columns)
+    if path.suffix == ".feather":
+        from pyarrow import feather
+
+        # Memory-mapped lesen: typisierte Spalten ohne Text-Parsing, nur benötigte Spalten
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        return table.to_pandas(split_blocks=True)
+    return pd.read_csv(path, usecols=columns)
+
+
+def iter_table(path, columns: list[str] | None = None, chunksize: int = CHUNK_SIZE):
+    # Wie read_table, aber stückweise: CSV in Chunks, Feather memory-mapped in Scheiben
+    path = Path(path)
+    if path.is_dir():
+        for p in sorted(path.iterdir()):
+            if p.suffix in SUFFIXES.values():
+                yield from iter_table(p, columns, chunksize)
+        return
+    if path.suffix == ".feather":
+        from pyarrow import feather
+
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        for start in range(0, table.num_rows, chunksize):
+            yield table.slice(start, chunksize).to_pandas(split_blocks=True)
+        return
+    yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)
+
+
+class TableWriter:
+    # Schreibt eine Tabelle stückweise (Streaming-ETL): CSV wird angehängt,
+    # Feather als Arrow-IPC-Datei mit einem Record Batch pro Chunk.
+    # types: Arrow-Typen der deklarierten Spalten (REJECT_ARROW_TYPES für Rejects)
+    def __init__(self, path, types: dict = ARROW_TYPES):
+        self.path = Path(path)
+        self.types = types
+        self._first = True
+        self._writer = None
+        self._schema = None
+        self._empty = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.path.suffix == ".feather":
+            self._write_feather(df)
+        else:
+            mode = "w" if self._first else "a"
+            df.to_csv(self.path, mode=mode, header=self._first, index=False)
+        self._first = False
+
+    def _write_feather(self, df: pd.DataFrame) -> None:
+        import pyarrow as pa
+
+        # Leere Chunks liefern kein brauchbares Schema (Textspalten ohne Typ) – Datei erst mit Daten anlegen
+        if self._writer is None and df.empty:
+            self._empty = df
+            return
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+
+        # Kategorien unterscheiden sich je Chunk, eine IPC-Datei erlaubt aber nur ein Dictionary
+        # pro Spalte -> category-Spalten als Klartext schreiben
+        for i, field in enumerate(table.schema):
+            if pa.types.is_dictionary(field.type):
+                table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+
+        if self._writer is None:
+            # Schema aus den deklarierten Typen (schema.py), nur nicht deklarierte Spalten aus dem ersten Chunk
+            self._schema = pa.schema([
+                pa.field(field.name, pa.type_for_alias(self.types[field.name])) if field.name in self.types else field
+                for field in table.schema
+            ])
+            table = table.cast(self._schema)
+            self._writer = pa.ipc.new_file(
+                self.path, self._schema, options=pa.ipc.IpcWriteOptions(compression=None)
+            )
+        else:
+            # Spaltentypen der folgenden Chunks an das Schema angleichen
+            table = table.select(self._schema.names).cast(self._schema)
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        elif self._empty is not None:
+            write_table(self._empty, self.path)
@@ -1,6 +1,78 @@
+import io
+
 import pandas as pd
-from src.config import DATA_PATH
+from src.config import DATA_PATH, CHUNK_SIZE, SCHEMA_SAMPLE_ROWS
+from src.etl.schema import READ_DTYPES, CATEGORICAL_COLUMNS, apply_schema, bytes_per_row
+from src.metrics import instrumented, diagnostic
+
+def _read_with_schema(path=DATA_PATH, **kwargs):
+    try:
+        return pd.read_csv(path, sep=",", decimal=".", dtype=READ_DTYPES, **kwargs)
+    except ValueError:
+        # Ungültige Werte in Float-Spalten: nur Kategorien beim Lesen festlegen, Zahlen danach coercen
+        print("\n Schema-Typen beim Lesen nicht anwendbar – numerische Spalten werden nachträglich konvertiert")
+        dtypes = {col: "category" for col in CATEGORICAL_COLUMNS}
+        return pd.read_csv(path, sep=",", decimal=".", dtype=dtypes, **kwargs)
+
+
+@diagnostic
+def _report_bytes_per_row(df: pd.DataFrame, path=DATA_PATH) -> None:
+    # Vergleich mit pandas-Typinferenz anhand einer Stichprobe
+    sample = pd.read_csv(path, sep=",", decimal=".", nrows=SCHEMA_SAMPLE_ROWS)
+    print(
+        f"\n Speicher pro Zeile: {bytes_per_row(sample):.1f} B (inferiert) -> "
+        f"{bytes_per_row(df):.1f} B (Schema)"
+    )
+
+
+@instrumented("extract")
+def extract_transactions(path=DATA_PATH) -> pd.DataFrame:
+    df = apply_schema(_read_with_schema(path))
+    _report_bytes_per_row(df, path)
+    return df
+
+
+class _ByteRange(io.RawIOBase):
+    # Nur die Bytes [start, end) einer Datei lesen, z.B. die seit dem letzten Lauf angehängten Zeilen
+    def __init__(self, path, start: int, end: int):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._left = end - start
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._file.read(min(len(buffer), self._left))
+        buffer[:len(data)] = data
+        self._left -= len(data)
+        return len(data)
+
+    def close(self) -> None:
+        self._file.close()
+        super().close()
+
+
+def _read_csv_chunks(path, chunksize: int, byte_range: tuple[int, int] | None = None, **kwargs):
+    # byte_range=(start, end) an Zeilengrenzen: nur dieser Ausschnitt; ab start > 0 ohne Header-Zeile,
+    # die Spaltennamen kommen aus der ersten Zeile der Datei
+    if byte_range is None:
+        yield from pd.read_csv(path, sep=",", decimal=".", chunksize=chunksize, **kwargs)
+        return
+    start, end = byte_range
+    if start > 0:
+        kwargs |= {"header": None, "names": list(pd.read_csv(path, nrows=0).columns)}
+    with io.BufferedReader(_ByteRange(path, start, end)) as f:
+        yield from pd.read_csv(f, sep=",", decimal=".", chunksize=chunksize, **kwargs)
+
+
+# Streaming: CSV in Chunks fester Größe lesen, statt alles auf einmal in den Speicher zu laden
+def extract_transactions_chunked(chunksize: int = CHUNK_SIZE, path=DATA_PATH, byte_range: tuple[int, int] | None = None):
+    dtypes = {col: "category" for col in CATEGORICAL_COLUMNS}
+    for chunk in _read_csv_chunks(path, chunksize, byte_range, dtype=dtypes):
+        yield apply_schema(chunk)
+
 
-def extract_transactions() -> pd.DataFrame:
-    df = pd.read_csv(DATA_PATH, sep=",", decimal=".")
-    return df
\ No newline at end of file
+# Nur Transaction_ID + Timestamp, z.B. für den Transaction_ID-Index vor dem eigentlichen Transform
+def extract_transaction_keys(chunksize: int = CHUNK_SIZE, path=DATA_PATH, byte_range: tuple[int, int] | None = None):
+    return _read_csv_chunks(path, chunksize, byte_range, usecols=["Transaction_ID", "Timestamp"], dtype=str)
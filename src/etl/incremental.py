@@ -0,0 +1,288 @@
+import hashlib
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import (
+    DATA_PATH,
+    CHUNK_SIZE,
+    OUTPUT_DIR,
+    OUTPUT_FORMAT,
+    PARTITIONS_DIR,
+    MANIFEST_PATH,
+    TX_INDEX_DIR,
+    TX_INDEX_FP_RATE
+)
+from src.etl.artifacts import artifact_path, iter_table, write_table, TableWriter
+from src.etl.schema import ARROW_TYPES, REJECT_ARROW_TYPES
+from src.etl.extract import extract_transactions_chunked, extract_transaction_keys
+from src.etl.transform import (
+    transform_chunk,
+    merge_user_partials,
+    check_user_aggregates_mergeable,
+    finalize_user_aggregation,
+    register_transaction_keys,
+    parse_timestamps,
+    _user_partial_aggregation
+)
+from src.etl.txindex import TransactionIndex, DAY_NS
+from src.metrics import instrumented
+
+# Inkrementeller ETL für eine Quelldatei, an die nur angehängt wird: Clean-Daten werden als
+# Tages-Partitionen (aus Timestamp) geschrieben.
+# Das Manifest (_manifest.json) ist der einzige Stand: Byte-Offset der verarbeiteten Quelle (+ Hash der
+# Bytes davor, um eine umgeschriebene Datei zu erkennen) und Zeilen je Partition. Spätere Läufe lesen
+# nur die Bytes hinter dem Offset; betroffene Tage = Tage der neuen Zeilen + Tage mit ersetzten
+# Transaktionen, deren bisherige Zeilen aus der Partition übernommen werden (nicht aus der Quelle).
+# Alle neuen Dateien (Partitionen, Index, User-State, user_aggregation) gehen erst nach _staging/.
+# Das Manifest mit der Liste dieser Dateien wird zuletzt geschrieben (Commit), danach werden sie an
+# ihren Platz verschoben; bricht das ab, holt der nächste Lauf es nach. Ein Abbruch vor dem Manifest
+# lässt den alten Stand unverändert -> jedes Delta wird genau einmal übernommen.
+# Deduplication über Chunks, Tage und Läufe hinweg über den persistenten Transaction_ID-Index.
+
+CLEAN_DIR = PARTITIONS_DIR / "clean_transactions"
+REJECTS_DIR = PARTITIONS_DIR / "rejects"
+USER_PARTIALS_DIR = PARTITIONS_DIR / "user_partials"
+USER_STATE_PATH = PARTITIONS_DIR / "_user_state.pkl"
+STAGING_DIR = PARTITIONS_DIR / "_staging"
+
+_TAIL_BYTES = 64 * 1024
+
+
+def _parse_partition_dates(timestamps: pd.Series) -> tuple[pd.Series, pd.Series]:
+    # Datumsumwandlung wie im Transform; Tagesnamen nur für die eindeutigen Tage formatieren
+    ts = parse_timestamps(timestamps)
+    codes, days = pd.factorize(ts.dt.normalize())
+    labels = pd.Categorical.from_codes(codes, categories=days.strftime("%Y-%m-%d"))
+    return ts, pd.Series(labels, index=timestamps.index)
+
+
+def _normalize_ids(ids: pd.Series) -> pd.Series:
+    # Transaction_ID wie in der Clean-Ausgabe (strip + lower): der Index muss auch die IDs der bereits
+    # geschriebenen Partitionen wiederfinden
+    return ids.astype("string").str.strip().str.lower()
+
+
+def _source_end(path: Path) -> int:
+    # Ende der letzten vollständigen Zeile; eine noch unvollständige letzte Zeile wartet auf den nächsten Lauf
+    with open(path, "rb") as f:
+        pos = f.seek(0, 2)
+        while pos > 0:
+            start = max(0, pos - _TAIL_BYTES)
+            f.seek(start)
+            newline = f.read(pos - start).rfind(b"\n")
+            if newline >= 0:
+                return start + newline + 1
+            pos = start
+    return 0
+
+
+def _tail_hash(path: Path, offset: int) -> str:
+    # Hash der letzten Bytes vor dem Offset: ändert sich, wenn die Datei nicht nur verlängert wurde
+    with open(path, "rb") as f:
+        f.seek(max(0, offset - _TAIL_BYTES))
+        return hashlib.sha256(f.read(min(offset, _TAIL_BYTES))).hexdigest()
+
+
+def _empty_manifest() -> dict:
+    return {"source": {"offset": 0, "tail": None}, "partitions": {}, "pending": []}
+
+
+def _load_manifest() -> dict:
+    if MANIFEST_PATH.exists():
+        return json.loads(MANIFEST_PATH.read_text())
+    return _empty_manifest()
+
+
+def _save_manifest(manifest: dict) -> None:
+    # Erst in temporäre Datei schreiben, dann ersetzen -> bei Abbruch bleibt der alte Stand gültig
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = MANIFEST_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    tmp.replace(MANIFEST_PATH)
+
+
+def _publish(manifest: dict) -> None:
+    # Dateien eines committeten Laufs an ihren Platz verschieben (None = löschen); wiederholbar
+    for staged, target in manifest["pending"]:
+        target = Path(target)
+        if staged is None:
+            target.unlink(missing_ok=True)
+        elif Path(staged).exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            Path(staged).replace(target)
+    manifest["pending"] = []
+    _save_manifest(manifest)
+    shutil.rmtree(STAGING_DIR, ignore_errors=True)
+
+
+def _partition_file(directory: Path, date: str, fmt: str) -> Path:
+    return artifact_path(directory, f"date={date}", fmt)
+
+
+def _staged(path: Path) -> Path:
+    return STAGING_DIR / path.relative_to(PARTITIONS_DIR)
+
+
+def _day_names(days) -> set:
+    return set(pd.to_datetime(np.asarray(sorted(days), dtype=np.int64) * DAY_NS).strftime("%Y-%m-%d"))
+
+
+@instrumented("incremental")
+def _register_delta(source: Path, byte_range: tuple[int, int], chunksize: int, tx_index: TransactionIndex) -> set:
+    # IDs der neuen Zeilen eintragen; Rückgabe: Tage, auf die sie fallen
+    days = set()
+    for keys in extract_transaction_keys(chunksize, source, byte_range=byte_range):
+        _ts, dates = _parse_partition_dates(keys["Timestamp"])
+        days.update(dates.dropna().unique())
+        keys["Transaction_ID"] = _normalize_ids(keys["Transaction_ID"])
+        register_transaction_keys(tx_index, keys)
+    return days
+
+
+@instrumented("incremental")
+def _write_partitions(
+    source: Path,
+    touched: set,
+    existing: set,
+    byte_range: tuple[int, int],
+    fmt: str,
+    chunksize: int,
+    tx_index: TransactionIndex
+) -> tuple[dict, dict]:
+    # Betroffene Tage nach _staging/ schreiben: erst die bisherigen Zeilen (ohne ersetzte Transaktionen),
+    # dann die neuen Zeilen aus dem Delta
+    writers = {}
+    rows = {}
+    partition_partials = {}
+
+    def write(directory: Path, date: str, frame: pd.DataFrame) -> None:
+        path = _staged(_partition_file(directory, date, fmt))
+        if path not in writers:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            writers[path] = TableWriter(path, types=REJECT_ARROW_TYPES if directory == REJECTS_DIR else ARROW_TYPES)
+        writers[path].write(frame)
+
+    try:
+        for date in sorted(touched & existing):
+            clean = _partition_file(CLEAN_DIR, date, fmt)
+            for chunk in iter_table(clean, chunksize=chunksize) if clean.exists() else []:
+                # filter_batch merkt sich die IDs -> erneut gelieferte Zeilen im Delta fallen weg
+                ids = chunk["Transaction_ID"]
+                chunk = chunk[tx_index.filter_batch(ids, tx_index.loaded_timestamps(ids))]
+                write(CLEAN_DIR, date, chunk)
+                rows[date] = rows.get(date, 0) + len(chunk)
+                if len(chunk):
+                    partition_partials[date] = merge_user_partials(partition_partials.get(date), _user_partial_aggregation(chunk))
+            rejects = _partition_file(REJECTS_DIR, date, fmt)
+            for chunk in iter_table(rejects, chunksize=chunksize) if rejects.exists() else []:
+                write(REJECTS_DIR, date, chunk)
+
+        for chunk in extract_transactions_chunked(chunksize, source, byte_range=byte_range):
+            # Bereits geparsten Timestamp weiterreichen, damit der Transform nicht erneut parst
+            ts, dates = _parse_partition_dates(chunk["Timestamp"])
+            chunk["Timestamp"] = ts
+            chunk["Transaction_ID"] = _normalize_ids(chunk["Transaction_ID"])
+
+            clean_df, rejects_df, partials = transform_chunk(chunk, partition_by=dates, tx_index=tx_index)
+
+            for directory, frame in ((CLEAN_DIR, clean_df), (REJECTS_DIR, rejects_df)):
+                for date, part in frame.groupby(dates.loc[frame.index], observed=True):
+                    write(directory, date, part)
+            for date, n in dates.loc[clean_df.index].value_counts().items():
+                rows[date] = rows.get(date, 0) + int(n)
+
+            for date, partial in partials.items():
+                partition_partials[date] = merge_user_partials(partition_partials.get(date), partial)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    for date, partial in partition_partials.items():
+        path = _staged(USER_PARTIALS_DIR / f"date={date}.pkl")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        pd.to_pickle(partial, path)
+
+    return rows, partition_partials
+
+
+def _merge_user_state(partition_partials: dict, kept: set, rebuild: bool):
+    # Nur neue Tage: in den bestehenden Zustand mergen. Fortgeschriebene Tage: Zustand aus den
+    # Teil-Aggregaten neu zusammensetzen, gespeicherte nur für die unveränderten Tage (kept)
+    if not rebuild and USER_STATE_PATH.exists():
+        state = pd.read_pickle(USER_STATE_PATH)
+        for partial in partition_partials.values():
+            state = merge_user_partials(state, partial)
+        return state
+
+    state = None
+    for date in sorted(kept - partition_partials.keys()):
+        path = USER_PARTIALS_DIR / f"date={date}.pkl"
+        if path.exists():
+            state = merge_user_partials(state, pd.read_pickle(path))
+    for partial in partition_partials.values():
+        state = merge_user_partials(state, partial)
+    return state
+
+
+@instrumented("incremental")
+def run_incremental_etl(output_dir=OUTPUT_DIR, fmt: str = OUTPUT_FORMAT, chunksize: int = CHUNK_SIZE, source: Path = DATA_PATH):
+    check_user_aggregates_mergeable()
+    manifest = _load_manifest()
+    if manifest["pending"]:
+        print("\n Unterbrochene Veröffentlichung des letzten Laufs wird abgeschlossen")
+        _publish(manifest)
+    shutil.rmtree(STAGING_DIR, ignore_errors=True)
+
+    start = manifest["source"]["offset"]
+    end = _source_end(source)
+    if start and (end < start or _tail_hash(source, start) != manifest["source"]["tail"]):
+        print("\n Quelle wurde nicht nur verlängert – alle Partitionen werden neu aufgebaut")
+        manifest, start = _empty_manifest(), 0
+    if end <= start:
+        print("\n Keine neuen Zeilen in der Quelle – überspringe Transform.")
+        return
+
+    existing = set(manifest["partitions"]) if start else set()
+    tx_index = TransactionIndex(TX_INDEX_DIR if start else None, fp_rate=TX_INDEX_FP_RATE)
+    days = _register_delta(source, (start, end), chunksize, tx_index)
+
+    # Neuere Versionen von Transaktionen aus früheren Läufen: Tage mit der älteren Version ebenfalls
+    # fortschreiben, der Index verwirft dabei die ältere Zeile
+    stale = (_day_names(tx_index.superseded_days) & existing) - days
+    if stale:
+        print(f"\n Partitionen mit ersetzten Transaktionen werden neu geschrieben: {sorted(stale)}")
+    touched = days | stale
+    print(
+        f"\n Quelle: {end - start} neue Bytes | Partitionen: {len(touched - existing)} neu | "
+        f"{len(touched & existing)} fortgeschrieben"
+    )
+
+    rows, partition_partials = _write_partitions(source, touched, existing, (start, end), fmt, chunksize, tx_index)
+    tx_index.commit(_staged(TX_INDEX_DIR))
+
+    pending = [[str(path), str(PARTITIONS_DIR / path.relative_to(STAGING_DIR))] for path in sorted(STAGING_DIR.rglob("*")) if path.is_file()]
+    user_state = _merge_user_state(partition_partials, existing - touched, rebuild=not start or bool(touched & existing))
+    if user_state is not None:
+        state_path = _staged(USER_STATE_PATH)
+        pd.to_pickle(user_state, state_path)
+        aggregation_path = STAGING_DIR / artifact_path("", "user_aggregation", fmt)
+        write_table(finalize_user_aggregation(user_state), aggregation_path)
+        pending += [[str(state_path), str(USER_STATE_PATH)], [str(aggregation_path), str(artifact_path(output_dir, "user_aggregation", fmt))]]
+
+    if not start:
+        # Neuaufbau: alte Dateien, die nicht ersetzt werden, beim Veröffentlichen entfernen
+        targets = {target for _staged_path, target in pending}
+        for directory in (CLEAN_DIR, REJECTS_DIR, USER_PARTIALS_DIR, TX_INDEX_DIR):
+            if directory.exists():
+                pending += [[None, str(path)] for path in sorted(directory.iterdir()) if path.is_file() and str(path) not in targets]
+
+    # Commit: Manifest zuletzt; Partitionen, die nicht mehr betroffen sind, bleiben erhalten
+    manifest["source"] = {"offset": end, "tail": _tail_hash(source, end)}
+    manifest["partitions"].update({date: {"rows": rows.get(date, 0)} for date in touched})
+    manifest["pending"] = pending
+    _save_manifest(manifest)
+    _publish(manifest)
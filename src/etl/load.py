@@ -1,9 +1,46 @@
 from pathlib import Path
 
-def load_data(clean, rejects, users, output_dir):
+from src.config import OUTPUT_FORMAT
+from src.etl.artifacts import artifact_path, write_table, TableWriter
+from src.etl.schema import REJECT_ARROW_TYPES
+from src.metrics import instrumented
+
+@instrumented("load")
+def load_data(clean, rejects, users, output_dir, fmt=OUTPUT_FORMAT):
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    write_table(clean, artifact_path(output_dir, "clean_transactions", fmt))
+    write_table(rejects, artifact_path(output_dir, "rejects", fmt))
+    write_table(users, artifact_path(output_dir, "user_aggregation", fmt))
+
+
+# Streaming: Writer für Clean- und Reject-Zeilen, die pro Chunk angehängt werden
+def open_chunk_writers(output_dir, fmt=OUTPUT_FORMAT):
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    return (
+        TableWriter(artifact_path(output_dir, "clean_transactions", fmt)),
+        TableWriter(artifact_path(output_dir, "rejects", fmt), types=REJECT_ARROW_TYPES)
+    )
+
+
+@instrumented("load")
+def append_chunk(clean, rejects, writers):
+    clean_writer, rejects_writer = writers
+    clean_writer.write(clean)
+    rejects_writer.write(rejects)
+
+
+def close_chunk_writers(writers):
+    for writer in writers:
+        writer.close()
+
+
+@instrumented("load")
+def load_users(users, output_dir, fmt=OUTPUT_FORMAT):
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    clean.to_csv(output_dir / "clean_transactions.csv", index=False)
-    rejects.to_csv(output_dir / "rejects.csv", index=False)
-    users.to_csv(output_dir / "user_aggregation.csv", index=False)
\ No newline at end of file
+    write_table(users, artifact_path(output_dir, "user_aggregation", fmt))
@@ -0,0 +1,80 @@
+import contextlib
+import io
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+
+import pandas as pd
+
+from src.config import TRANSFORM_WORKERS
+from src.metrics import instrumented
+from src.etl.transform import (
+    transform_transactions,
+    merge_user_partials,
+    finalize_user_aggregation,
+    _print_missing_values,
+    _print_binary_feature_validation,
+    _convert_and_filter_timestamp,
+    _deduplicate_transactions,
+    _convert_numeric_columns,
+    _split_rejects_and_clean,
+    _normalize_categorical_columns,
+    _user_partial_aggregation,
+    _feature_engineering,
+    _reorder_columns
+)
+
+# Paralleler Transform: Timestamp-Filter und Deduplication brauchen alle Zeilen einer Transaction_ID
+# und laufen im Hauptprozess. Danach werden die Zeilen nach Hash der User_ID auf Partitionen verteilt
+# und die übrigen zeilenweisen Schritte in einem Prozess-Pool ausgeführt. Jede User_ID liegt
+# vollständig in einer Partition -> die User-Teil-Aggregate lassen sich exakt zusammenführen.
+
+
+def _partition_by_user(df: pd.DataFrame, partitions: int) -> list[pd.DataFrame]:
+    part = pd.util.hash_pandas_object(df["User_ID"], index=False).to_numpy() % partitions
+    return [df[part == p] for p in range(partitions) if (part == p).any()]
+
+
+@instrumented("transform", rejects=1)
+def _transform_partition(part: pd.DataFrame):
+    # Läuft im Worker-Prozess; Diagnose-Ausgaben gibt der Hauptprozess einmal für alle Partitionen aus
+    with contextlib.redirect_stdout(io.StringIO()):
+        part = _convert_numeric_columns(part)
+        Clean_data, Rejects = _split_rejects_and_clean(part)
+        Clean_data, _obj_cols = _normalize_categorical_columns(Clean_data)
+        partials = _user_partial_aggregation(Clean_data)
+        Clean_data = _feature_engineering(Clean_data)
+    return Clean_data, Rejects, partials
+
+
+def _merge_sorted(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    # Reihenfolge wie nach der Deduplication (Transaction_ID eindeutig, fehlende ID am Ende)
+    return pd.concat(frames).sort_values("Transaction_ID", na_position="last", kind="stable")
+
+
+@instrumented("transform", rejects=1)
+def transform_transactions_parallel(df: pd.DataFrame, workers: int = TRANSFORM_WORKERS):
+    if workers <= 1:
+        return transform_transactions(df)
+
+    df = df.copy()
+
+    _print_missing_values(df)
+    _print_binary_feature_validation(df)
+
+    df = _convert_and_filter_timestamp(df)
+
+    df = _deduplicate_transactions(df)
+
+    parts = _partition_by_user(df, workers)
+    with ProcessPoolExecutor(max_workers=len(parts)) as pool:
+        results = list(pool.map(_transform_partition, parts))
+
+    Clean_data = _merge_sorted([clean for clean, _rejects, _partials in results])
+    Rejects = _merge_sorted([rejects for _clean, rejects, _partials in results])
+    print(f"\n Paralleler Transform ({len(parts)} Partitionen) – Clean: {len(Clean_data)} | Rejects: {len(Rejects)}")
+
+    Users = finalize_user_aggregation(reduce(merge_user_partials, [p for _c, _r, p in results], None))
+
+    Clean_data = _reorder_columns(Clean_data)
+
+    return Clean_data, Rejects, Users
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+# Deklariertes Schema der Rohdaten (transactions.csv)
+
+# Textspalten mit wenigen Ausprägungen -> category statt Python-Objekte
+CATEGORICAL_COLUMNS = [
+    "Transaction_Type",
+    "Device_Type",
+    "Location",
+    "Merchant_Category",
+    "Card_Type",
+    "Authentication_Method",
+]
+
+# Binäre 0/1-Merkmale -> int8
+BINARY_COLUMNS = [
+    "IP_Address_Flag",
+    "Previous_Fraudulent_Activity",
+    "Is_Weekend",
+    "Fraud_Label",
+]
+
+# Ganzzahlige Zähler -> kleinster passender Integer-Typ
+INTEGER_COLUMNS = {
+    "Daily_Transaction_Count": "int16",
+    "Failed_Transaction_Count_7d": "int16",
+    "Card_Age": "int16",
+}
+
+# Kommazahlen -> float32; Geldbeträge bleiben float64 (Cent-Genauigkeit bei großen Beträgen)
+FLOAT_COLUMNS = {
+    "Transaction_Amount": "float64",
+    "Account_Balance": "float64",
+    "Avg_Transaction_Amount_7d": "float32",
+    "Transaction_Distance": "float32",
+    "Risk_Score": "float32",
+}
+
+NUMERIC_COLUMNS = list(FLOAT_COLUMNS) + list(INTEGER_COLUMNS) + BINARY_COLUMNS
+
+# Spaltentypen der Feather-Ausgaben (Arrow) – fest statt aus dem ersten Chunk abgeleitet, damit ein
+# Chunk mit leeren oder fehlenden Werten den Typ nicht bestimmt; fehlende Werte werden null
+ARROW_TYPES = {
+    "Transaction_ID": "string",
+    "User_ID": "string",
+    **{col: "string" for col in CATEGORICAL_COLUMNS},
+    **{col: "int8" for col in BINARY_COLUMNS},
+    **INTEGER_COLUMNS,
+    **FLOAT_COLUMNS,
+}
+
+# Rejects enthalten gerade die ungültigen Werte (z.B. 0.5 in einer binären Spalte, zu große Zähler)
+# -> Integer-Spalten dort als Gleitkommazahl
+REJECT_ARROW_TYPES = {
+    **ARROW_TYPES,
+    **{col: "double" for col in [*BINARY_COLUMNS, *INTEGER_COLUMNS]},
+}
+
+# Typen, die schon beim CSV-Parsen gesetzt werden können (Integer werden erst danach
+# geprüft und verkleinert, da read_csv zu große Werte stillschweigend überlaufen lässt)
+READ_DTYPES = {
+    **{col: "category" for col in CATEGORICAL_COLUMNS},
+    **FLOAT_COLUMNS,
+}
+
+
+def _fits(values: pd.Series, dtype: str) -> bool:
+    info = np.iinfo(dtype)
+    return values.empty or (values.min() >= info.min and values.max() <= info.max)
+
+
+def _integral(values: pd.Series) -> bool:
+    return not pd.api.types.is_float_dtype(values) or bool((values % 1 == 0).all())
+
+
+def invalid_binary_values(df: pd.DataFrame, columns=BINARY_COLUMNS) -> pd.Series:
+    # Zeilen mit Werten außer 0/1 in binären Spalten (fehlende Werte zählen nicht)
+    mask = pd.Series(False, index=df.index)
+    for col in columns:
+        if col in df.columns:
+            mask |= df[col].notna() & ~df[col].isin([0, 1])
+    return mask
+
+
+def coerce_numeric_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # Nur Spalten anfassen, die noch nicht den Schema-Typ haben
+    for col in NUMERIC_COLUMNS:
+        if col not in df.columns:
+            continue
+
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+
+        if col in FLOAT_COLUMNS:
+            target = FLOAT_COLUMNS[col]
+        else:
+            target = "int8" if col in BINARY_COLUMNS else INTEGER_COLUMNS[col]
+            # Fehlende Werte passen in keinen Integer-Typ
+            if df[col].isna().any():
+                target = "float32"
+            elif not _fits(df[col], target) or not _integral(df[col]):
+                # Nicht abschneiden: ungültige Werte bleiben sichtbar (binäre Spalten -> Rejects)
+                print(f"\n Spalte {col} passt nicht in {target} – Typ bleibt {df[col].dtype}")
+                continue
+
+        if df[col].dtype != target:
+            df[col] = df[col].astype(target)
+
+    return df
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+
+    return coerce_numeric_columns(df)
+
+
+def bytes_per_row(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / max(len(df), 1)
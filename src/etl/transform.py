@@ -1,24 +1,44 @@
 import pandas as pd
 import numpy as np
 
-
+from src.config import USER_AGG_EXTRAS
+from src.etl.aggregation import partial_aggregate, merge_partials, finalize, check_mergeable
+from src.etl.schema import BINARY_COLUMNS, coerce_numeric_columns, invalid_binary_values
+from src.metrics import instrumented, diagnostic
+
+# User-Aggregation (Ausgabename -> (Spalte, Funktion)), siehe src/etl/aggregation.py
+USER_AGGREGATES = {
+    "Total_Transactions": ("Transaction_ID", "count"),
+    "Avg_Transaction_Amount": ("Transaction_Amount", "mean"),
+    "Most_Frequent_Location": ("Location", "mode"),
+    "Fraud_Rate": ("Fraud_Label", "mean"),
+    **USER_AGG_EXTRAS,
+}
+
+
+@diagnostic
 def _print_missing_values(df: pd.DataFrame) -> None:
     # Datenbereinigung: Überprüfung auf fehlende Werte
     print("\n Fehlende Werte pro Spalte:")
     print(df.isna().sum())
 
 
+@diagnostic
 def _print_binary_feature_validation(df: pd.DataFrame) -> None:
-    # Datenbereinigung: Validierung binärer Merkmale (0/1)
-    print("\n", df["Fraud_Label"].value_counts(dropna=False))
-    print("\n", df["Is_Weekend"].value_counts(dropna=False))
-    print("\n", df["Previous_Fraudulent_Activity"].value_counts(dropna=False))
-    print("\n", df["IP_Address_Flag"].value_counts(dropna=False))
+    # Datenbereinigung: Validierung binärer Merkmale (0/1); Fraud_Label fehlt bei neuen Transaktionen (Scoring)
+    for col in ["Fraud_Label", "Is_Weekend", "Previous_Fraudulent_Activity", "IP_Address_Flag"]:
+        if col in df.columns:
+            print("\n", df[col].value_counts(dropna=False))
+
+
+def parse_timestamps(timestamps: pd.Series) -> pd.Series:
+    return pd.to_datetime(timestamps, errors="coerce", utc=True)
 
 
+@instrumented("transform")
 def _convert_and_filter_timestamp(df: pd.DataFrame) -> pd.DataFrame:
     # Datenformatierung: Datumsumwandlung (Timestamp)
-    df["Timestamp"] = pd.to_datetime(df["Timestamp"], errors="coerce", utc=True)
+    df["Timestamp"] = parse_timestamps(df["Timestamp"])
 
     # Datenbereinigung: Entferne Zeilen mit ungültigem Timestamp (Datenqualität)
     before_rows = len(df)
@@ -28,6 +48,7 @@ def _convert_and_filter_timestamp(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+@instrumented("transform")
 def _deduplicate_transactions(df: pd.DataFrame) -> pd.DataFrame:
     # Datenbereinigung: Deduplication - Transaction_ID eindeutig halten (falls doppelt)
     df.sort_values(by=["Transaction_ID", "Timestamp"], inplace=True)
@@ -36,70 +57,104 @@ def _deduplicate_transactions(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def _convert_numeric_columns(df: pd.DataFrame) -> pd.DataFrame:
-    # Datenformatierung: Numerische Spalten konvertieren
-    numeric_cols = [
-        "Transaction_Amount",
-        "Account_Balance",
-        "Daily_Transaction_Count",
-        "Avg_Transaction_Amount_7d",
-        "Failed_Transaction_Count_7d",
-        "Card_Age",
-        "Transaction_Distance",
-        "Risk_Score"
-    ]
-
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
+def register_transaction_keys(tx_index, keys: pd.DataFrame) -> None:
+    # Phase 1 der Deduplication über Chunks/Läufe: Transaction_ID + Timestamp im Index eintragen
+    tx_index.register(keys["Transaction_ID"], parse_timestamps(keys["Timestamp"]))
+
+
+@instrumented("transform")
+def _filter_loaded_transactions(df: pd.DataFrame, tx_index) -> pd.DataFrame:
+    # Deduplication über Chunks und Läufe (Transaction_ID-Index): nur die Zeile mit dem
+    # letzten Timestamp jeder ID bleibt, bereits in früheren Läufen geladene IDs fallen weg
+    keep = tx_index.filter_batch(df["Transaction_ID"], df["Timestamp"])
+    df = df[keep]
+    print(f"\n Duplikate über Chunks/Läufe entfernt: {(~keep).sum()} | Index: {len(tx_index)} IDs")
+    return df
+
 
+@diagnostic
+def _print_numeric_nans(df: pd.DataFrame) -> None:
     # Datenbereinigung: Prüfen, ob numerische Werte nach der Formatierung NaNs enthalten
     num_nan = df.select_dtypes(include=["number"]).isna().sum()
 
     print("\n Numerische Spalten mit NaNs:")
     print(num_nan[num_nan > 0])
 
+
+@instrumented("transform")
+def _convert_numeric_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # Datenformatierung: Numerische Spalten laut Schema – bereits typisierte Spalten werden übersprungen
+    df = coerce_numeric_columns(df)
+
+    _print_numeric_nans(df)
+
     return df
 
 
-def _split_rejects_and_clean(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+@instrumented("transform", rejects=1)
+def _split_rejects_and_clean(df: pd.DataFrame, require_label: bool = True) -> tuple[pd.DataFrame, pd.DataFrame]:
     # Datenqualitätsprüfung → Rejects (Nur wirklich unbrauchbare Daten)
+    # Ohne require_label (Scoring neuer Transaktionen) ist ein fehlendes Fraud_Label kein Reject
+    missing_label = df["Fraud_Label"].isna() if require_label else False
+    # Binäre Merkmale nur 0/1; Fraud_Label beim Scoring nicht prüfen (wird nicht verwendet)
+    binary_columns = BINARY_COLUMNS if require_label else [col for col in BINARY_COLUMNS if col != "Fraud_Label"]
     reject_mask = (
             df["Transaction_ID"].isna() |
             df["User_ID"].isna() |
             df["Timestamp"].isna() |
             df["Transaction_Amount"].isna() |
-            df["Fraud_Label"].isna() |
+            missing_label |
             (df["Transaction_Amount"] <= 0) |
             (df["Daily_Transaction_Count"] < 0) |
             (df["Failed_Transaction_Count_7d"] < 0) |
             (df["Avg_Transaction_Amount_7d"] < 0) |
             (df["Card_Age"] < 0) |
-            (df["Transaction_Distance"] < 0)
+            (df["Transaction_Distance"] < 0) |
+            invalid_binary_values(df, binary_columns)
     )
     Rejects = df[reject_mask].copy()
-    # Speicherung bereinigter Teil in Clean_data für weitere Arbeit
-    Clean_data = df[~reject_mask].copy()
+    # Speicherung bereinigter Teil in Clean_data für weitere Arbeit; Spalten, die wegen ungültiger
+    # Werte noch nicht den Schema-Typ haben, jetzt umwandeln
+    Clean_data = coerce_numeric_columns(df[~reject_mask].copy())
     print(f"\n Reject Mask – Clean: {len(Clean_data)} | Rejects: {len(Rejects)}")
     return Clean_data, Rejects
 
 
+@diagnostic
 def _print_empty_string_checks(Clean_data: pd.DataFrame) -> None:
     # Datenbereinigung: Prüfung auf leere oder whitespace-only Strings in Textspalten
-    obj_cols = Clean_data.select_dtypes(include=["object", "string"]).columns
-    empty_counts = (
-        Clean_data[obj_cols]
-        .apply(lambda col: col.astype(str).str.strip().eq(""))
-        .sum()
+    obj_cols = Clean_data.select_dtypes(include=["object", "string", "category"]).columns
+    # Pro Spalte zählen: apply() auf einem leeren Chunk liefert die Spalten unverändert (category) zurück
+    empty_counts = pd.Series(
+        {col: int(Clean_data[col].astype(str).str.strip().eq("").sum()) for col in obj_cols},
+        dtype="int64"
     )
     print("\n Leere Strings (nicht NaN):")
     print(empty_counts[empty_counts > 0])
 
 
+def _normalize_categories(col: pd.Series) -> pd.Series:
+    # Bei category nur die (wenigen) Kategorien normalisieren und die Codes umhängen
+    categories = col.cat.categories.astype("string").str.strip().str.lower()
+    new_categories, mapping = np.unique(categories.to_numpy(dtype=object), return_inverse=True)
+    codes = col.cat.codes.to_numpy()
+    new_codes = np.where(codes >= 0, mapping[codes], -1)
+    return pd.Series(
+        pd.Categorical.from_codes(new_codes, categories=new_categories),
+        index=col.index,
+        name=col.name
+    )
+
+
+@instrumented("transform")
 def _normalize_categorical_columns(Clean_data: pd.DataFrame) -> tuple[pd.DataFrame, pd.Index]:
     # Alle Objects, bzw. kategorische vars in lower case
-    obj_cols = Clean_data.select_dtypes(include=["object", "string"]).columns
+    obj_cols = Clean_data.select_dtypes(include=["object", "string", "category"]).columns
     for col in obj_cols:
+        if isinstance(Clean_data[col].dtype, pd.CategoricalDtype):
+            Clean_data[col] = _normalize_categories(Clean_data[col])
+            continue
+
         Clean_data[col] = (
             Clean_data[col]
             .astype("string")
@@ -112,6 +167,12 @@ def _normalize_categorical_columns(Clean_data: pd.DataFrame) -> tuple[pd.DataFra
     return Clean_data, obj_cols
 
 
+@diagnostic
+def _print_info(df: pd.DataFrame) -> None:
+    print("\n", df.info())
+
+
+@instrumented("transform")
 def _feature_engineering(Clean_data: pd.DataFrame) -> pd.DataFrame:
     # Datenanreicherung: daytime extrahieren aus timestemp
     Clean_data["Hour"] = Clean_data["Timestamp"].dt.hour
@@ -126,29 +187,53 @@ def _feature_engineering(Clean_data: pd.DataFrame) -> pd.DataFrame:
     # Löschen von Timestamp, da Aufteilung in hour und isWeekend -> Relevanter für weiteren Prozess
     Clean_data.drop(columns=["Timestamp"], inplace=True)
 
-    print("\n", Clean_data.info())
+    _print_info(Clean_data)
     return Clean_data
 
 
-def _user_aggregation(Clean_data: pd.DataFrame) -> pd.DataFrame:
-    # Datenaggregation + Datenanreicherung: Wichtige Userdaten -> Eventuell wichtig für Analysen
-    user_aggregation = (
-        Clean_data
-        .groupby("User_ID")
-        .agg(
-            Total_Transactions=("Transaction_ID", "count"),
-            Avg_Transaction_Amount=("Transaction_Amount", "mean"),
-            Most_Frequent_Location=("Location", lambda x: x.value_counts().idxmax()),
-            Fraud_Rate=("Fraud_Label", "mean")
-        )
-        .reset_index()
-    )
+@instrumented("transform")
+def _user_partial_aggregation(Clean_data: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    # Datenaggregation: Teil-Aggregate, die sich über mehrere Chunks zusammenführen lassen
+    return partial_aggregate(Clean_data, "User_ID", USER_AGGREGATES)
 
+
+def check_user_aggregates_mergeable() -> None:
+    # Vor Streaming/inkrementellen Läufen: dort liegen die Zeilen eines Users in mehreren Chunks
+    check_mergeable(USER_AGGREGATES)
+
+
+def merge_user_partials(left: tuple[pd.DataFrame, dict] | None, right: tuple[pd.DataFrame, dict]):
+    # Teil-Aggregate zweier Chunks zusammenführen
+    return merge_partials(left, right, USER_AGGREGATES)
+
+
+@diagnostic
+def _print_user_aggregation(user_aggregation: pd.DataFrame) -> None:
     print("\n", user_aggregation.head())
     print("\n", user_aggregation.info())
+
+
+@instrumented("transform")
+def finalize_user_aggregation(partials: tuple[pd.DataFrame, dict]) -> pd.DataFrame:
+    user_aggregation = finalize(partials, USER_AGGREGATES)
+
+    _print_user_aggregation(user_aggregation)
     return user_aggregation
 
 
+def _user_aggregation(Clean_data: pd.DataFrame) -> pd.DataFrame:
+    # Datenaggregation + Datenanreicherung: Wichtige Userdaten -> Eventuell wichtig für Analysen
+    return finalize_user_aggregation(_user_partial_aggregation(Clean_data))
+
+
+@diagnostic
+def _print_column_order(df: pd.DataFrame) -> None:
+    print("\n Neue Spaltenreihenfolge:")
+    for i, c in enumerate(df.columns):
+        print(i, c)
+
+
+@instrumented("transform")
 def _reorder_columns(Clean_data: pd.DataFrame) -> pd.DataFrame:
     # Datenreihenfolge sinnvoll umändern
     cols = list(Clean_data.columns)
@@ -174,16 +259,13 @@ def _reorder_columns(Clean_data: pd.DataFrame) -> pd.DataFrame:
     # Neue Reihenfolge anwenden
     Clean_data = Clean_data[cols]
 
-    print("\n Neue Spaltenreihenfolge:")
-    for i, c in enumerate(Clean_data.columns):
-        print(i, c)
+    _print_column_order(Clean_data)
 
     return Clean_data
 
-# Main-Funktion für Transform-Prozess
-def transform_transactions(df: pd.DataFrame):
-    df = df.copy()
-
+@instrumented("transform", rejects=1)
+def _transform_rows(df: pd.DataFrame, tx_index=None, require_label: bool = True) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # Zeilenweise Schritte – identisch für kompletten Datensatz und einzelne Chunks
     _print_missing_values(df)
     _print_binary_feature_validation(df)
 
@@ -191,19 +273,58 @@ def transform_transactions(df: pd.DataFrame):
 
     df = _deduplicate_transactions(df)
 
+    if tx_index is not None:
+        df = _filter_loaded_transactions(df, tx_index)
+
     df = _convert_numeric_columns(df)
 
-    Clean_data, Rejects = _split_rejects_and_clean(df)
+    Clean_data, Rejects = _split_rejects_and_clean(df, require_label)
 
     _print_empty_string_checks(Clean_data)
 
     Clean_data, _obj_cols = _normalize_categorical_columns(Clean_data)
 
-    Clean_data = _feature_engineering(Clean_data)
+    return Clean_data, Rejects
+
+
+# Main-Funktion für Transform-Prozess
+@instrumented("transform", rejects=1)
+def transform_transactions(df: pd.DataFrame):
+    df = df.copy()
 
+    Clean_data, Rejects = _transform_rows(df)
+
+    # Aggregation vor dem Feature Engineering, solange der Timestamp noch vorhanden ist
     Users = _user_aggregation(Clean_data)
 
+    Clean_data = _feature_engineering(Clean_data)
+
     Clean_data = _reorder_columns(Clean_data)
 
     return Clean_data, Rejects, Users
 
+
+# Streaming-Variante: ein Chunk wird transformiert, User-Aggregation bleibt als Teil-Aggregat.
+# Ohne tx_index greift die Deduplication nur innerhalb eines Chunks.
+# Mit partition_by (z.B. Tag je Zeile) gibt es ein Teil-Aggregat pro Partition.
+# require_label=False (Scoring): Fraud_Label darf fehlen oder leer sein, ohne User-Aggregation (Fraud_Rate).
+@instrumented("transform", rejects=1)
+def transform_chunk(chunk: pd.DataFrame, partition_by: pd.Series | None = None, tx_index=None, require_label: bool = True):
+    Clean_data, Rejects = _transform_rows(chunk, tx_index, require_label)
+
+    if not require_label:
+        partials = None
+    elif partition_by is None:
+        partials = _user_partial_aggregation(Clean_data)
+    else:
+        keys = partition_by.loc[Clean_data.index]
+        partials = {
+            key: _user_partial_aggregation(part)
+            for key, part in Clean_data.groupby(keys, observed=True)
+        }
+
+    Clean_data = _feature_engineering(Clean_data)
+
+    Clean_data = _reorder_columns(Clean_data)
+
+    return Clean_data, Rejects, partials
@@ -0,0 +1,325 @@
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import TX_INDEX_BUFFER_ROWS
+
+# Persistenter Transaction_ID-Index für Deduplication über Batches und Läufe hinweg.
+# Gespeichert werden 64-bit-Hashes der Transaction_IDs (sortiert, memory-mapped) und der
+# neueste Timestamp je ID. Ein Bloom-Filter davor beantwortet "sicher neu" ohne
+# Zugriff auf das sortierte Array. Regel wie in _deduplicate_transactions: letzter Timestamp gewinnt.
+#
+# Ablauf in zwei Phasen:
+#   1. register(): alle IDs + Timestamps eines Laufs eintragen -> Index kennt pro ID den Gewinner
+#   2. filter_batch(): beim Transform nur die Gewinner-Zeile jeder ID (einmal) durchlassen
+#      (setzt voraus, dass jede Zeile des Laufs vorher in register() eingetragen wurde)
+#
+# Speicher unabhängig von der Zahl der IDs: neue Einträge landen unsortiert in einem Puffer
+# (höchstens TX_INDEX_BUFFER_ROWS). Beim Flush wird nur der Puffer sortiert und blockweise mit dem
+# sortierten Delta-Lauf auf der Platte (memmap in einem temporären Verzeichnis) gemergt; ebenso
+# commit() mit der Basis. Pro Chunk wird nichts mehr neu sortiert; "bereits ausgegeben" ist ein
+# Flag je Delta-Eintrag statt eines wachsenden sortierten Arrays.
+
+DAY_NS = 86_400 * 10**9
+_MISSING = np.iinfo(np.int64).min
+_BLOCK = 1 << 20
+# Platzhalter für fehlende Transaction_IDs (kommt in echten IDs nicht vor)
+_MISSING_ID = "\x00missing"
+
+
+def hash_ids(ids: pd.Series) -> np.ndarray:
+    # Fehlende IDs zählen wie bei drop_duplicates im vollen ETL als eine gemeinsame ID
+    return pd.util.hash_array(ids.astype("string").fillna(_MISSING_ID).to_numpy(dtype=object))
+
+
+class BloomFilter:
+    def __init__(self, bits: np.ndarray, num_hashes: int):
+        self.bits = bits
+        self.num_hashes = num_hashes
+
+    @classmethod
+    def for_capacity(cls, capacity: int, fp_rate: float) -> "BloomFilter":
+        # Optimale Größe: m = -n ln(p) / ln(2)^2, k = m/n ln(2)
+        capacity = max(capacity, 1)
+        num_bits = int(np.ceil(-capacity * np.log(fp_rate) / np.log(2) ** 2))
+        num_bits = max(64, (num_bits + 7) // 8 * 8)
+        num_hashes = max(1, int(round(num_bits / capacity * np.log(2))))
+        return cls(np.zeros(num_bits // 8, dtype=np.uint8), num_hashes)
+
+    def _positions(self, keys: np.ndarray) -> np.ndarray:
+        # Double Hashing: h1 + i*h2 aus den oberen/unteren 32 Bit des Schlüssels
+        num_bits = np.uint64(self.bits.size * 8)
+        h1 = keys & np.uint64(0xFFFFFFFF)
+        h2 = (keys >> np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        return (h1[:, None] + steps[None, :] * h2[:, None]) % num_bits
+
+    def add(self, keys: np.ndarray) -> None:
+        pos = self._positions(keys).ravel()
+        np.bitwise_or.at(self.bits, pos >> np.uint64(3), np.left_shift(1, pos & np.uint64(7)).astype(np.uint8))
+
+    def might_contain(self, keys: np.ndarray) -> np.ndarray:
+        pos = self._positions(keys)
+        hit = (self.bits[pos >> np.uint64(3)] >> (pos & np.uint64(7)).astype(np.uint8)) & 1
+        return hit.all(axis=1)
+
+
+class TransactionIndex:
+    # path=None: nur im Speicher bzw. temporär auf der Platte (Deduplication über die Chunks eines Laufs)
+    def __init__(self, path=None, fp_rate: float = 0.01, buffer_rows: int = TX_INDEX_BUFFER_ROWS):
+        self.path = Path(path) if path is not None else None
+        self.fp_rate = fp_rate
+        self.buffer_rows = buffer_rows
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.ts = np.empty(0, dtype=np.int64)
+        self.bloom = None
+
+        if self.path is not None and (self.path / "keys.npy").exists():
+            self._load(self.path)
+
+        # Änderungen dieses Laufs: sortierter Delta-Lauf (+ Flag "ausgegeben") und unsortierter Puffer,
+        # werden mit commit() in die Basis gemerged
+        self._delta_keys = np.empty(0, dtype=np.uint64)
+        self._delta_ts = np.empty(0, dtype=np.int64)
+        self._delta_emitted = np.empty(0, dtype=bool)
+        self._buffer = []
+        self._buffered = 0
+        self._spill_dir = None
+        self._spill_files = []
+        self._spills = 0
+
+        # Statistik: IDs, deren in früheren Läufen geladene Version ersetzt wird, und deren Tage
+        self.superseded = 0
+        self.superseded_days = set()
+
+    def _load(self, path: Path) -> None:
+        self.keys = np.load(path / "keys.npy", mmap_mode="r")
+        self.ts = np.load(path / "ts.npy", mmap_mode="r")
+        bloom_bits = np.load(path / "bloom.npy")
+        self.bloom = BloomFilter(bloom_bits, int((path / "bloom_hashes.txt").read_text()))
+
+    def __len__(self) -> int:
+        return len(self.keys) + len(self._delta_keys) + self._buffered
+
+    @staticmethod
+    def _search(sorted_keys: np.ndarray, sorted_ts: np.ndarray, keys: np.ndarray):
+        found = np.zeros(len(keys), dtype=bool)
+        stored = np.full(len(keys), _MISSING, dtype=np.int64)
+        if len(sorted_keys):
+            pos = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+            found = sorted_keys[pos] == keys
+            stored[found] = sorted_ts[pos[found]]
+        return found, stored
+
+    def _flush(self) -> None:
+        # Puffer einmal sortieren und mit dem Delta-Lauf in eine neue Datei mergen (Merge-on-Flush)
+        if not self._buffer:
+            return
+        keys, ts = _latest_per_key(
+            np.concatenate([k for k, _t in self._buffer]),
+            np.concatenate([t for _k, t in self._buffer])
+        )
+        self._buffer, self._buffered = [], 0
+        run = (self._delta_keys, self._delta_ts, self._delta_emitted)
+        self._delta_keys, self._delta_ts, self._delta_emitted = self._spill(_merge_sorted(run, (keys, ts, None)))
+
+    def _spill(self, blocks) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.TemporaryDirectory(prefix="txindex-")
+        self._spills += 1
+        target = Path(self._spill_dir.name) / f"delta-{self._spills}"
+        files = [target.with_suffix(f".{name}") for name in ("keys", "ts", "emitted")]
+
+        n = 0
+        with open(files[0], "wb") as fk, open(files[1], "wb") as ft, open(files[2], "wb") as fe:
+            for keys, ts, emitted in blocks:
+                fk.write(keys.tobytes())
+                ft.write(ts.tobytes())
+                fe.write(emitted.tobytes())
+                n += len(keys)
+
+        # Vorherigen Lauf löschen (die Dateien bleiben bis zum Schließen der memmaps lesbar)
+        for old in self._spill_files:
+            old.unlink(missing_ok=True)
+        self._spill_files = files
+        if not n:
+            return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64), np.empty(0, dtype=bool)
+        return (
+            np.memmap(files[0], dtype=np.uint64, mode="r", shape=(n,)),
+            np.memmap(files[1], dtype=np.int64, mode="r", shape=(n,)),
+            np.memmap(files[2], dtype=bool, mode="r+", shape=(n,)),
+        )
+
+    def _delta_positions(self, keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        if not len(self._delta_keys):
+            return np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool)
+        pos = np.minimum(np.searchsorted(self._delta_keys, keys), len(self._delta_keys) - 1)
+        return pos, self._delta_keys[pos] == keys
+
+    def lookup(self, keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # Rückgabe: bekannt ja/nein und gespeicherter Timestamp (ns)
+        self._flush()
+        found = np.zeros(len(keys), dtype=bool)
+        stored = np.full(len(keys), _MISSING, dtype=np.int64)
+
+        # Basis: nur Kandidaten, die der Bloom-Filter nicht ausschließt, per Binärsuche prüfen
+        candidates = self.bloom.might_contain(keys) if self.bloom is not None else np.ones(len(keys), dtype=bool)
+        if len(self.keys) and candidates.any():
+            f, s = self._search(self.keys, self.ts, keys[candidates])
+            found[candidates] = f
+            stored[candidates] = s
+
+        # Delta dieses Laufs überschreibt die Basis (neuere Timestamps)
+        if len(self._delta_keys):
+            f, s = self._search(self._delta_keys, self._delta_ts, keys)
+            found |= f
+            stored = np.where(f, np.maximum(stored, s), stored)
+
+        return found, stored
+
+    def loaded_timestamps(self, ids: pd.Series) -> pd.Series:
+        # Timestamp der in früheren Läufen geladenen Version (Basis), NaT für unbekannte IDs –
+        # die Clean-Ausgabe enthält keinen Timestamp mehr
+        _found, stored = self._search(self.keys, self.ts, hash_ids(ids))
+        return pd.Series(stored.view("datetime64[ns]"), index=ids.index).dt.tz_localize("UTC")
+
+    def upsert(self, keys: np.ndarray, ts: np.ndarray) -> None:
+        # Nur puffern; sortiert und gemergt wird erst beim Flush
+        self._buffer.append((np.asarray(keys, dtype=np.uint64), np.asarray(ts, dtype=np.int64)))
+        self._buffered += len(keys)
+        if self._buffered >= self.buffer_rows:
+            self._flush()
+
+    @staticmethod
+    def _keys_and_ts(ids: pd.Series, timestamps: pd.Series):
+        valid = timestamps.notna().to_numpy()
+        keys = hash_ids(ids[valid])
+        ts = pd.DatetimeIndex(timestamps[valid]).as_unit("ns").asi8
+        return valid, keys, ts
+
+    def register(self, ids: pd.Series, timestamps: pd.Series) -> None:
+        # Phase 1: IDs eintragen; neuere Versionen von Transaktionen aus früheren Läufen merken
+        _valid, keys, ts = self._keys_and_ts(ids, timestamps)
+        if not len(keys):
+            return
+
+        candidates = self.bloom.might_contain(keys) if self.bloom is not None else np.ones(len(keys), dtype=bool)
+        if len(self.keys) and candidates.any():
+            found, stored = self._search(self.keys, self.ts, keys[candidates])
+            superseded = found & (ts[candidates] > stored)
+            self.superseded += int(superseded.sum())
+            self.superseded_days.update((stored[superseded] // DAY_NS).tolist())
+
+        self.upsert(keys, ts)
+
+    def filter_batch(self, ids: pd.Series, timestamps: pd.Series) -> np.ndarray:
+        # Phase 2: nur Zeilen mit dem Gewinner-Timestamp ihrer ID behalten, jede ID nur einmal
+        keep = np.ones(len(ids), dtype=bool)
+        valid, keys, ts = self._keys_and_ts(ids, timestamps)
+        if not len(keys):
+            return keep
+
+        _found, winner = self.lookup(keys)
+        pos, in_delta = self._delta_positions(keys)
+        emitted = np.zeros(len(keys), dtype=bool)
+        emitted[in_delta] = self._delta_emitted[pos[in_delta]]
+        keep_valid = (ts >= winner) & ~emitted
+
+        # Gleicher Gewinner-Timestamp mehrfach im Batch -> nur die erste Zeile
+        idx = np.flatnonzero(keep_valid)
+        keep_valid[idx[pd.Series(keys[idx]).duplicated().to_numpy()]] = False
+        keep[valid] = keep_valid
+
+        # Ausgegebene IDs im Delta markieren; IDs nur in der Basis wurden in diesem Lauf nicht
+        # registriert und kommen daher nicht noch einmal vor
+        mark = keep_valid & in_delta
+        self._delta_emitted[pos[mark]] = True
+        return keep
+
+    def commit(self, path=None) -> None:
+        # path: anderes Zielverzeichnis als self.path (z.B. Staging, erst später veröffentlicht)
+        path = Path(path) if path is not None else self.path
+        if path is None:
+            return
+        self._flush()
+
+        # Basis und Delta blockweise in die neuen .npy-Dateien mergen; Größe vorab aus der Überlappung
+        overlap = sum(
+            int(_contains(self.keys, self._delta_keys[start:start + _BLOCK]).sum())
+            for start in range(0, len(self._delta_keys), _BLOCK)
+        )
+        total = len(self.keys) + len(self._delta_keys) - overlap
+        bloom = BloomFilter.for_capacity(total, self.fp_rate)
+
+        # Über temporäre Dateien ersetzen, damit ein Abbruch keinen halben Index hinterlässt
+        path.mkdir(parents=True, exist_ok=True)
+        tmp = {name: path / f"{name}.tmp.npy" for name in ("keys", "ts", "bloom")}
+        out_keys = np.lib.format.open_memmap(tmp["keys"], mode="w+", dtype=np.uint64, shape=(total,))
+        out_ts = np.lib.format.open_memmap(tmp["ts"], mode="w+", dtype=np.int64, shape=(total,))
+        written = 0
+        for keys, ts, _emitted in _merge_sorted((self.keys, self.ts, None), (self._delta_keys, self._delta_ts, None)):
+            out_keys[written:written + len(keys)] = keys
+            out_ts[written:written + len(keys)] = ts
+            bloom.add(keys)
+            written += len(keys)
+        out_keys.flush()
+        out_ts.flush()
+        del out_keys, out_ts
+        np.save(tmp["bloom"], bloom.bits)
+
+        for name, file in tmp.items():
+            file.replace(path / f"{name}.npy")
+        (path / "bloom_hashes.txt").write_text(str(bloom.num_hashes))
+
+        self._load(path)
+        self._delta_keys = np.empty(0, dtype=np.uint64)
+        self._delta_ts = np.empty(0, dtype=np.int64)
+        self._delta_emitted = np.empty(0, dtype=bool)
+
+
+def _contains(sorted_keys: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    if not len(sorted_keys):
+        return np.zeros(len(keys), dtype=bool)
+    pos = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return sorted_keys[pos] == keys
+
+
+def _latest_per_key(keys: np.ndarray, ts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Sortiert nach Schlüssel und behält pro Schlüssel den letzten (größten) Timestamp
+    if not len(keys):
+        return keys, ts
+    order = np.argsort(keys, kind="stable")
+    keys, ts = keys[order], ts[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[starts], np.maximum.reduceat(ts, starts)
+
+
+def _merge_sorted(a: tuple, b: tuple, block: int = _BLOCK):
+    # Zwei sortierte Läufe (keys, ts, emitted oder None; Schlüssel je Lauf eindeutig) blockweise mergen.
+    # Gleiche Schlüssel: größter Timestamp, Flags ODER-verknüpft. Speicher O(Block) statt O(Lauf)
+    (a_keys, a_ts, a_flags), (b_keys, b_ts, b_flags) = a, b
+    i = j = 0
+    while i < len(a_keys) or j < len(b_keys):
+        # Obergrenze des Blocks: kleinster Blockend-Schlüssel der beiden Läufe
+        bounds = []
+        if i < len(a_keys):
+            bounds.append(a_keys[min(i + block, len(a_keys)) - 1])
+        if j < len(b_keys):
+            bounds.append(b_keys[min(j + block, len(b_keys)) - 1])
+        bound = min(bounds)
+        i_end = i + int(np.searchsorted(a_keys[i:i + block], bound, side="right"))
+        j_end = j + int(np.searchsorted(b_keys[j:j + block], bound, side="right"))
+
+        keys = np.concatenate([a_keys[i:i_end], b_keys[j:j_end]])
+        ts = np.concatenate([a_ts[i:i_end], b_ts[j:j_end]])
+        flags = np.concatenate([
+            a_flags[i:i_end] if a_flags is not None else np.zeros(i_end - i, dtype=bool),
+            b_flags[j:j_end] if b_flags is not None else np.zeros(j_end - j, dtype=bool),
+        ])
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        yield keys[starts], np.maximum.reduceat(ts[order], starts), np.logical_or.reduceat(flags[order], starts)
+        i, j = i_end, j_end
@@ -1,137 +1,212 @@
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import plotly.express as px
-
-from src.config import CLEAN_TRANSACTIONS_PATH
-
-# Einlesen des cleaned Datasets
-
-def explore(path: Path = CLEAN_TRANSACTIONS_PATH):
-    df = pd.read_csv(path)
-    df["Fraud_Label_str"] = df["Fraud_Label"].map({0: "Non-Fraud", 1: "Fraud"})
-
+import plotly.graph_objects as go
+
+from src.config import (
+    CLEAN_TRANSACTIONS_PATH,
+    CHUNK_SIZE,
+    EXPLORE_RENDER,
+    EXPLORE_DIR,
+    EXPLORE_MAX_ROWS,
+    EXPLORE_KDE_POINTS
+)
+from src.etl.artifacts import iter_table
+from src.metrics import instrumented
+
+# Explorative Plots aus vorab berechneten Zusammenfassungen statt aus allen Zeilen:
+# - ein Durchgang über die Clean-Daten in Chunks, nur die benötigten Spalten
+# - Zähler pro Gruppe und Klasse werden über die Chunks aufsummiert (exakt)
+# - Quantile (Boxplots) und KDE auf einer gleichverteilten Stichprobe von höchstens EXPLORE_MAX_ROWS
+#   Zeilen pro Klasse (kleinste Zufallsschlüssel) -> Speicher unabhängig von der Dateigröße
+# - KDE gebinnt: Histogramm auf EXPLORE_KDE_POINTS Punkten, gefaltet mit einem Gauß-Kern
+# Die Figuren enthalten nur diese Zusammenfassungen (einige hundert Werte pro Figur).
+
+LABELS = {0: "Non-Fraud", 1: "Fraud"}
+GROUP_COLUMNS = ["Location", "Previous_Fraudulent_Activity", "IP_Address_Flag", "Card_Type"]
+NUMERIC_COLUMNS = ["Risk_Score", "Amount_to_Balance_Ratio", "Failed_Transaction_Count_7d"]
+
+
+def _keep_smallest(sample: dict, max_rows: int) -> dict:
+    # Stichprobe auf die max_rows kleinsten Schlüssel kürzen (= gleichverteilte Stichprobe ohne Zurücklegen)
+    keys = np.concatenate(sample["keys"])
+    values = np.concatenate(sample["values"])
+    if len(keys) > max_rows:
+        keep = np.argpartition(keys, max_rows - 1)[:max_rows]
+        keys, values = keys[keep], values[keep]
+    return {"keys": [keys], "values": [values], "size": len(keys)}
+
+
+def summarize(
+    path: Path = CLEAN_TRANSACTIONS_PATH,
+    chunksize: int = CHUNK_SIZE,
+    max_rows: int = EXPLORE_MAX_ROWS,
+    seed: int = 42
+) -> dict:
+    rng = np.random.default_rng(seed)
+    classes = pd.Series(0, index=list(LABELS), dtype="int64")
+    counts = {col: [] for col in GROUP_COLUMNS}
+    samples = {label: {"keys": [], "values": [], "size": 0} for label in LABELS}
+
+    for chunk in iter_table(path, ["Fraud_Label", *GROUP_COLUMNS, *NUMERIC_COLUMNS], chunksize):
+        labels = chunk["Fraud_Label"].astype(int)
+        classes = classes.add(labels.value_counts(), fill_value=0)
+        for col in GROUP_COLUMNS:
+            counts[col].append(chunk.groupby([chunk[col], labels], observed=True).size())
+
+        values = chunk[NUMERIC_COLUMNS].to_numpy(np.float32)
+        for label, sample in samples.items():
+            mask = (labels == label).to_numpy()
+            sample["keys"].append(rng.random(int(mask.sum())))
+            sample["values"].append(values[mask])
+            sample["size"] += int(mask.sum())
+            if sample["size"] > 2 * max_rows:
+                samples[label] = _keep_smallest(sample, max_rows)
+
+    for label, sample in samples.items():
+        samples[label] = _keep_smallest(sample, max_rows) if sample["keys"] else {"values": [np.empty((0, len(NUMERIC_COLUMNS)), np.float32)]}
+
+    return {
+        "classes": classes.astype("int64"),
+        "counts": {
+            col: pd.concat(parts).groupby(level=[0, 1]).sum().unstack(fill_value=0).reindex(columns=list(LABELS), fill_value=0)
+            for col, parts in counts.items()
+        },
+        "samples": {label: s["values"][0] for label, s in samples.items()},
+    }
+
+
+def _box_stats(values: np.ndarray) -> dict | None:
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return None
+    q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    # Whisker wie bei plotly: äußerste Werte innerhalb von 1.5 IQR
+    return {
+        "q1": q1, "median": median, "q3": q3, "mean": values.mean(),
+        "lowerfence": values[values >= q1 - 1.5 * iqr].min(),
+        "upperfence": values[values <= q3 + 1.5 * iqr].max(),
+    }
+
+
+def _kde(values: np.ndarray, points: int = EXPLORE_KDE_POINTS) -> tuple[np.ndarray, np.ndarray]:
+    values = values[~np.isnan(values)].astype(np.float64)
+    if len(values) < 2:
+        return np.empty(0), np.empty(0)
+    # Bandbreite nach Silverman, Gitter 3 Bandbreiten über Minimum/Maximum hinaus
+    bandwidth = 1.06 * values.std() * len(values) ** -0.2 or 1e-3
+    grid = np.linspace(values.min() - 3 * bandwidth, values.max() + 3 * bandwidth, points)
+    step = grid[1] - grid[0]
+    hist, _edges = np.histogram(values, bins=points, range=(grid[0] - step / 2, grid[-1] + step / 2))
+
+    offsets = np.arange(-points + 1, points) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2)
+    # Volle Faltung (2 * points - 1 Werte mehr als das Gitter), den zum Gitter passenden Ausschnitt behalten
+    density = np.convolve(hist, kernel)[points - 1:2 * points - 1]
+    return grid, density / (density.sum() * step)
+
+
+def _rate_frame(counts: pd.DataFrame, column: str) -> pd.DataFrame:
+    total = counts.sum(axis=1)
+    return pd.DataFrame({column: counts.index, "Transactions": total.to_numpy(), "Fraud_Rate": (counts[1] / total).to_numpy()})
+
+
+def build_figures(summary: dict) -> dict[str, go.Figure]:
+    counts, samples = summary["counts"], summary["samples"]
+    figures = {}
 
     # Imbalance zwischen Fraud und non-Fraud
-    fig = px.histogram(
-        df,
-        x="Fraud_Label_str",
+    classes = summary["classes"]
+    figures["class_imbalance"] = px.bar(
+        x=[LABELS[label] for label in classes.index], y=classes.to_numpy(),
+        labels={"x": "Fraud_Label_str", "y": "count"},
         title="Class Imbalance: Fraud vs. Non-Fraud"
     )
-    fig.show()
-
-    # Fraud-Rate nach Location
-    if "Location" in df.columns:
-        loc = (
-            df.groupby("Location", as_index=False)
-            .agg(Transactions=("Transaction_ID", "count"),
-                 Fraud_Rate=("Fraud_Label", "mean"))
-        )
 
-        # Nur Locations mit genügend Daten, sonst sind Raten instabil
-        loc = loc[loc["Transactions"] >= 100].sort_values("Fraud_Rate", ascending=False).head(15)
-
-        fig = px.bar(
-            loc, x="Fraud_Rate", y="Location",
-            orientation="h",
-            title="Top Locations nach Fraud-Rate (min. 100 Transaktionen)"
-        )
-        fig.show()
-
-    # Risk Score nach Fraud
-    fig = px.violin(
-        df,
-        x="Fraud_Label_str",
-        y="Risk_Score",
-        box=True,
-        title="Risk Score Distribution: Fraud vs. Non-Fraud"
+    # Fraud-Rate nach Location; nur Locations mit genügend Daten, sonst sind Raten instabil
+    loc = _rate_frame(counts["Location"], "Location")
+    loc = loc[loc["Transactions"] >= 100].sort_values("Fraud_Rate", ascending=False).head(15)
+    figures["fraud_rate_by_location"] = px.bar(
+        loc, x="Fraud_Rate", y="Location",
+        orientation="h",
+        title="Top Locations nach Fraud-Rate (min. 100 Transaktionen)"
     )
-    fig.show()
-
-    # Amount to Balance Ratio nach Fraud
-    fig = px.box(
-        df,
-        x="Fraud_Label_str",
-        y="Amount_to_Balance_Ratio",
-        title="Amount / Balance Ratio: Fraud vs. Non-Fraud"
-    )
-    fig.show()
 
-    # Vorangegangene betrügerische Aktivitäten nach Fraud
-    prev_fraud_agg = (
-        df.groupby("Previous_Fraudulent_Activity")["Fraud_Label"]
-        .mean()
-        .reset_index()
-    )
-
-    prev_fraud_agg["Previous_Fraudulent_Activity"] = (
-        prev_fraud_agg["Previous_Fraudulent_Activity"]
-        .map({0: "No Previous Fraud", 1: "Previous Fraud"})
-    )
-
-    fig = px.bar(
-        prev_fraud_agg,
-        x="Previous_Fraudulent_Activity",
-        y="Fraud_Label",
-        text="Fraud_Label",
-        title="Fraud Rate by Previous Fraudulent Activity"
-    )
-    fig.update_yaxes(title="Fraud Rate")
-    fig.show()
-
-    # Failed Transactions nach Fraud
-    fig = px.box(
-        df,
-        x="Fraud_Label_str",
-        y="Failed_Transaction_Count_7d",
-        title="Failed Transactions (7d): Fraud vs Non-Fraud"
-    )
-    fig.show()
-
-    # IP Address Flag nach Fraud
-    ip_agg = (
-        df.groupby("IP_Address_Flag")["Fraud_Label"]
-        .mean()
-        .reset_index()
-    )
-
-    ip_agg["IP_Address_Flag"] = ip_agg["IP_Address_Flag"].map(
-        {0: "Normal IP", 1: "Suspicious IP"}
-    )
-
-    fig = px.bar(
-        ip_agg,
-        x="IP_Address_Flag",
-        y="Fraud_Label",
-        text="Fraud_Label",
-        title="Fraud Rate by IP Address Flag"
-    )
-    fig.update_yaxes(title="Fraud Rate")
-    fig.show()
+    # Risk Score nach Fraud: KDE pro Klasse statt Violin über alle Zeilen
+    fig = go.Figure()
+    for label, name in LABELS.items():
+        grid, density = _kde(samples[label][:, NUMERIC_COLUMNS.index("Risk_Score")])
+        fig.add_trace(go.Scatter(x=grid, y=density, name=name, mode="lines", fill="tozeroy"))
+    fig.update_layout(title="Risk Score Distribution: Fraud vs. Non-Fraud", xaxis_title="Risk_Score", yaxis_title="Dichte")
+    figures["risk_score_kde"] = fig
+
+    # Boxplots aus vorberechneten Quantilen
+    for key, column, title in [
+        ("amount_to_balance_box", "Amount_to_Balance_Ratio", "Amount / Balance Ratio: Fraud vs. Non-Fraud"),
+        ("failed_transactions_box", "Failed_Transaction_Count_7d", "Failed Transactions (7d): Fraud vs Non-Fraud"),
+    ]:
+        fig = go.Figure()
+        for label, name in LABELS.items():
+            stats = _box_stats(samples[label][:, NUMERIC_COLUMNS.index(column)])
+            if stats:
+                fig.add_trace(go.Box(x=[name], name=name, **{k: [v] for k, v in stats.items()}))
+        fig.update_layout(title=title, yaxis_title=column)
+        figures[key] = fig
+
+    # Fraud-Rate nach vorangegangener betrügerischer Aktivität und nach IP Address Flag
+    for key, column, names, title in [
+        ("fraud_rate_by_previous_fraud", "Previous_Fraudulent_Activity", {0: "No Previous Fraud", 1: "Previous Fraud"}, "Fraud Rate by Previous Fraudulent Activity"),
+        ("fraud_rate_by_ip_flag", "IP_Address_Flag", {0: "Normal IP", 1: "Suspicious IP"}, "Fraud Rate by IP Address Flag"),
+    ]:
+        rates = _rate_frame(counts[column], column)
+        rates[column] = rates[column].map(names)
+        fig = px.bar(rates, x=column, y="Fraud_Rate", text="Fraud_Rate", title=title)
+        fig.update_yaxes(title="Fraud Rate")
+        figures[key] = fig
 
     # Card Type nach Fraud
-    card_agg = (
-        df.groupby(["Card_Type", "Fraud_Label_str"])
-        .size()
-        .reset_index(name="Count")
-    )
-
-    fig = px.bar(
-        card_agg,
-        x="Card_Type",
-        y="Count",
-        color="Fraud_Label_str",
+    card = counts["Card_Type"].rename(columns=LABELS).rename_axis(columns="Fraud_Label_str")
+    card = card.stack().reset_index(name="Count")
+    figures["card_type_vs_fraud"] = px.bar(
+        card, x="Card_Type", y="Count", color="Fraud_Label_str",
         barmode="group",
         title="Card Type vs Fraud / Non-Fraud"
     )
-    fig.show()
-
-
-
-
-
-
-
-
-
-
+    return figures
+
+
+def render_figures(figures: dict[str, go.Figure], render: str = EXPLORE_RENDER, directory: Path = EXPLORE_DIR) -> Path | None:
+    if render == "show":
+        for fig in figures.values():
+            fig.show()
+        return None
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    if render == "html":
+        # Ein eigenständiger Report: plotly.js einmal eingebettet, danach nur die Figuren
+        parts = [fig.to_html(full_html=False, include_plotlyjs=(i == 0)) for i, fig in enumerate(figures.values())]
+        target = directory / "explore.html"
+        target.write_text(
+            "<html><head><meta charset=\"utf-8\"><title>Explore</title></head><body>\n" + "\n".join(parts) + "\n</body></html>",
+            encoding="utf-8"
+        )
+        return target
+    if render == "png":
+        # Statische Bilder über kaleido (optionale Abhängigkeit)
+        for name, fig in figures.items():
+            fig.write_image(directory / f"{name}.png")
+        return directory
+    raise ValueError(f"Unbekannter Render-Modus {render!r} – erlaubt: html, png, show")
+
+
+@instrumented("explore")
+def explore(path: Path = CLEAN_TRANSACTIONS_PATH, render: str = EXPLORE_RENDER):
+    figures = build_figures(summarize(path))
+    target = render_figures(figures, render)
+    if target is not None:
+        print(f"\n Explore-Plots geschrieben: {target}")
+    return target
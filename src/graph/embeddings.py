@@ -0,0 +1,147 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+from src.cache import content_hash
+from src.config import CLEAN_TRANSACTIONS_PATH, EMBEDDING_DIR, EMBEDDING_CHUNK_SIZE
+from src.etl.artifacts import iter_table
+from src.metrics import instrumented
+
+# Transaktions-Embeddings im Streaming statt DataFrame + breiter CSV.
+# Ablage unter EMBEDDING_DIR:
+#   vectors.f32    float32, n x len(VECTOR_FEATURES), zeilenweise ohne Header -> np.memmap
+#   ids.csv        Transaction_ID (+ Fraud_Label) in derselben Zeilenreihenfolge
+#   scaler.joblib  StandardScaler (Mittelwert/Streuung aller Zeilen)
+#   meta.json      Eingabe-Hash, Zeilen, Features; zuletzt geschrieben = Ablage vollständig
+# Mit Fit: 1. Durchgang liest die Tabelle in Chunks, schreibt die Rohwerte und aktualisiert den Scaler
+# (partial_fit), 2. Durchgang skaliert die Binärdatei in Blöcken an Ort und Stelle. Ohne Fit (neue
+# Transaktionen) wird mit einem gespeicherten Scaler in einem Durchgang transformiert.
+# NaN (z.B. Card_Age) bleiben NaN wie bisher; partial_fit ignoriert sie in den Statistiken.
+
+# Feature-Auswahl für die Embeddings
+VECTOR_FEATURES = [
+    "Transaction_Amount",
+    "Amount_to_Balance_Ratio",
+    "Risk_Score",
+    "Failed_Transaction_Count_7d",
+    "Transaction_Distance",
+    "Card_Age",
+    "Hour",
+    "Is_Weekend"
+]
+
+EMBEDDING_COLUMNS = [f"emb_{i}" for i in range(len(VECTOR_FEATURES))]
+
+
+def _read_meta(directory: Path) -> dict | None:
+    path = Path(directory) / "meta.json"
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+@instrumented("neo4j")
+def build_embeddings(
+    path: Path = CLEAN_TRANSACTIONS_PATH,
+    directory: Path = EMBEDDING_DIR,
+    scaler_path: Path | None = None,
+    chunksize: int = EMBEDDING_CHUNK_SIZE,
+    force: bool = False
+) -> dict:
+    # scaler_path: gespeicherten Scaler verwenden (neue Transaktionen) statt auf path zu fitten
+    directory = Path(directory)
+    source = "fit" if scaler_path is None else str(Path(scaler_path).resolve())
+    key = content_hash(path, {})
+    meta = _read_meta(directory)
+    if not force and meta and meta["input"] == key and meta["scaler"] == source and meta["features"] == VECTOR_FEATURES:
+        print(f"\n Embeddings unverändert: {directory}")
+        return meta
+
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / "meta.json").unlink(missing_ok=True)
+    fit = scaler_path is None
+    scaler = StandardScaler() if fit else joblib.load(scaler_path)
+    vectors_path, ids_path = directory / "vectors.f32", directory / "ids.csv"
+
+    rows = 0
+    with open(vectors_path, "wb") as f:
+        for i, chunk in enumerate(iter_table(path, ["Transaction_ID", "Fraud_Label", *VECTOR_FEATURES], chunksize)):
+            X = chunk[VECTOR_FEATURES].to_numpy(np.float64)
+            if fit:
+                scaler.partial_fit(X)
+            else:
+                X = scaler.transform(X)
+            f.write(np.ascontiguousarray(X, dtype=np.float32).tobytes())
+            chunk[["Transaction_ID", "Fraud_Label"]].to_csv(ids_path, mode="a" if i else "w", header=not i, index=False)
+            rows += len(chunk)
+
+    if fit and rows:
+        # 2. Durchgang auf der Binärdatei: kein erneutes Parsen der Eingabe
+        vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(rows, len(VECTOR_FEATURES)))
+        for start in range(0, rows, chunksize):
+            block = vectors[start:start + chunksize]
+            block[:] = scaler.transform(block.astype(np.float64))
+        vectors.flush()
+        del vectors
+        joblib.dump(scaler, directory / "scaler.joblib")
+
+    meta = {
+        "input": key,
+        "scaler": source,
+        "rows": rows,
+        "features": VECTOR_FEATURES,
+        "dtype": "float32",
+    }
+    (directory / "meta.json").write_text(json.dumps(meta, indent=2))
+    print(f"\n Embeddings: {rows} x {len(VECTOR_FEATURES)} float32 -> {vectors_path}")
+    return meta
+
+
+def load_embeddings(directory: Path = EMBEDDING_DIR) -> tuple[np.ndarray, pd.DataFrame]:
+    # Vektoren memory-mapped (read-only) + IDs/Labels in derselben Reihenfolge
+    directory = Path(directory)
+    meta = _read_meta(directory)
+    if meta is None:
+        raise FileNotFoundError(f"Keine vollständigen Embeddings unter {directory} – build_embeddings() ausführen")
+    if not meta["rows"]:
+        return np.empty((0, len(meta["features"])), dtype=np.float32), pd.DataFrame(columns=["Transaction_ID", "Fraud_Label"])
+    vectors = np.memmap(directory / "vectors.f32", dtype=np.float32, mode="r", shape=(meta["rows"], len(meta["features"])))
+    return vectors, pd.read_csv(directory / "ids.csv")
+
+
+def embed_frame(df: pd.DataFrame, directory: Path = EMBEDDING_DIR) -> np.ndarray:
+    # Neue Transaktionen mit dem gespeicherten Scaler einbetten (kein Refit)
+    scaler = joblib.load(Path(directory) / "scaler.joblib")
+    return scaler.transform(df[VECTOR_FEATURES].to_numpy(np.float64)).astype(np.float32)
+
+
+def export_vector_csv(target: Path, directory: Path = EMBEDDING_DIR, chunksize: int = EMBEDDING_CHUNK_SIZE) -> Path:
+    # Schmale CSV nur für Neo4j LOAD CSV: Transaction_ID + emb_0..emb_n
+    vectors, ids = load_embeddings(directory)
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    for start in range(0, max(len(ids), 1), chunksize):
+        part = pd.DataFrame(vectors[start:start + chunksize], columns=EMBEDDING_COLUMNS)
+        part.insert(0, "Transaction_ID", ids["Transaction_ID"].to_numpy()[start:start + chunksize])
+        part.to_csv(target, mode="a" if start else "w", header=not start, index=False, float_format="%.7g")
+    return target
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transaktions-Embeddings im Streaming erzeugen")
+    parser.add_argument("--input", type=Path, default=CLEAN_TRANSACTIONS_PATH)
+    parser.add_argument("--out", type=Path, default=EMBEDDING_DIR)
+    parser.add_argument("--scaler", type=Path, default=None, help="gespeicherten Scaler verwenden statt neu zu fitten")
+    parser.add_argument("--vector-csv", type=Path, default=None, help="zusätzlich schmale ID+Vektor-CSV schreiben")
+    parser.add_argument("--chunksize", type=int, default=EMBEDDING_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    build_embeddings(args.input, args.out, args.scaler, args.chunksize)
+    print(f" Dauer: {time.perf_counter() - start:.2f}s")
+    if args.vector_csv:
+        print(" Vektor-CSV:", export_vector_csv(args.vector_csv, args.out, args.chunksize))
@@ -0,0 +1,209 @@
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.preprocessing import StandardScaler
+
+from src.config import CLEAN_TRANSACTIONS_PATH, EMBEDDING_DIR, KNN_BLOCK_ROWS, KNN_EXACT_MAX_ROWS, KNN_IVF_LISTS, KNN_IVF_PROBES
+from src.etl.artifacts import read_table
+from src.graph.embeddings import VECTOR_FEATURES, load_embeddings
+
+# kNN über die Transaktions-Embeddings im Prozess, ohne Neo4j-Vektorindex.
+# - gleiche Embeddings wie embeddings.py (VECTOR_FEATURES, standardisiert), als float32-Matrix
+#   mit Zeilen auf Länge 1 normiert -> Kosinus-Ähnlichkeit = Skalarprodukt
+# - exakt: Anfragen und Datenbestand in Blöcken, pro Block eine Matrixmultiplikation und ein
+#   laufendes Top-k (argpartition), der Speicher hängt nur von den Blockgrößen ab
+# - approximativ (IVF): k-Means-Zentren, Vektoren nach Zentrum sortiert; jede Anfrage durchsucht
+#   nur die KNN_IVF_PROBES nächsten Listen
+
+# Anfragen pro Block: Ähnlichkeitsmatrix je Schritt höchstens _QUERY_BLOCK x KNN_BLOCK_ROWS float32
+_QUERY_BLOCK = 1024
+
+
+def embedding_matrix(df: pd.DataFrame) -> np.ndarray:
+    X = StandardScaler().fit_transform(df[VECTOR_FEATURES].astype(float).values)
+    # Fehlende Werte (z.B. Card_Age) -> 0 = Mittelwert nach dem Standardisieren
+    return np.nan_to_num(X).astype(np.float32)
+
+
+def _normalize(X: np.ndarray) -> np.ndarray:
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    return X / np.where(norms > 0, norms, 1)
+
+
+def _block_topk(scores: np.ndarray, k: int, group: int = 64):
+    # Top-k je Zeile ohne argpartition über die ganze Zeile: die k besten Elemente liegen in den k
+    # Gruppen mit den größten Maxima -> erst Gruppen-Maxima, dann nur deren Elemente partitionieren
+    n, m = scores.shape
+    full = m // group * group
+    if full // group <= k:
+        cols = np.broadcast_to(np.arange(m), scores.shape)
+        candidates = scores
+    else:
+        maxima = scores[:, :full].reshape(n, -1, group).max(axis=2)
+        groups = np.argpartition(-maxima, k - 1, axis=1)[:, :k]
+        cols = (groups[:, :, None] * group + np.arange(group)).reshape(n, -1)
+        cols = np.concatenate([cols, np.broadcast_to(np.arange(full, m), (n, m - full))], axis=1)
+        candidates = np.take_along_axis(scores, cols, axis=1)
+    if candidates.shape[1] <= k:
+        return candidates, cols
+    part = np.argpartition(-candidates, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(candidates, part, axis=1), np.take_along_axis(cols, part, axis=1)
+
+
+def _merge_topk(best_s, best_i, scores, offset, k):
+    # Laufendes Top-k: beste k des Blocks mit den bisherigen k zusammenführen
+    scores, cols = _block_topk(scores, k)
+    all_s = np.concatenate([best_s, scores], axis=1)
+    all_i = np.concatenate([best_i, cols + offset], axis=1)
+    keep = np.argpartition(-all_s, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(all_s, keep, axis=1), np.take_along_axis(all_i, keep, axis=1)
+
+
+def _sorted(best_s, best_i):
+    order = np.argsort(-best_s, axis=1, kind="stable")
+    return np.take_along_axis(best_i, order, axis=1), np.take_along_axis(best_s, order, axis=1)
+
+
+class VectorIndex:
+    def __init__(self, vectors: np.ndarray, ids, labels=None, block_rows: int = KNN_BLOCK_ROWS):
+        self.vectors = _normalize(vectors)
+        self.ids = np.asarray(ids)
+        self.labels = None if labels is None else np.asarray(labels)
+        self.block_rows = block_rows
+        self.row_of = pd.Index(self.ids)
+        # IVF (optional): Zentren, Vektoren nach Liste sortiert, Listengrenzen
+        self.centroids = None
+
+    @classmethod
+    def from_table(cls, path: Path = CLEAN_TRANSACTIONS_PATH, approximate: bool | None = None) -> "VectorIndex":
+        df = read_table(path, columns=["Transaction_ID", "Fraud_Label", *VECTOR_FEATURES])
+        index = cls(embedding_matrix(df), df["Transaction_ID"].to_numpy(), df["Fraud_Label"].to_numpy())
+        # Standard: ab KNN_EXACT_MAX_ROWS Vektoren approximativ
+        if approximate or (approximate is None and len(df) > KNN_EXACT_MAX_ROWS):
+            index.build_ivf()
+        return index
+
+    @classmethod
+    def from_embeddings(cls, directory: Path = EMBEDDING_DIR, approximate: bool | None = None) -> "VectorIndex":
+        # Aus der Binärablage von build_embeddings, ohne die Clean-Daten neu zu lesen und zu skalieren
+        vectors, ids = load_embeddings(directory)
+        index = cls(np.nan_to_num(vectors), ids["Transaction_ID"].to_numpy(), ids["Fraud_Label"].to_numpy())
+        if approximate or (approximate is None and len(ids) > KNN_EXACT_MAX_ROWS):
+            index.build_ivf()
+        return index
+
+    def build_ivf(self, n_lists: int | None = KNN_IVF_LISTS, seed: int = 42) -> None:
+        n_lists = n_lists or max(1, int(np.sqrt(len(self.vectors))))
+        kmeans = MiniBatchKMeans(n_lists, batch_size=4096, n_init=1, random_state=seed)
+        assignment = kmeans.fit_predict(self.vectors)
+
+        order = np.argsort(assignment, kind="stable")
+        self.ivf_order = order
+        self.ivf_vectors = self.vectors[order]
+        self.ivf_bounds = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))])
+        self.centroids = _normalize(kmeans.cluster_centers_)
+
+    def _search_exact(self, Q: np.ndarray, k: int):
+        best_s = np.full((len(Q), k), -np.inf, dtype=np.float32)
+        best_i = np.full((len(Q), k), -1, dtype=np.int64)
+        for start in range(0, len(self.vectors), self.block_rows):
+            scores = Q @ self.vectors[start:start + self.block_rows].T
+            best_s, best_i = _merge_topk(best_s, best_i, scores, start, k)
+        return best_s, best_i
+
+    def _search_ivf(self, Q: np.ndarray, k: int, probes: int):
+        best_s = np.full((len(Q), k), -np.inf, dtype=np.float32)
+        best_i = np.full((len(Q), k), -1, dtype=np.int64)
+        probes = min(probes, len(self.centroids))
+        lists = np.argpartition(-(Q @ self.centroids.T), probes - 1, axis=1)[:, :probes]
+
+        # Pro Liste alle Anfragen, die sie durchsuchen, auf einmal
+        for l in np.unique(lists):
+            q_rows = np.flatnonzero((lists == l).any(axis=1))
+            start, end = self.ivf_bounds[l], self.ivf_bounds[l + 1]
+            if start == end:
+                continue
+            scores = Q[q_rows] @ self.ivf_vectors[start:end].T
+            best_s[q_rows], best_i[q_rows] = _merge_topk(best_s[q_rows], best_i[q_rows], scores, start, k)
+
+        # Positionen in der sortierten IVF-Matrix -> ursprüngliche Zeilen
+        found = best_i >= 0
+        best_i[found] = self.ivf_order[best_i[found]]
+        return best_s, best_i
+
+    def search(self, queries: np.ndarray, k: int = 10, probes: int = KNN_IVF_PROBES) -> tuple[np.ndarray, np.ndarray]:
+        # Batch-Suche: (Zeilen der Nachbarn, Ähnlichkeiten), je Anfrage absteigend sortiert
+        k = min(k, len(self.vectors))
+        Q = _normalize(queries)
+        rows, scores = [], []
+        for start in range(0, len(Q), _QUERY_BLOCK):
+            block = Q[start:start + _QUERY_BLOCK]
+            best_s, best_i = self._search_ivf(block, k, probes) if self.centroids is not None else self._search_exact(block, k)
+            best_i, best_s = _sorted(best_s, best_i)
+            rows.append(best_i)
+            scores.append(best_s)
+        return np.concatenate(rows), np.concatenate(scores)
+
+    def search_ids(self, txids, k: int = 10, probes: int = KNN_IVF_PROBES) -> tuple[np.ndarray, np.ndarray]:
+        # Nachbarn bekannter Transaktionen, ohne die Transaktion selbst (wie knn_by_txid)
+        query_rows = self.row_of.get_indexer(np.asarray(txids))
+        if (query_rows < 0).any():
+            raise KeyError(f"Unbekannte Transaction_IDs: {list(np.asarray(txids)[query_rows < 0][:5])}")
+        rows, scores = self.search(self.vectors[query_rows], k + 1, probes)
+
+        # Eigene Zeile ans Ende schieben (stabil), dann die ersten k behalten
+        order = np.argsort(rows == query_rows[:, None], axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(rows, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+    def neighbours(self, txid, k: int = 10) -> list[dict]:
+        # Gleiches Format wie knn_by_txid in report.py
+        rows, scores = self.search_ids([txid], k)
+        return [
+            {"tx": self.ids[r], "fraud": None if self.labels is None else int(self.labels[r]), "score": float(s)}
+            for r, s in zip(rows[0], scores[0]) if r >= 0
+        ]
+
+    def fraud_features(self, txids, k: int = 10) -> pd.DataFrame:
+        # kNN-Features pro Transaktion: Fraud-Anteil und mittlere Ähnlichkeit der k Nachbarn
+        rows, scores = self.search_ids(txids, k)
+        valid = rows >= 0
+        labels = np.where(valid, self.labels[np.where(valid, rows, 0)], 0)
+        return pd.DataFrame({
+            "Transaction_ID": np.asarray(txids),
+            "knn_fraud_rate": labels.sum(axis=1) / np.maximum(valid.sum(axis=1), 1),
+            "knn_mean_similarity": np.where(valid, scores, 0).sum(axis=1) / np.maximum(valid.sum(axis=1), 1),
+        })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="kNN über Transaktions-Embeddings ohne Neo4j")
+    parser.add_argument("--input", type=Path, default=CLEAN_TRANSACTIONS_PATH)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=1_000, help="Anzahl zufälliger Anfrage-Transaktionen")
+    parser.add_argument("--approximate", action="store_true", help="zusätzlich IVF-Index bauen und Recall messen")
+    args = parser.parse_args()
+
+    index = VectorIndex.from_table(args.input, approximate=False)
+    txids = np.random.default_rng(0).choice(index.ids, min(args.queries, len(index.ids)), replace=False)
+
+    start = time.perf_counter()
+    exact_rows, _scores = index.search_ids(txids, args.k)
+    exact_s = time.perf_counter() - start
+    print(f"\n Exakt: {len(txids)} Anfragen über {len(index.ids):,} Vektoren in {exact_s:.3f}s")
+    print(" Beispiel:", index.neighbours(txids[0], 5))
+
+    if args.approximate:
+        start = time.perf_counter()
+        index.build_ivf()
+        build_s = time.perf_counter() - start
+        start = time.perf_counter()
+        ivf_rows, _scores = index.search_ids(txids, args.k)
+        ivf_s = time.perf_counter() - start
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(exact_rows, ivf_rows)])
+        print(f" IVF ({len(index.centroids)} Listen, {KNN_IVF_PROBES} Probes): Aufbau {build_s:.2f}s, "
+              f"Suche {ivf_s:.3f}s, Recall@{args.k} {recall:.3f}")
@@ -0,0 +1,175 @@
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+
+from src.config import CLEAN_TRANSACTIONS_PATH, GRAPH_SMOOTHING, GRAPH_FOLDS
+from src.etl.artifacts import read_table
+
+# Graph aus setup.py (User, Transaction, Dimensionsknoten) im Prozess, ohne Neo4j.
+# - Knoten je Typ über pd.factorize auf 0..n-1 abgebildet; Kanten Knoten -> Transaktionen als CSR
+#   (indptr, indices): die Transaktionen von Knoten v sind indices[indptr[v]:indptr[v + 1]]
+# - Relationale Features vektorisiert über alle Knoten eines Typs (bincount/reduceat), kein Cypher
+#   pro Knoten:
+#     graph_<Spalte>_fraud_rate  Fraud-Anteil der anderen Transaktionen am selben Dimensionsknoten
+#     graph_user_fraud_rate      Fraud-Anteil der anderen Transaktionen desselben Users
+#     graph_user_tx_count        Transaktionen des Users im Trainingsgraphen
+#     graph_user_exposure        2 Hops: User -> Dimensionsknoten seiner Transaktionen -> Fraud-Anteil
+#                                der Transaktionen anderer User dort, gemittelt über seine Transaktionen
+# - Labels nur aus den Trainingszeilen (fit); beim Training selbst Out-of-Fold-Statistiken (GRAPH_FOLDS),
+#   damit das eigene Label nicht im eigenen Feature steckt; Anteile mit GRAPH_SMOOTHING Pseudo-Zeilen
+#   zum globalen Fraud-Anteil geglättet (Knoten mit wenigen Transaktionen)
+
+# Dimensionsknoten wie DIMENSIONS in setup.py (Spaltennamen)
+GRAPH_DIMENSIONS = ["Location", "Device_Type", "Merchant_Category", "Card_Type", "Authentication_Method"]
+GRAPH_INPUT_COLS = ["User_ID", *GRAPH_DIMENSIONS]
+GRAPH_FEATURES = [
+    *[f"graph_{col}_fraud_rate" for col in GRAPH_DIMENSIONS],
+    "graph_user_fraud_rate",
+    "graph_user_tx_count",
+    "graph_user_exposure",
+]
+
+
+def _csr(codes: np.ndarray, n_nodes: int) -> tuple[np.ndarray, np.ndarray]:
+    # Zeilen nach Knoten sortiert (stabil) + Grenzen pro Knoten
+    indices = np.argsort(codes, kind="stable")
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=n_nodes))])
+    return indptr, indices
+
+
+class TransactionGraph:
+    def __init__(self, df: pd.DataFrame):
+        # Pro Knotentyp: Werte der Knoten, Code je Transaktion, CSR Knoten -> Transaktionszeilen
+        self.n_rows = len(df)
+        self.nodes, self.codes, self.adjacency = {}, {}, {}
+        for col in GRAPH_INPUT_COLS:
+            codes, uniques = pd.factorize(df[col].astype(str))
+            self.nodes[col] = pd.Index(uniques)
+            self.codes[col] = codes
+            self.adjacency[col] = _csr(codes, len(uniques))
+
+    def degree(self, col: str) -> np.ndarray:
+        return np.diff(self.adjacency[col][0])
+
+    def node_sum(self, col: str, values: np.ndarray) -> np.ndarray:
+        # Summe eines Zeilenwerts über die Transaktionen jedes Knotens (jeder Knoten hat >= 1 Zeile)
+        indptr, indices = self.adjacency[col]
+        return np.add.reduceat(np.asarray(values, dtype=float)[indices], indptr[:-1])
+
+    def node_mean(self, col: str, values: np.ndarray) -> np.ndarray:
+        return self.node_sum(col, values) / self.degree(col)
+
+
+def _oof(codes: np.ndarray, y: np.ndarray, folds: np.ndarray, n_nodes: int, k: int):
+    # Fraud-Summe und Anzahl pro Knoten ohne den eigenen Fold: Summen je (Knoten, Fold), dann
+    # Gesamtsumme minus eigener Fold
+    key = codes * k + folds
+    s = np.bincount(key, weights=y, minlength=n_nodes * k).reshape(n_nodes, k)
+    c = np.bincount(key, minlength=n_nodes * k).reshape(n_nodes, k)
+    return s.sum(axis=1)[codes] - s[codes, folds], c.sum(axis=1)[codes] - c[codes, folds]
+
+
+def _lookup(index: pd.Index, values: pd.Series, *stats: np.ndarray):
+    # Statistiken der Trainingsknoten für neue Zeilen; unbekannte Knoten -> 0
+    codes = index.get_indexer(values.astype(str))
+    known = codes >= 0
+    return codes, known, [np.where(known, s[np.where(known, codes, 0)], 0) for s in stats]
+
+
+class GraphFeatures(BaseEstimator, TransformerMixin):
+    # Transformer im ColumnTransformer: fit merkt sich die Knotenstatistiken des Trainingsgraphen,
+    # transform berechnet daraus die Features neuer Zeilen (Scoring), fit_transform Out-of-Fold
+
+    def __init__(self, smoothing: float = GRAPH_SMOOTHING, folds: int = GRAPH_FOLDS, random_state: int = 42):
+        self.smoothing = smoothing
+        self.folds = folds
+        self.random_state = random_state
+
+    def _rate(self, fraud, count):
+        return (fraud + self.smoothing * self.prior_) / (count + self.smoothing)
+
+    def fit(self, X: pd.DataFrame, y):
+        self._fit(TransactionGraph(X), np.asarray(y, dtype=float))
+        return self
+
+    def _fit(self, graph: TransactionGraph, y: np.ndarray) -> None:
+        self.prior_ = y.mean()
+        self.nodes_ = graph.nodes
+        self.fraud_ = {col: graph.node_sum(col, y) for col in GRAPH_INPUT_COLS}
+        self.count_ = {col: graph.degree(col) for col in GRAPH_INPUT_COLS}
+
+        # 2 Hops: pro Transaktion der Fraud-Anteil ihrer Dimensionsknoten ohne alle Transaktionen
+        # desselben Users (Summen je (User, Knoten)-Paar), dann Mittel über die Transaktionen des Users
+        users = graph.codes["User_ID"]
+        exposure = np.zeros(graph.n_rows)
+        for col in GRAPH_DIMENSIONS:
+            codes = graph.codes[col]
+            _pairs, pair = np.unique(users.astype(np.int64) * len(self.nodes_[col]) + codes, return_inverse=True)
+            own_fraud, own_count = np.bincount(pair, weights=y)[pair], np.bincount(pair)[pair]
+            exposure += self._rate(self.fraud_[col][codes] - own_fraud, self.count_[col][codes] - own_count)
+        self.user_exposure_ = graph.node_mean("User_ID", exposure / len(GRAPH_DIMENSIONS))
+
+    def fit_transform(self, X: pd.DataFrame, y=None, **fit_params):
+        graph = TransactionGraph(X)
+        y = np.asarray(y, dtype=float)
+        self._fit(graph, y)
+
+        folds = np.random.default_rng(self.random_state).integers(0, self.folds, len(y))
+        out = np.empty((len(y), len(GRAPH_FEATURES)), dtype=np.float32)
+        for j, col in enumerate(GRAPH_DIMENSIONS):
+            fraud, count = _oof(graph.codes[col], y, folds, len(self.nodes_[col]), self.folds)
+            out[:, j] = self._rate(fraud, count)
+        users = graph.codes["User_ID"]
+        fraud, count = _oof(users, y, folds, len(self.nodes_["User_ID"]), self.folds)
+        out[:, -3] = self._rate(fraud, count)
+        out[:, -2] = self.count_["User_ID"][users]
+        out[:, -1] = self.user_exposure_[users]
+        return out
+
+    def transform(self, X: pd.DataFrame) -> np.ndarray:
+        out = np.empty((len(X), len(GRAPH_FEATURES)), dtype=np.float32)
+        for j, col in enumerate(GRAPH_DIMENSIONS):
+            _codes, _known, (fraud, count) = _lookup(self.nodes_[col], X[col], self.fraud_[col], self.count_[col])
+            out[:, j] = self._rate(fraud, count)
+
+        _codes, known, (fraud, count, exposure) = _lookup(
+            self.nodes_["User_ID"], X["User_ID"], self.fraud_["User_ID"], self.count_["User_ID"], self.user_exposure_
+        )
+        out[:, -3] = self._rate(fraud, count)
+        out[:, -2] = count
+        # Neue User haben keine Trainings-Labels: Exposure aus ihren Zeilen in X. Die Anteile des ganzen
+        # Trainingsgraphen enthalten keine Transaktion dieser User -> gleiche Definition wie im Training
+        # (Knotenanteil ohne die eigenen Transaktionen), nur ohne Abzug
+        if not known.all():
+            batch = TransactionGraph(X[~known])
+            row_rate = out[~known, :len(GRAPH_DIMENSIONS)].mean(axis=1)
+            exposure[~known] = batch.node_mean("User_ID", row_rate)[batch.codes["User_ID"]]
+        out[:, -1] = exposure
+        return out
+
+    def get_feature_names_out(self, input_features=None) -> np.ndarray:
+        return np.array(GRAPH_FEATURES, dtype=object)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Graph-Features im Prozess berechnen (ohne Neo4j)")
+    parser.add_argument("--input", type=Path, default=CLEAN_TRANSACTIONS_PATH)
+    args = parser.parse_args()
+
+    df = read_table(args.input, columns=[*GRAPH_INPUT_COLS, "Fraud_Label"])
+
+    start = time.perf_counter()
+    graph = TransactionGraph(df)
+    build_s = time.perf_counter() - start
+    print(f"\n Graph: {graph.n_rows:,} Transaktionen in {build_s:.3f}s")
+    for col in GRAPH_INPUT_COLS:
+        print(f"   {col:<22} {len(graph.nodes[col]):>9,} Knoten, max. Grad {graph.degree(col).max():,}")
+
+    start = time.perf_counter()
+    features = pd.DataFrame(GraphFeatures().fit_transform(df, df["Fraud_Label"]), columns=GRAPH_FEATURES)
+    print(f"\n Features (Out-of-Fold) in {time.perf_counter() - start:.3f}s")
+    print(features.describe().T.round(4).to_string())
@@ -1,117 +1,183 @@
-from neo4j import GraphDatabase
-from src.config import (
-    NEO4J_URI,
-    NEO4J_USER,
-    NEO4J_PASSWORD
-)
-
-# Verbindung zur Neo4j-Datenbank herstellen
-uri = NEO4J_URI
-user = NEO4J_USER
-password = NEO4J_PASSWORD
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 
 from neo4j import GraphDatabase
-from src.config import NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD
+from src.config import NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, NEO4J_REPORT_WORKERS
+from src.metrics import instrumented
+
+# Report-Abfragen als Konstanten: die Einzelfunktionen materialisieren das Ergebnis wie bisher,
+# run_reports führt mehrere Abfragen nebenläufig auf einem Treiber (Connection-Pool) aus und
+# reicht jeden Datensatz beim Eintreffen weiter
+PICK_ANY_TXID_QUERY = "MATCH (t:Transaction) RETURN t.Transaction_ID AS tx LIMIT 1;"
+
+KNN_BY_TXID_QUERY = """
+MATCH (t:Transaction {Transaction_ID: $txid})
+WITH t
+CALL db.index.vector.queryNodes('tx_embedding_index', $k, t.embedding)
+YIELD node, score
+WHERE node.Transaction_ID <> t.Transaction_ID
+RETURN node.Transaction_ID AS tx,
+       node.Transaction_Amount AS amount,
+       node.Risk_Score AS risk,
+       node.Fraud_Label AS fraud,
+       score
+ORDER BY score DESC
+"""
+
+# Wie KNN_BY_TXID_QUERY, wählt die Transaktion aber selbst -> keine abhängige zweite Abfrage
+KNN_ANY_QUERY = """
+MATCH (t:Transaction)
+WITH t LIMIT 1
+CALL db.index.vector.queryNodes('tx_embedding_index', $k, t.embedding)
+YIELD node, score
+WHERE node.Transaction_ID <> t.Transaction_ID
+RETURN t.Transaction_ID AS query_tx,
+       node.Transaction_ID AS tx,
+       node.Transaction_Amount AS amount,
+       node.Risk_Score AS risk,
+       node.Fraud_Label AS fraud,
+       score
+ORDER BY score DESC
+"""
+
+# Zählungen pro Label aus dem Count-Store (MATCH (n:Label) RETURN count(n)) statt MATCH (n) über alles
+COUNTS_BY_LABEL_QUERY = """
+CALL () {
+  MATCH (n:Transaction) RETURN 'Transaction' AS label, count(n) AS n
+  UNION ALL MATCH (n:User) RETURN 'User' AS label, count(n) AS n
+  UNION ALL MATCH (n:Location) RETURN 'Location' AS label, count(n) AS n
+  UNION ALL MATCH (n:DeviceType) RETURN 'DeviceType' AS label, count(n) AS n
+  UNION ALL MATCH (n:MerchantCategory) RETURN 'MerchantCategory' AS label, count(n) AS n
+  UNION ALL MATCH (n:CardType) RETURN 'CardType' AS label, count(n) AS n
+  UNION ALL MATCH (n:AuthMethod) RETURN 'AuthMethod' AS label, count(n) AS n
+}
+RETURN label, n
+ORDER BY n DESC
+"""
+
+# Die folgenden Reports lesen die beim Import gepflegten Zähler (tx_count, fraud_count, fraud_rate);
+# die Prädikate auf der Sortier-Property erlauben einen sortierten Scan über deren Range-Index.
+# fraud_count >= 0 schließt keinen User mit Transaktionen aus: wie bisher erscheinen auch User mit
+# frauds = 0, falls weniger als $limit User einen Fraud haben
+TOP_USERS_BY_FRAUD_QUERY = """
+MATCH (u:User)
+WHERE u.fraud_count >= 0 AND u.tx_count >= $min_tx
+RETURN u.User_ID AS user, u.tx_count AS total, u.fraud_count AS frauds, u.fraud_rate AS fraud_rate
+ORDER BY u.fraud_count DESC, u.fraud_rate DESC
+LIMIT $limit
+"""
+
+FRAUD_RATE_BY_DEVICE_QUERY = """
+MATCH (d:DeviceType)
+WHERE d.fraud_rate IS NOT NULL
+RETURN d.name AS device, d.tx_count AS n, d.fraud_count AS frauds, d.fraud_rate AS fraud_rate
+ORDER BY d.fraud_rate DESC, d.tx_count DESC
+LIMIT $limit
+"""
+
+TOP_FAILED_TRANSACTIONS_QUERY = """
+MATCH (t:Transaction)
+WHERE t.Failed_Transaction_Count_7d IS NOT NULL
+RETURN t.Transaction_ID AS tx,
+       t.Failed_Transaction_Count_7d AS failed_7d,
+       t.Transaction_Amount AS amount,
+       t.Risk_Score AS risk,
+       t.Fraud_Label AS fraud
+ORDER BY failed_7d DESC, risk DESC
+LIMIT $limit
+"""
+
+# Demo-Report: Name -> (Abfrage, Parameter); alle unabhängig voneinander
+DEMO_REPORTS = {
+    "knn": (KNN_ANY_QUERY, {"k": 10}),
+    "label_counts": (COUNTS_BY_LABEL_QUERY, {}),
+    "top_users": (TOP_USERS_BY_FRAUD_QUERY, {"limit": 5, "min_tx": 10}),
+    "fraud_by_device": (FRAUD_RATE_BY_DEVICE_QUERY, {"limit": 5}),
+    "top_failed": (TOP_FAILED_TRANSACTIONS_QUERY, {"limit": 15}),
+}
+
+
+def _fetch(driver, query, params=None):
+    with driver.session() as session:
+        return [r.data() for r in session.run(query, params or {})]
 
 
 def pick_any_txid(driver):
-    q = "MATCH (t:Transaction) RETURN t.Transaction_ID AS tx LIMIT 1;"
     with driver.session() as session:
-        row = session.run(q).single()
+        row = session.run(PICK_ANY_TXID_QUERY).single()
     return row["tx"] if row else None
 
 
 def knn_by_txid(driver, txid, k=10):
-    q = """
-    MATCH (t:Transaction {Transaction_ID: $txid})
-    WITH t
-    CALL db.index.vector.queryNodes('tx_embedding_index', $k, t.embedding)
-    YIELD node, score
-    WHERE node.Transaction_ID <> t.Transaction_ID
-    RETURN node.Transaction_ID AS tx,
-           node.Transaction_Amount AS amount,
-           node.Risk_Score AS risk,
-           node.Fraud_Label AS fraud,
-           score
-    ORDER BY score DESC
-    """
-    with driver.session() as session:
-        return [r.data() for r in session.run(q, {"txid": txid, "k": k})]
+    return _fetch(driver, KNN_BY_TXID_QUERY, {"txid": txid, "k": k})
 
 
 def counts_by_label(driver):
-    q = """
-    MATCH (n)
-    RETURN labels(n)[0] AS label, count(*) AS n
-    ORDER BY n DESC
-    """
-    with driver.session() as session:
-        return [r.data() for r in session.run(q)]
+    return _fetch(driver, COUNTS_BY_LABEL_QUERY)
 
 
 def top_users_by_fraud(driver, limit=20, min_tx=10):
-    q = """
-    MATCH (u:User)-[:MADE]->(t:Transaction)
-    WITH u.User_ID AS user,
-         count(*) AS total,
-         sum(CASE WHEN t.Fraud_Label = 1 THEN 1 ELSE 0 END) AS frauds
-    WHERE total >= $min_tx
-    RETURN user, total, frauds, toFloat(frauds)/total AS fraud_rate
-    ORDER BY frauds DESC, fraud_rate DESC
-    LIMIT $limit
-    """
-    with driver.session() as session:
-        return [r.data() for r in session.run(q, {"limit": limit, "min_tx": min_tx})]
+    return _fetch(driver, TOP_USERS_BY_FRAUD_QUERY, {"limit": limit, "min_tx": min_tx})
 
 
 def fraud_rate_by_device(driver, limit=20):
-    q = """
-    MATCH (t:Transaction)-[:USING_DEVICE]->(d:DeviceType)
-    WITH d.name AS device,
-         count(*) AS n,
-         sum(CASE WHEN t.Fraud_Label = 1 THEN 1 ELSE 0 END) AS frauds
-    RETURN device, n, frauds, toFloat(frauds)/n AS fraud_rate
-    ORDER BY fraud_rate DESC, n DESC
-    LIMIT $limit
-    """
-    with driver.session() as session:
-        return [r.data() for r in session.run(q, {"limit": limit})]
+    return _fetch(driver, FRAUD_RATE_BY_DEVICE_QUERY, {"limit": limit})
 
 
 def top_failed_transactions(driver, limit=50):
-    q = """
-    MATCH (t:Transaction)
-    WHERE t.Failed_Transaction_Count_7d IS NOT NULL
-    RETURN t.Transaction_ID AS tx,
-           t.Failed_Transaction_Count_7d AS failed_7d,
-           t.Transaction_Amount AS amount,
-           t.Risk_Score AS risk,
-           t.Fraud_Label AS fraud
-    ORDER BY failed_7d DESC, risk DESC
-    LIMIT $limit
-    """
-    with driver.session() as session:
-        return [r.data() for r in session.run(q, {"limit": limit})]
+    return _fetch(driver, TOP_FAILED_TRANSACTIONS_QUERY, {"limit": limit})
 
 
+def stream_query(driver, query, params, sink) -> dict:
+    # Datensätze an sink weitergeben, sobald sie ankommen (kein Sammeln in Listen)
+    start = time.perf_counter()
+    first_record = None
+    rows = 0
+    with driver.session() as session:
+        for record in session.run(query, params):
+            if first_record is None:
+                first_record = time.perf_counter() - start
+            sink(record.data())
+            rows += 1
+    return {"rows": rows, "first_record_s": first_record, "total_s": time.perf_counter() - start}
+
+
+def run_reports(driver, reports: dict, sink, workers: int = NEO4J_REPORT_WORKERS) -> dict:
+    # Unabhängige Abfragen nebenläufig, eine Session pro Abfrage aus dem Pool des Treibers;
+    # sink(name, record) wird aus den Worker-Threads aufgerufen
+    timings = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(stream_query, driver, query, params, partial(sink, name)): name
+            for name, (query, params) in reports.items()
+        }
+        for future in as_completed(futures):
+            timings[futures[future]] = future.result()
+    return timings
+
+
+@instrumented("neo4j")
 def run_demo():
-    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-    try:
-        txid = pick_any_txid(driver)
-        print("Nutze TX:", txid)
+    driver = GraphDatabase.driver(
+        NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD), max_connection_pool_size=NEO4J_REPORT_WORKERS
+    )
+    lock = threading.Lock()
 
-        neighbors = knn_by_txid(driver, txid, k=10)
-        for n in neighbors:
-            print(n["tx"], n["amount"], n["risk"], n["fraud"], n["score"])
+    def print_record(name, record):
+        with lock:
+            print(f" [{name}] {record}")
 
-        print("\nLabel Counts:", counts_by_label(driver))
-        print("\nTop Users:", top_users_by_fraud(driver, 10)[:5])
-        print("\nFraud by Device:", fraud_rate_by_device(driver, 10)[:5])
+    try:
+        start = time.perf_counter()
+        timings = run_reports(driver, DEMO_REPORTS, print_record)
+        wall = time.perf_counter() - start
 
-        print("\nTop Failed Transactions:")
-        for r in top_failed_transactions(driver, 15):
-            print(r)
+        print(f"\n Report-Abfragen ({wall:.3f}s gesamt, Summe einzeln {sum(t['total_s'] for t in timings.values()):.3f}s):")
+        for name, t in timings.items():
+            first = f"{t['first_record_s']:.3f}s" if t["first_record_s"] is not None else "-"
+            print(f"  {name:<16} {t['rows']:>5} Zeilen | erster Datensatz {first} | gesamt {t['total_s']:.3f}s")
 
     finally:
         driver.close()
-
@@ -1,48 +1,313 @@
+import shutil
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
 from neo4j import GraphDatabase
-from sklearn.preprocessing import StandardScaler
 
+from src.cache import content_hash
 from src.config import (
     NEO4J_IMPORT_PATH,
     NEO4J_URI,
     NEO4J_USER,
-    NEO4J_PASSWORD, CLEAN_TRANSACTIONS_PATH
+    NEO4J_PASSWORD, CLEAN_TRANSACTIONS_PATH,
+    NEO4J_IMPORT_MODE,
+    NEO4J_BATCH_SIZE,
+    NEO4J_WRITERS,
+    NEO4J_CHECKPOINT_PATH
 )
+from src.etl.artifacts import iter_table
+from src.graph.embeddings import build_embeddings, export_vector_csv, load_embeddings
+from src.metrics import instrumented
+
+# Dimensionsknoten: Label -> Spalte, wie im LOAD-CSV-Import
+DIMENSIONS = {
+    "Location": "Location",
+    "DeviceType": "Device_Type",
+    "MerchantCategory": "Merchant_Category",
+    "CardType": "Card_Type",
+    "AuthMethod": "Authentication_Method",
+}
+
+# Transaktions-Properties mit Typ wie im LOAD-CSV-Import (toFloat / toInteger)
+FLOAT_PROPERTIES = ["Transaction_Amount", "Amount_to_Balance_Ratio", "Risk_Score", "Transaction_Distance", "Card_Age"]
+INT_PROPERTIES = ["Failed_Transaction_Count_7d", "Hour", "Is_Weekend", "Fraud_Label"]
+
+
+@instrumented("neo4j")
+def export_for_load_csv(input_path: Path = CLEAN_TRANSACTIONS_PATH, neo4j_import_path: Path = NEO4J_IMPORT_PATH) -> None:
+    # Embeddings im Streaming (embeddings.py), dann ins Neo4j-Import-Verzeichnis: schmale ID+Vektor-CSV
+    # und die Clean-Daten unverändert (CSV wird nur kopiert, Feather in Chunks nach CSV geschrieben)
+    build_embeddings(input_path)
+    neo4j_import_path = Path(neo4j_import_path)
+    export_vector_csv(neo4j_import_path)
+
+    clean_csv = neo4j_import_path.parent / "clean_transactions.csv"
+    if Path(input_path).suffix == ".csv":
+        shutil.copyfile(input_path, clean_csv)
+    else:
+        for i, chunk in enumerate(iter_table(input_path)):
+            chunk.to_csv(clean_csv, mode="a" if i else "w", header=not i, index=False)
+    print("CSV für Neo4j exportiert")
+
+
+# UNWIND-Import: pro Batch eine Transaktion (execute_write), Dimensionsknoten und User existieren
+# bereits und werden per Constraint-Index gefunden statt per Label-Scan gemergt
+# Zusätzlich werden die Zähler auf User und Dimensionsknoten (tx_count, fraud_count, fraud_rate)
+# fortgeschrieben: nur neue Transaktionen zählen, bei erneut gelieferten nur die Änderung des Labels.
+# Die Änderungen werden pro Knoten und Batch summiert -> ein Update je Knoten statt je Zeile.
+# Fehlende Schlüssel (User_ID oder Dimension leer) sind null: nur diese Kante fehlt, die übrigen
+# Kanten der Transaktion werden trotzdem angelegt (OPTIONAL MATCH + FOREACH), wie beim LOAD-CSV-Import.
+# Parallele Writer: das alte Label wird erst nach der Schreibsperre auf der Transaktion gelesen,
+# die Zähler werden im SET selbst hochgezählt (Sperre vor dem Lesen) -> keine verlorenen Updates.
+TRANSACTION_BATCH_QUERY = """
+UNWIND $rows AS row
+MERGE (t:Transaction {Transaction_ID: row.Transaction_ID})
+ON CREATE SET t._new = true
+SET t._lock = true
+WITH row, t,
+     CASE WHEN t._new THEN 1 ELSE 0 END AS tx_delta,
+     coalesce(row.props.Fraud_Label, 0) - CASE WHEN t._new THEN 0 ELSE coalesce(t.Fraud_Label, 0) END AS fraud_delta
+SET t += row.props, t.embedding = row.embedding
+REMOVE t._new, t._lock
+WITH t, row, tx_delta, fraud_delta
+OPTIONAL MATCH (u:User {User_ID: row.User_ID})
+OPTIONAL MATCH (l:Location {name: row.Location})
+OPTIONAL MATCH (d:DeviceType {name: row.Device_Type})
+OPTIONAL MATCH (m:MerchantCategory {name: row.Merchant_Category})
+OPTIONAL MATCH (c:CardType {name: row.Card_Type})
+OPTIONAL MATCH (a:AuthMethod {name: row.Authentication_Method})
+FOREACH (_ IN CASE WHEN u IS NULL THEN [] ELSE [1] END | MERGE (u)-[:MADE]->(t))
+FOREACH (_ IN CASE WHEN l IS NULL THEN [] ELSE [1] END | MERGE (t)-[:AT]->(l))
+FOREACH (_ IN CASE WHEN d IS NULL THEN [] ELSE [1] END | MERGE (t)-[:USING_DEVICE]->(d))
+FOREACH (_ IN CASE WHEN m IS NULL THEN [] ELSE [1] END | MERGE (t)-[:IN_CATEGORY]->(m))
+FOREACH (_ IN CASE WHEN c IS NULL THEN [] ELSE [1] END | MERGE (t)-[:PAID_WITH]->(c))
+FOREACH (_ IN CASE WHEN a IS NULL THEN [] ELSE [1] END | MERGE (t)-[:AUTHED_VIA]->(a))
+WITH [n IN [u, l, d, m, c, a] WHERE n IS NOT NULL] AS nodes, tx_delta, fraud_delta
+UNWIND nodes AS n
+WITH n, sum(tx_delta) AS dt, sum(fraud_delta) AS df
+WHERE dt <> 0 OR df <> 0
+SET n.tx_count = coalesce(n.tx_count, 0) + dt,
+    n.fraud_count = coalesce(n.fraud_count, 0) + df
+SET n.fraud_rate = CASE WHEN n.tx_count > 0 THEN toFloat(n.fraud_count) / n.tx_count ELSE 0.0 END
+"""
+
+# Graphen aus der Zeit vor den Zählern (oder LOAD CSV ohne refresh): Knoten mit Transaktionen, aber ohne tx_count
+COUNTERS_MISSING_QUERY = """
+RETURN EXISTS {
+  MATCH (n:User|Location|DeviceType|MerchantCategory|CardType|AuthMethod)--(:Transaction)
+  WHERE n.tx_count IS NULL
+} AS missing
+"""
+
+# Zähler komplett neu berechnen (nach einem LOAD-CSV-Import oder für Graphen ohne Zähler)
+REFRESH_COUNTERS_QUERY = """
+MATCH (n:{label})
+CALL (n) {{
+  OPTIONAL MATCH (n){pattern}(t:Transaction)
+  WITH n, count(t) AS total, sum(CASE WHEN t.Fraud_Label = 1 THEN 1 ELSE 0 END) AS frauds
+  SET n.tx_count = total,
+      n.fraud_count = frauds,
+      n.fraud_rate = CASE WHEN total > 0 THEN toFloat(frauds) / total ELSE 0.0 END
+}} IN TRANSACTIONS OF 10000 ROWS
+"""
+
+# Range-Indizes für ORDER BY ... LIMIT in den Reports (sortierter Index-Scan statt Sortieren)
+COUNTER_INDEXES = [
+    ("User", "fraud_count"),
+    ("Location", "fraud_rate"),
+    ("DeviceType", "fraud_rate"),
+    ("MerchantCategory", "fraud_rate"),
+    ("CardType", "fraud_rate"),
+    ("AuthMethod", "fraud_rate"),
+    ("Transaction", "Failed_Transaction_Count_7d"),
+]
+
+
+def _create_constraints(driver) -> None:
+    # Eindeutigkeit = Index auf dem Schlüssel -> MERGE/MATCH ohne Label-Scan
+    with driver.session() as session:
+        session.run("CREATE CONSTRAINT transaction_id IF NOT EXISTS FOR (t:Transaction) REQUIRE t.Transaction_ID IS UNIQUE").consume()
+        session.run("CREATE CONSTRAINT user_id IF NOT EXISTS FOR (u:User) REQUIRE u.User_ID IS UNIQUE").consume()
+        for label in DIMENSIONS:
+            session.run(f"CREATE CONSTRAINT {label.lower()}_name IF NOT EXISTS FOR (n:{label}) REQUIRE n.name IS UNIQUE").consume()
+        for label, prop in COUNTER_INDEXES:
+            session.run(f"CREATE INDEX {label.lower()}_{prop.lower()} IF NOT EXISTS FOR (n:{label}) ON (n.{prop})").consume()
+
+
+def refresh_fraud_counters(driver) -> None:
+    with driver.session() as session:
+        session.run(REFRESH_COUNTERS_QUERY.format(label="User", pattern="-[:MADE]->")).consume()
+        for label in DIMENSIONS:
+            session.run(REFRESH_COUNTERS_QUERY.format(label=label, pattern="<-[]-")).consume()
+    print("Fraud-Zähler neu berechnet")
+
+
+def _counters_missing(driver) -> bool:
+    with driver.session() as session:
+        return session.run(COUNTERS_MISSING_QUERY).single()["missing"]
+
+
+def _merge_keys(tx, label: str, key: str, values: list) -> None:
+    tx.run(f"UNWIND $values AS v MERGE (:{label} {{{key}: v}})", values=values).consume()
+
+
+def _load_dimensions(driver, path: Path, batch_size: int) -> None:
+    # Erster Durchgang nur über die Schlüsselspalten: Dimensionsknoten einmal aus den distinct Werten,
+    # User je Chunk (distinct) in Batches
+    seen = {label: set() for label in DIMENSIONS}
+    with driver.session() as session:
+        for chunk in iter_table(path, ["User_ID", *DIMENSIONS.values()], batch_size):
+            for label, column in DIMENSIONS.items():
+                values = set(chunk[column].dropna().astype(str).unique()) - seen[label]
+                if values:
+                    session.execute_write(_merge_keys, label, "name", sorted(values))
+                    seen[label] |= values
+            users = chunk["User_ID"].dropna().astype(str).unique().tolist()
+            for start in range(0, len(users), batch_size):
+                session.execute_write(_merge_keys, "User", "User_ID", users[start:start + batch_size])
+
+
+def _nullable(values: np.ndarray, cast) -> list:
+    # NaN -> None (wie toFloat/toInteger auf leeren CSV-Feldern)
+    return [None if np.isnan(v) else cast(v) for v in values]
+
+
+def _batch_rows(part: pd.DataFrame, vectors: np.ndarray) -> list[dict]:
+    # part: ein Chunk der Clean-Daten, vectors: die Embedding-Zeilen desselben Bereichs
+    embedding = np.asarray(vectors, dtype=float)
+    # Doppelte Transaction_IDs im Batch würden doppelt gezählt -> nur die letzte Zeile behalten
+    keep = ~part["Transaction_ID"].astype(str).duplicated(keep="last").to_numpy()
+    if not keep.all():
+        part, embedding = part[keep], embedding[keep]
+    props = {c: _nullable(part[c].to_numpy(float), float) for c in FLOAT_PROPERTIES}
+    props |= {c: _nullable(part[c].to_numpy(float), int) for c in INT_PROPERTIES}
+    # Schlüssel als String, fehlende als None (nicht "nan") -> keine Dimensionsknoten/Kanten dafür,
+    # wie dropna() in _load_dimensions
+    keys = part[["Transaction_ID", "User_ID"] + list(DIMENSIONS.values())]
+    keys = keys.astype(str).astype(object).where(keys.notna(), None)
 
+    rows = []
+    for i, key_row in enumerate(keys.itertuples(index=False)):
+        rows.append({
+            **key_row._asdict(),
+            "props": {c: values[i] for c, values in props.items()},
+            "embedding": _nullable(embedding[i], float),
+        })
+    return rows
+
+
+def _write_transactions(tx, rows: list[dict]) -> None:
+    tx.run(TRANSACTION_BATCH_QUERY, rows=rows).consume()
+
+
+def _read_checkpoint(path: Path, key: str) -> set[int]:
+    # Erste Zeile: Eingabe-Hash + Batchgröße; danach eine Zeile pro geschriebenem Batch
+    if not path.exists():
+        return set()
+    lines = path.read_text().splitlines()
+    if not lines or lines[0] != key:
+        return set()
+    return {int(line) for line in lines[1:] if line}
+
+
+def _batches(path: Path, vectors: np.ndarray, ids: pd.Series, batch_size: int):
+    # Clean-Daten in Chunks neben dem passenden Ausschnitt der memory-mapped Embeddings; Zeilenzahl
+    # und Reihenfolge werden beim Lesen geprüft, bevor ein Batch geschrieben wird
+    start = 0
+    for batch, part in enumerate(iter_table(path, chunksize=batch_size)):
+        end = start + len(part)
+        if end > len(vectors) or not np.array_equal(part["Transaction_ID"].astype(str).to_numpy(), ids[start:end]):
+            raise ValueError(f"Embeddings ({len(vectors)} Zeilen) passen nicht zu {path} (ab Zeile {start}) – neu erzeugen")
+        yield batch, part, vectors[start:end]
+        start = end
+    if start != len(vectors):
+        raise ValueError(f"Embeddings ({len(vectors)} Zeilen) passen nicht zu {path} ({start} Zeilen)")
+
+
+def import_transactions_unwind(
+    driver,
+    path: Path,
+    vectors: np.ndarray,
+    ids: pd.Series,
+    checkpoint_key: str,
+    batch_size: int = NEO4J_BATCH_SIZE,
+    writers: int = NEO4J_WRITERS,
+    checkpoint_path: Path = NEO4J_CHECKPOINT_PATH
+) -> int:
+    ids = ids.astype(str).to_numpy()
+    _create_constraints(driver)
+    _load_dimensions(driver, path, batch_size)
+    # Die Batches schreiben nur Änderungen fort -> fehlende Zähler vorher aus dem Bestand berechnen
+    if _counters_missing(driver):
+        refresh_fraud_counters(driver)
+
+    # Fortsetzen: bereits geschriebene Batches überspringen (MERGE macht Wiederholungen harmlos)
+    done = _read_checkpoint(checkpoint_path, checkpoint_key)
+    if not done:
+        checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        checkpoint_path.write_text(checkpoint_key + "\n")
+    else:
+        print(f"\n Neo4j-Import wird fortgesetzt: {len(done)} Batches bereits geschrieben")
+
+    lock = threading.Lock()
+
+    def write_batch(batch: int, rows: list[dict]) -> int:
+        # Eine Session pro Batch; execute_write wiederholt transiente Fehler (z.B. Deadlocks)
+        with driver.session() as session:
+            session.execute_write(_write_transactions, rows)
+        with lock, open(checkpoint_path, "a", encoding="utf-8") as f:
+            f.write(f"{batch}\n")
+        return len(rows)
+
+    # Höchstens 2 Batches pro Writer gleichzeitig im Speicher
+    written = finished = 0
+    pending = set()
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        try:
+            for batch, part, embedding in _batches(path, vectors, ids, batch_size):
+                if batch in done:
+                    continue
+                if len(pending) >= 2 * writers:
+                    completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        written += future.result()
+                        finished += 1
+                        if finished % 20 == 0:
+                            print(f" {finished} Batches geschrieben ({written} Transaktionen)")
+                pending.add(pool.submit(write_batch, batch, _batch_rows(part, embedding)))
+            for future in pending:
+                written += future.result()
+                finished += 1
+        except Exception:
+            # Abbruch: offene Batches verwerfen, der Checkpoint erlaubt das Fortsetzen
+            for future in pending:
+                future.cancel()
+            raise
+    print(f" {finished} Batches geschrieben ({written} Transaktionen)")
+    return written
+
+
+@instrumented("neo4j")
 def import_transactions_to_neo4j(
     input_csv_path: str = CLEAN_TRANSACTIONS_PATH,
     neo4j_import_path: str = NEO4J_IMPORT_PATH,
     neo4j_csv_url: str = "file:///transactions_vec.csv",
+    neo4j_clean_url: str = "file:///clean_transactions.csv",
     uri: str = NEO4J_URI,
     user: str = NEO4J_USER,
-    password: str = NEO4J_PASSWORD
+    password: str = NEO4J_PASSWORD,
+    mode: str = NEO4J_IMPORT_MODE
 ):
-    # CSV laden
-    df = pd.read_csv(input_csv_path)
-
-    # Feature-Auswahl
-    vector_features = [
-        "Transaction_Amount",
-        "Amount_to_Balance_Ratio",
-        "Risk_Score",
-        "Failed_Transaction_Count_7d",
-        "Transaction_Distance",
-        "Card_Age",
-        "Hour",
-        "Is_Weekend"
-    ]
-
-    # Normieren
-    X = df[vector_features].astype(float).values
-    X = StandardScaler().fit_transform(X)
-
-    # Vektor als einzelne Spalten
-    for i in range(X.shape[1]):
-        df[f"emb_{i}"] = X[:, i]
-
-    # Export für Neo4j
-    df.to_csv(neo4j_import_path, index=False)
-    print("CSV für Neo4j exportiert")
+    # UNWIND-Modus braucht die CSV im Neo4j-Import-Verzeichnis nicht: Clean-Daten (CSV oder Feather)
+    # in Chunks + Embeddings als memory-mapped float32-Matrix in derselben Zeilenreihenfolge
+    if mode == "unwind":
+        build_embeddings(input_csv_path)
+        vectors, ids = load_embeddings()
+    else:
+        export_for_load_csv(input_csv_path, neo4j_import_path)
 
     # Verbindung zur Neo4j-Datenbank herstellen
     driver = GraphDatabase.driver(uri, auth=(user, password))
@@ -90,14 +355,7 @@ def import_transactions_to_neo4j(
         # Die Cypher-Abfrage zum Laden der CSV und Erstellen der Knoten und Beziehungen
         query = f"""
         CALL (){{
-          LOAD CSV WITH HEADERS FROM '{neo4j_csv_url}' AS row
-
-          MERGE (u:User {{User_ID: row.User_ID}})
-          MERGE (l:Location {{name: row.Location}})
-          MERGE (d:DeviceType {{name: row.Device_Type}})
-          MERGE (m:MerchantCategory {{name: row.Merchant_Category}})
-          MERGE (c:CardType {{name: row.Card_Type}})
-          MERGE (a:AuthMethod {{name: row.Authentication_Method}})
+          LOAD CSV WITH HEADERS FROM '{neo4j_clean_url}' AS row
 
           MERGE (t:Transaction {{Transaction_ID: row.Transaction_ID}})
           SET
@@ -109,18 +367,21 @@ def import_transactions_to_neo4j(
             t.Card_Age = toFloat(row.Card_Age),
             t.Hour = toInteger(row.Hour),
             t.Is_Weekend = toInteger(row.Is_Weekend),
-            t.Fraud_Label = toInteger(row.Fraud_Label),
-            t.embedding = [
-              toFloat(row.emb_0), toFloat(row.emb_1), toFloat(row.emb_2), toFloat(row.emb_3),
-              toFloat(row.emb_4), toFloat(row.emb_5), toFloat(row.emb_6), toFloat(row.emb_7)
-            ]
-
-          MERGE (u)-[:MADE]->(t)
-          MERGE (t)-[:AT]->(l)
-          MERGE (t)-[:USING_DEVICE]->(d)
-          MERGE (t)-[:IN_CATEGORY]->(m)
-          MERGE (t)-[:PAID_WITH]->(c)
-          MERGE (t)-[:AUTHED_VIA]->(a)
+            t.Fraud_Label = toInteger(row.Fraud_Label)
+
+          // Leere Schlüssel (null) überspringen statt MERGE mit null -> nur diese Kante fehlt
+          FOREACH (_ IN CASE WHEN row.User_ID IS NULL THEN [] ELSE [1] END |
+            MERGE (u:User {{User_ID: row.User_ID}}) MERGE (u)-[:MADE]->(t))
+          FOREACH (_ IN CASE WHEN row.Location IS NULL THEN [] ELSE [1] END |
+            MERGE (l:Location {{name: row.Location}}) MERGE (t)-[:AT]->(l))
+          FOREACH (_ IN CASE WHEN row.Device_Type IS NULL THEN [] ELSE [1] END |
+            MERGE (d:DeviceType {{name: row.Device_Type}}) MERGE (t)-[:USING_DEVICE]->(d))
+          FOREACH (_ IN CASE WHEN row.Merchant_Category IS NULL THEN [] ELSE [1] END |
+            MERGE (m:MerchantCategory {{name: row.Merchant_Category}}) MERGE (t)-[:IN_CATEGORY]->(m))
+          FOREACH (_ IN CASE WHEN row.Card_Type IS NULL THEN [] ELSE [1] END |
+            MERGE (c:CardType {{name: row.Card_Type}}) MERGE (t)-[:PAID_WITH]->(c))
+          FOREACH (_ IN CASE WHEN row.Authentication_Method IS NULL THEN [] ELSE [1] END |
+            MERGE (a:AuthMethod {{name: row.Authentication_Method}}) MERGE (t)-[:AUTHED_VIA]->(a))
 
           RETURN 1 AS ok
         }}
@@ -128,6 +389,19 @@ def import_transactions_to_neo4j(
         RETURN count(ok) AS batches;
         """
 
+        # Embeddings aus der schmalen ID+Vektor-CSV, Transaktion per Constraint-Index
+        embedding_query = f"""
+        CALL (){{
+          LOAD CSV WITH HEADERS FROM '{neo4j_csv_url}' AS row
+          MATCH (t:Transaction {{Transaction_ID: row.Transaction_ID}})
+          SET t.embedding = [
+            toFloat(row.emb_0), toFloat(row.emb_1), toFloat(row.emb_2), toFloat(row.emb_3),
+            toFloat(row.emb_4), toFloat(row.emb_5), toFloat(row.emb_6), toFloat(row.emb_7)
+          ]
+        }}
+        IN TRANSACTIONS OF 10000 ROWS;
+        """
+
         # Bestätigen, dass die Daten geladen wurden
         def check_data():
             query_check = """
@@ -145,9 +419,20 @@ def import_transactions_to_neo4j(
                 for record in result:
                     print(record["User"], record["Transaction"], record["Amount"], record["RiskScore"], record["FraudLabel"])
 
+        if mode == "unwind":
+            # Fortsetzbar pro Batch statt alles-oder-nichts über has_data()
+            key = f"{content_hash(input_csv_path, {})}:{NEO4J_BATCH_SIZE}"
+            import_transactions_unwind(driver, input_csv_path, vectors, ids["Transaction_ID"], key)
+            ensure_vector_index()
+            check_index_state()
+            check_data()
         # Lade nur einmal. Falls Daten schon importiert wurden kein neuer Import.
-        if not has_data():
+        elif not has_data():
+            _create_constraints(driver)
             execute_query(query)
+            execute_query(embedding_query)
+            # LOAD CSV pflegt die Zähler nicht -> einmal komplett berechnen
+            refresh_fraud_counters(driver)
             ensure_vector_index()
             check_index_state()
             check_data()
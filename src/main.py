@@ -1,33 +1,151 @@
-from src.etl.extract import extract_transactions
-from src.etl.transform import transform_transactions
-from src.etl.load import load_data
+from pathlib import Path
+
+from neo4j.exceptions import AuthError, ServiceUnavailable
+
+from src.etl.extract import extract_transactions, extract_transactions_chunked, extract_transaction_keys
+from src.etl.transform import (
+    transform_chunk,
+    merge_user_partials,
+    finalize_user_aggregation,
+    register_transaction_keys,
+    check_user_aggregates_mergeable
+)
+from src.etl.load import (
+    load_data,
+    open_chunk_writers,
+    append_chunk,
+    close_chunk_writers,
+    load_users
+)
+from src.etl.parallel import transform_transactions_parallel
+from src.etl.incremental import run_incremental_etl
+from src.etl.txindex import TransactionIndex
 from src.graph.setup import import_transactions_to_neo4j
 from src.graph.report import run_demo
 from src.explore.explore import explore
-from src.randomforest.model_random_forest import random_forest
-from src.config import OUTPUT_DIR
+from src.randomforest.backends import train_model
+from src.cache import run_cached
+from src.scheduler import StageSkipped, run_stages
+from src.config import (
+    DATA_PATH,
+    OUTPUT_DIR,
+    OUTPUT_FORMAT,
+    ETL_MODE,
+    CHUNK_SIZE,
+    USER_AGG_EXTRAS,
+    CLEAN_TRANSACTIONS_PATH,
+    REJECTS_PATH,
+    USER_AGG_PATH,
+    MODEL_PATH,
+    IMPORTANCE_REPORT_PATH,
+    MODEL_BACKEND,
+    NEG_SAMPLE_RATE,
+    USE_GRAPH_FEATURES,
+    GRAPH_SMOOTHING,
+    GRAPH_FOLDS,
+    IMPORTANCE_REPEATS,
+    IMPORTANCE_MAX_ROWS,
+    MAX_PARALLEL_STAGES
+)
+
+SRC_DIR = Path(__file__).resolve().parent
 
 def run_etl():
-    raw_df = extract_transactions()
-    clean_df, rejects_df, users_df = transform_transactions(raw_df)
-    load_data(clean_df, rejects_df, users_df, OUTPUT_DIR)
+    # Der inkrementelle Modus liest selbst nur die neuen Zeilen der Quelle (Manifest)
+    if ETL_MODE == "incremental":
+        run_incremental_etl()
+        return
+
+    run_cached(
+        "etl",
+        run_etl_stream if ETL_MODE == "stream" else run_etl_full,
+        inputs=[DATA_PATH],
+        code=[SRC_DIR / "etl"],
+        config={
+            "mode": ETL_MODE,
+            "format": OUTPUT_FORMAT,
+            "chunk_size": CHUNK_SIZE,
+            "user_agg_extras": USER_AGG_EXTRAS
+        },
+        outputs=[CLEAN_TRANSACTIONS_PATH, REJECTS_PATH, USER_AGG_PATH]
+    )
+
+def run_etl_full(path=DATA_PATH, output_dir=OUTPUT_DIR):
+    raw_df = extract_transactions(path)
+    clean_df, rejects_df, users_df = transform_transactions_parallel(raw_df)
+    load_data(clean_df, rejects_df, users_df, output_dir)
+
+def run_etl_stream(path=DATA_PATH, output_dir=OUTPUT_DIR, chunksize: int = CHUNK_SIZE):
+    # Chunk für Chunk transformieren und direkt schreiben, User-Aggregate laufend zusammenführen
+    check_user_aggregates_mergeable()
+    user_partials = None
+
+    # Ausgaben werden neu geschrieben -> Index nur temporär (Puffer + Lauf auf der Platte), Deduplication über alle Chunks dieses Laufs.
+    # Erst nur IDs + Timestamps lesen, damit feststeht, welche Zeile pro ID gewinnt
+    # Fehlende Transaction_IDs gelten wie im vollen ETL als eine ID (eine Zeile davon bleibt)
+    tx_index = TransactionIndex()
+    for keys in extract_transaction_keys(chunksize, path):
+        register_transaction_keys(tx_index, keys)
+
+    writers = open_chunk_writers(output_dir)
+    try:
+        for chunk in extract_transactions_chunked(chunksize, path):
+            clean_df, rejects_df, partials = transform_chunk(chunk, tx_index=tx_index)
+            append_chunk(clean_df, rejects_df, writers)
+            user_partials = merge_user_partials(user_partials, partials)
+    finally:
+        close_chunk_writers(writers)
+
+    users_df = finalize_user_aggregation(user_partials)
+    load_users(users_df, output_dir)
 
 def run_neo4j():
     try:
         import_transactions_to_neo4j()
         run_demo()
-    except Exception as e:
-        print("Neo4j nicht verfügbar – überspringe Graph-Teil.")
-        print(e)
+    except (ServiceUnavailable, AuthError) as e:
+        # Neo4j ist optional: nicht erreichbar/falsche Zugangsdaten -> Stage übersprungen,
+        # alle anderen Fehler weiterreichen (Stage fehlgeschlagen)
+        raise StageSkipped(f"Neo4j nicht verfügbar ({type(e).__name__}) – Graph-Teil übersprungen") from e
 
 def run_explore():
     explore()
 
 def run_random_forest():
-    random_forest()
+    # Gecacht werden das gespeicherte Modell, der Importance-Bericht und die Auswertung (Konsolenausgabe)
+    run_cached(
+        "random_forest",
+        train_model,
+        inputs=[CLEAN_TRANSACTIONS_PATH],
+        # Nur die Module, die train_model durchläuft (Hyperparameter und Split stehen im Code),
+        # und nur die Einstellungen, die das Ergebnis ändern – IMPORTANCE_JOBS z.B. nicht
+        code=[
+            SRC_DIR / "randomforest" / "backends.py",
+            SRC_DIR / "randomforest" / "model_random_forest.py",
+            SRC_DIR / "randomforest" / "importance.py",
+            SRC_DIR / "graph" / "memgraph.py",
+            SRC_DIR / "etl" / "artifacts.py"
+        ],
+        config={
+            "backend": MODEL_BACKEND,
+            "neg_sample_rate": NEG_SAMPLE_RATE,
+            "graph_features": USE_GRAPH_FEATURES,
+            "graph_smoothing": GRAPH_SMOOTHING,
+            "graph_folds": GRAPH_FOLDS,
+            "importance_repeats": IMPORTANCE_REPEATS,
+            "importance_max_rows": IMPORTANCE_MAX_ROWS
+        },
+        outputs=[MODEL_PATH, IMPORTANCE_REPORT_PATH],
+        capture_stdout=True
+    )
+
+# Stage -> (Funktion, Abhängigkeiten); Neo4j, Explore und Random Forest lesen nur die ETL-Ausgaben
+STAGES = {
+    "etl": (run_etl, []),
+    "neo4j": (run_neo4j, ["etl"]),
+    "explore": (run_explore, ["etl"]),
+    "random_forest": (run_random_forest, ["etl"]),
+}
 
 if __name__ == "__main__":
-    run_etl()
-    run_neo4j()
-    run_explore()
-    run_random_forest()
+    run_stages(STAGES, MAX_PARALLEL_STAGES)
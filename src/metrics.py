@@ -0,0 +1,88 @@
+import functools
+import json
+import os
+import time
+import uuid
+
+import pandas as pd
+
+from src.config import METRICS_PATH, QUIET
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Instrumentierung: @instrumented misst pro Aufruf Wall-Zeit, CPU-Zeit, Peak-RSS, Zeilen rein/raus
+# und Rejects und hängt das Ergebnis als JSON-Zeile an METRICS_PATH an.
+# Peak-RSS ist der Höchststand des ganzen Prozesses (process_peak_rss_mb), nicht des Aufrufs;
+# peak_rss_delta_mb ist, um wie viel der Aufruf diesen Höchststand angehoben hat (0 = blieb darunter).
+# @diagnostic markiert reine Diagnose-Ausgaben, die mit QUIET = True gar nicht erst berechnet werden.
+
+# Eine ID pro Pipeline-Lauf; Worker-Prozesse erben sie über die Umgebung
+RUN_ID = os.environ.setdefault("PIPELINE_RUN_ID", uuid.uuid4().hex[:12])
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    # Linux: KB, macOS: Bytes
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024**2 if os.uname().sysname == "Darwin" else peak / 1024, 1)
+
+
+def rss_delta(before: float | None, after: float | None) -> float | None:
+    return None if before is None or after is None else round(after - before, 1)
+
+
+def _rows(value) -> int | None:
+    return len(value) if isinstance(value, pd.DataFrame) else None
+
+
+def record(stage: str, func: str, **fields) -> None:
+    if METRICS_PATH is None:
+        return
+    entry = {"run_id": RUN_ID, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "stage": stage, "func": func,
+             "pid": os.getpid(), **fields}
+    METRICS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    # Eine Zeile pro write-Aufruf im Append-Modus -> Zeilen paralleler Prozesse bleiben intakt
+    with open(METRICS_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+# rejects: Position des Reject-DataFrames im zurückgegebenen Tupel (z.B. (clean, rejects) -> 1)
+def instrumented(stage: str, rejects: int | None = None):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # Zeilen vorher zählen, manche Helper ändern den DataFrame in place
+            rows_in = _rows(args[0]) if args else None
+            peak_before = peak_rss_mb()
+            wall, cpu = time.perf_counter(), time.process_time()
+            result = func(*args, **kwargs)
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+            out = result[0] if isinstance(result, tuple) and result else result
+            peak = peak_rss_mb()
+            record(
+                stage, func.__name__,
+                wall_s=round(wall, 4),
+                cpu_s=round(cpu, 4),
+                process_peak_rss_mb=peak,
+                peak_rss_delta_mb=rss_delta(peak_before, peak),
+                rows_in=rows_in,
+                rows_out=_rows(out),
+                rejects=_rows(result[rejects]) if rejects is not None else None,
+            )
+            return result
+        return wrapper
+    return decorator
+
+
+def diagnostic(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if QUIET:
+            return None
+        return func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,153 @@
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.metrics import average_precision_score, roc_auc_score
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OrdinalEncoder
+
+from src.config import CLEAN_TRANSACTIONS_PATH, MODEL_PATH, IMPORTANCE_REPORT_PATH, MODEL_BACKEND, NEG_SAMPLE_RATE
+from src.metrics import instrumented
+from src.randomforest.importance import print_importance_report, save_importance_report
+from src.randomforest.model_random_forest import (
+    CATEGORICAL_FEATURES,
+    NUMERIC_FEATURES,
+    downsample_negatives,
+    fraud_proba,
+    graph_transformers,
+    print_evaluation,
+    random_forest,
+    save_model,
+    _build_pipeline,
+    _load_xy,
+    _train_test_split
+)
+
+# Austauschbare Modell-Backends auf denselben Features (FEATURE_COLS, ggf. Graph-Features) und demselben Split.
+#   random_forest – OneHot + RandomForestClassifier (model_random_forest.py)
+#   hist_gb       – HistGradientBoostingClassifier mit nativen Kategorien: die kategorischen Spalten
+#                   werden nur ordinal kodiert (eine Spalte pro Feature statt OneHot-Blöcke), die
+#                   Features werden einmal in Histogramm-Bins einsortiert
+# Jedes Backend ist eine Pipeline, dadurch funktionieren save_model/load_model/score.py unverändert.
+
+
+def _build_hist_gb_pipeline(**params) -> Pipeline:
+    # Unbekannte Kategorien -> NaN, HistGradientBoosting behandelt sie wie fehlende Werte
+    preprocess = ColumnTransformer(
+        transformers=[
+            ("cat", OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=np.nan), CATEGORICAL_FEATURES),
+            ("num", "passthrough", NUMERIC_FEATURES),
+            *graph_transformers(),
+        ],
+        remainder="drop"
+    )
+
+    model = HistGradientBoostingClassifier(
+        max_iter=500,
+        learning_rate=0.05,
+        max_leaf_nodes=31,
+        min_samples_leaf=20,
+        l2_regularization=1.0,
+        categorical_features=list(range(len(CATEGORICAL_FEATURES))),
+        class_weight="balanced",
+        early_stopping=True,
+        validation_fraction=0.1,
+        n_iter_no_change=20,
+        random_state=42
+    )
+    model.set_params(**params)
+
+    return Pipeline(steps=[
+        ("preprocess", preprocess),
+        ("model", model)
+    ])
+
+
+BACKENDS = {
+    "random_forest": _build_pipeline,
+    "hist_gb": _build_hist_gb_pipeline,
+}
+
+NAMES = {"random_forest": "Random Forest", "hist_gb": "HistGradientBoosting"}
+
+
+@instrumented("model")
+def train_model(
+    backend: str = MODEL_BACKEND,
+    path: Path = CLEAN_TRANSACTIONS_PATH,
+    model_path: Path = MODEL_PATH,
+    neg_sample_rate: float = NEG_SAMPLE_RATE,
+    importance_path: Path = IMPORTANCE_REPORT_PATH
+):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unbekanntes Modell-Backend {backend!r} – erlaubt: {', '.join(BACKENDS)}")
+    if backend == "random_forest":
+        # Bisheriger Weg inkl. Feature Importances
+        return random_forest(path, model_path, neg_sample_rate=neg_sample_rate, importance_path=importance_path)
+
+    X, y = _load_xy(path)
+    X_train, X_test, y_train, y_test = _train_test_split(X, y)
+    params = {}
+    if neg_sample_rate < 1:
+        X_train, y_train = downsample_negatives(X_train, y_train, neg_sample_rate)
+        params["class_weight"] = None
+
+    model = BACKENDS[backend](**params)
+    model.fit(X_train, y_train)
+    model[-1].neg_sample_rate_ = neg_sample_rate
+    print("\n Modell gespeichert:", save_model(model, model_path, backend))
+
+    print_evaluation(NAMES[backend], y_test, fraud_proba(model, X_test))
+    save_importance_report(print_importance_report(model, X_test, y_test), importance_path)
+
+
+def compare_backends(path: Path = CLEAN_TRANSACTIONS_PATH, backends=tuple(BACKENDS)) -> pd.DataFrame:
+    # Gleicher Split für alle Backends; Durchsatz = Zeilen pro Sekunde für Fit bzw. predict_proba
+    X, y = _load_xy(path)
+    X_train, X_test, y_train, y_test = _train_test_split(X, y)
+
+    rows = {}
+    for backend in backends:
+        model = BACKENDS[backend]()
+
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        proba = fraud_proba(model, X_test)
+        predict_s = time.perf_counter() - start
+
+        print_evaluation(NAMES[backend], y_test, proba)
+        rows[backend] = {
+            "fit_s": round(fit_s, 2),
+            "train_rows_per_s": round(len(y_train) / fit_s),
+            "predict_s": round(predict_s, 3),
+            "predict_rows_per_s": round(len(y_test) / predict_s),
+            "roc_auc": round(roc_auc_score(y_test, proba), 4),
+            "avg_precision": round(average_precision_score(y_test, proba), 4),
+            "model_columns": model[-1].n_features_in_,
+        }
+
+    table = pd.DataFrame(rows)
+    print(f"\n === Backends im Vergleich ({len(y_train)} Trainings-, {len(y_test)} Testzeilen) ===")
+    print(table.to_string())
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Modell-Backends trainieren oder vergleichen")
+    parser.add_argument("--backend", choices=list(BACKENDS), default=MODEL_BACKEND)
+    parser.add_argument("--input", type=Path, default=CLEAN_TRANSACTIONS_PATH)
+    parser.add_argument("--compare", action="store_true", help="alle Backends auf demselben Split vergleichen")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_backends(args.input)
+    else:
+        train_model(args.backend, args.input)
@@ -0,0 +1,212 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.config import MODEL_PATH, COMPACT_MODEL_DIR, CLEAN_TRANSACTIONS_PATH
+from src.randomforest.model_random_forest import (
+    CATEGORICAL_FEATURES,
+    feature_fingerprint,
+    load_model,
+    _load_xy
+)
+
+# Kompakte Darstellung des Random Forest: alle Bäume in zusammenhängenden NumPy-Arrays
+#   feature (int32), threshold (float32), children (int32, global indiziert, [2k] = rechts,
+#   [2k + 1] = links), value (float32, Fraud-Wahrscheinlichkeit im Blatt), missing_left (bool),
+#   roots (int32, Wurzel je Baum)
+# Blätter zeigen auf sich selbst, dadurch kann die Traversierung alle Bäume und Zeilen gleichzeitig
+# schrittweise vorrücken. Die Arrays werden memory-mapped geladen (Millisekunden, von allen
+# Worker-Prozessen geteilt), statt Pipeline + 500 Baum-Objekte zu unpicklen.
+#
+# Schwellenwerte: sklearn vergleicht float32-Features mit float64-Schwellen (x <= t). Mit der
+# größten float32-Zahl <= t bleibt jede Entscheidung exakt gleich.
+
+_ARRAYS = ("feature", "threshold", "children", "value", "missing_left", "roots")
+_ROW_BLOCK = 2048
+
+
+def _float32_floor(threshold: np.ndarray) -> np.ndarray:
+    t32 = threshold.astype(np.float32)
+    too_big = t32.astype(np.float64) > threshold
+    t32[too_big] = np.nextafter(t32[too_big], np.float32(-np.inf))
+    return t32
+
+
+def _prune(left, right, value, weight, tol: float):
+    # Innere Knoten, deren beide Kinder Blätter mit fast gleichem Wert sind, zu einem Blatt machen;
+    # wiederholen, bis sich nichts mehr ändert (Werte gewichtet nach Trainings-Samples)
+    left, right, value, weight = left.copy(), right.copy(), value.copy(), weight.copy()
+    while True:
+        internal = np.flatnonzero(left >= 0)
+        l, r = left[internal], right[internal]
+        mergeable = (left[l] < 0) & (left[r] < 0) & (np.abs(value[l] - value[r]) <= tol)
+        nodes = internal[mergeable]
+        if not len(nodes):
+            return left, right, value
+        l, r = left[nodes], right[nodes]
+        value[nodes] = (value[l] * weight[l] + value[r] * weight[r]) / (weight[l] + weight[r])
+        left[nodes] = right[nodes] = -1
+
+
+def _flatten_tree(tree, prune_tol: float | None):
+    left = tree.children_left.astype(np.int64)
+    right = tree.children_right.astype(np.int64)
+    value = tree.value[:, 0, 1] / tree.value[:, 0, :].sum(axis=1)
+    if prune_tol is not None:
+        left, right, value = _prune(left, right, value, tree.weighted_n_node_samples, prune_tol)
+
+    # Nur erreichbare Knoten behalten (nach dem Pruning hängen Teilbäume lose), Reihenfolge wie im Baum
+    reachable = np.zeros(len(left), dtype=bool)
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        reachable[node] = True
+        if left[node] >= 0:
+            stack.extend((left[node], right[node]))
+    nodes = np.flatnonzero(reachable)
+    new_index = np.full(len(left), -1, dtype=np.int64)
+    new_index[nodes] = np.arange(len(nodes))
+
+    is_leaf = left[nodes] < 0
+    own = np.arange(len(nodes))
+    return {
+        "feature": np.where(is_leaf, 0, tree.feature[nodes]),
+        "threshold": np.where(is_leaf, np.inf, tree.threshold[nodes]),
+        "left": np.where(is_leaf, own, new_index[left[nodes]]),
+        "right": np.where(is_leaf, own, new_index[right[nodes]]),
+        "value": value[nodes],
+        "missing_left": tree.missing_go_to_left[nodes].astype(bool),
+    }
+
+
+def export_compact(model, directory: Path = COMPACT_MODEL_DIR, prune_tol: float | None = None) -> Path:
+    if "rf" not in model.named_steps:
+        raise ValueError("Kompakter Export unterstützt nur das Backend 'random_forest'")
+    rf = model.named_steps["rf"]
+    if "graph" in model.named_steps["preprocess"].named_transformers_:
+        raise ValueError("Kompakter Export unterstützt keine Graph-Features (USE_GRAPH_FEATURES)")
+    ohe = model.named_steps["preprocess"].named_transformers_["cat"]
+
+    trees = [_flatten_tree(est.tree_, prune_tol) for est in rf.estimators_]
+    sizes = np.array([len(t["value"]) for t in trees])
+    roots = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    arrays = {
+        "feature": np.concatenate([t["feature"] for t in trees]).astype(np.int32),
+        "threshold": _float32_floor(np.concatenate([t["threshold"] for t in trees])),
+        "children": np.column_stack([
+            np.concatenate([t["right"] + off for t, off in zip(trees, roots)]),
+            np.concatenate([t["left"] + off for t, off in zip(trees, roots)]),
+        ]).ravel().astype(np.int32),
+        "value": np.concatenate([t["value"] for t in trees]).astype(np.float32),
+        "missing_left": np.concatenate([t["missing_left"] for t in trees]),
+        "roots": roots.astype(np.int32),
+    }
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(directory / f"{name}.npy", array)
+
+    meta = {
+        "fingerprint": feature_fingerprint(),
+        "n_trees": len(trees),
+        "n_nodes": int(sizes.sum()),
+        "max_depth": int(max(est.tree_.max_depth for est in rf.estimators_)),
+        "n_features": int(rf.n_features_in_),
+        "prune_tol": prune_tol,
+        "neg_sample_rate": getattr(rf, "neg_sample_rate_", 1.0),
+        # Kategorien des OneHotEncoders, damit Scoring ohne die Pipeline auskommt
+        "categories": {f: [str(c) for c in cats] for f, cats in zip(CATEGORICAL_FEATURES, ohe.categories_)},
+    }
+    (directory / "meta.json").write_text(json.dumps(meta, indent=2))
+    return directory
+
+
+class CompactForest:
+    def __init__(self, directory: Path = COMPACT_MODEL_DIR):
+        directory = Path(directory)
+        self.meta = json.loads((directory / "meta.json").read_text())
+        if self.meta["fingerprint"] != feature_fingerprint():
+            raise ValueError(f"Kompaktes Modell {directory} passt nicht zum aktuellen Feature-Schema – neu exportieren")
+        for name in _ARRAYS:
+            # np.asarray: gleiche Speicherseiten wie die memmap, aber schnelleres Fancy-Indexing
+            setattr(self, name, np.asarray(np.load(directory / f"{name}.npy", mmap_mode="r")))
+        self.categories = [self.meta["categories"][f] for f in CATEGORICAL_FEATURES]
+        # Wie beim Forest: predict_proba liefert Stichproben-Wahrscheinlichkeiten, fraud_proba korrigiert
+        self.neg_sample_rate_ = self.meta.get("neg_sample_rate", 1.0)
+
+    def _predict_block(self, X: np.ndarray) -> np.ndarray:
+        n_rows, n_trees = len(X), len(self.roots)
+        flat_x = X.ravel()
+        has_nan = np.isnan(flat_x).any()
+        # Baum-major: benachbarte Positionen lesen Knoten desselben Baums (Cache-Lokalität)
+        node = np.repeat(self.roots, n_rows)
+        offset = np.tile(np.arange(n_rows) * X.shape[1], n_trees)
+
+        # Alle (Zeile, Baum)-Paare gleichzeitig eine Ebene tiefer; Paare im Blatt fallen aus der
+        # aktiven Menge heraus, dadurch sinkt die Arbeit mit jeder Ebene
+        active = np.arange(len(node))
+        current = node.copy()
+        while len(active):
+            x = flat_x[offset[active] + self.feature[current]]
+            go_left = x <= self.threshold[current]
+            if has_nan:
+                go_left |= np.isnan(x) & self.missing_left[current]
+            current = self.children[2 * current + go_left]
+            node[active] = current
+            inner = self.children[2 * current] != current
+            active, current = active[inner], current[inner]
+
+        return self.value[node].reshape(n_trees, n_rows).mean(axis=0, dtype=np.float64)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        fraud = np.concatenate([self._predict_block(X[i:i + _ROW_BLOCK]) for i in range(0, len(X), _ROW_BLOCK)])
+        return np.column_stack([1 - fraud, fraud])
+
+
+def _nbytes(directory: Path) -> int:
+    return sum(p.stat().st_size for p in Path(directory).glob("*.npy"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Random Forest in kompakte Arrays exportieren und prüfen")
+    parser.add_argument("--model", type=Path, default=MODEL_PATH)
+    parser.add_argument("--out", type=Path, default=COMPACT_MODEL_DIR)
+    parser.add_argument("--prune-tol", type=float, default=None, help="Blätter mit |Δp| <= tol zusammenfassen")
+    parser.add_argument("--data", type=Path, default=CLEAN_TRANSACTIONS_PATH, help="Clean-Daten für den Vergleich")
+    parser.add_argument("--check-rows", type=int, default=5_000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    model = load_model(args.model, backend="random_forest")
+    load_pipeline = time.perf_counter() - start
+
+    export_compact(model, args.out, args.prune_tol)
+
+    start = time.perf_counter()
+    forest = CompactForest(args.out)
+    load_compact = time.perf_counter() - start
+
+    # Vergleich mit predict_proba auf einer Stichprobe der Clean-Daten
+    X, _y = _load_xy(args.data)
+    X = X.head(args.check_rows)
+    encoded = model.named_steps["preprocess"].transform(X)
+    encoded = encoded.toarray() if hasattr(encoded, "toarray") else encoded
+
+    start = time.perf_counter()
+    expected = model.named_steps["rf"].predict_proba(encoded)[:, 1]
+    time_sklearn = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = forest.predict_proba(encoded)[:, 1]
+    time_compact = time.perf_counter() - start
+
+    print(f"\n Knoten: {forest.meta['n_nodes']:,} | Arrays: {_nbytes(args.out) / 1024**2:.1f} MB "
+          f"| Pipeline-Datei: {Path(args.model).stat().st_size / 1024**2:.1f} MB")
+    print(f" Laden: Pipeline {load_pipeline * 1000:.0f} ms | kompakt {load_compact * 1000:.1f} ms")
+    print(f" Predict {len(X)} Zeilen: sklearn {time_sklearn:.3f}s | kompakt {time_compact:.3f}s")
+    print(f" Max. Abweichung predict_proba: {np.abs(expected - actual).max():.2e}")
@@ -0,0 +1,67 @@
+import argparse
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from sklearn.metrics import average_precision_score, brier_score_loss, log_loss, roc_auc_score
+
+from src.config import CLEAN_TRANSACTIONS_PATH
+from src.randomforest.model_random_forest import (
+    downsample_negatives,
+    fraud_proba,
+    _build_pipeline,
+    _load_xy,
+    _train_test_split
+)
+
+# Vergleich: Training auf allen Daten gegen negatives Downsampling mit verschiedenen Raten.
+# Gleicher Train/Test-Split wie random_forest(); der Test-Split bleibt immer vollständig, die
+# Wahrscheinlichkeiten der Downsampling-Modelle werden auf die Originalverteilung zurückgerechnet.
+# Ausgabe: Fit-Zeit, Trainingszeilen und Metriken mit Differenz zum Volltraining.
+
+
+def _evaluate(y_test, proba) -> dict:
+    return {
+        "roc_auc": roc_auc_score(y_test, proba),
+        "avg_precision": average_precision_score(y_test, proba),
+        "brier": brier_score_loss(y_test, proba),
+        "log_loss": log_loss(y_test, proba, labels=[0, 1]),
+    }
+
+
+def compare_downsampling(path: Path = CLEAN_TRANSACTIONS_PATH, rates=(0.5, 0.2, 0.1, 0.05), **rf_params) -> pd.DataFrame:
+    X, y = _load_xy(path)
+    X_train, X_test, y_train, y_test = _train_test_split(X, y)
+
+    rows = []
+    for rate in (1.0, *rates):
+        X_fit, y_fit = (X_train, y_train) if rate >= 1 else downsample_negatives(X_train, y_train, rate)
+        params = dict(rf_params) if rate >= 1 else {"class_weight": None, **rf_params}
+        model = _build_pipeline(**params)
+
+        start = time.perf_counter()
+        model.fit(X_fit, y_fit)
+        fit_s = time.perf_counter() - start
+        model.named_steps["rf"].neg_sample_rate_ = rate
+
+        rows.append({"rate": rate, "train_rows": len(y_fit), "fit_s": round(fit_s, 2), **_evaluate(y_test, fraud_proba(model, X_test))})
+        print(f" Rate {rate:<5} {len(y_fit):>9} Zeilen {fit_s:>8.2f}s")
+
+    table = pd.DataFrame(rows).set_index("rate")
+    for metric in ("fit_s", "roc_auc", "avg_precision", "brier", "log_loss"):
+        table[f"Δ{metric}"] = table[metric] - table.loc[1.0, metric]
+
+    print("\n === Negatives Downsampling vs. Volltraining ===")
+    print(table.round(4).to_string())
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Negatives Downsampling gegen Volltraining vergleichen")
+    parser.add_argument("--input", type=Path, default=CLEAN_TRANSACTIONS_PATH)
+    parser.add_argument("--rates", type=float, nargs="+", default=[0.5, 0.2, 0.1, 0.05])
+    parser.add_argument("--n-estimators", type=int, default=None, help="weniger Bäume für schnellere Vergleiche")
+    args = parser.parse_args()
+
+    compare_downsampling(args.input, args.rates, **({"n_estimators": args.n_estimators} if args.n_estimators else {}))
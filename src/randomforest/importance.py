@@ -0,0 +1,149 @@
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from joblib import Parallel, delayed
+from sklearn.metrics import roc_auc_score
+from sklearn.preprocessing import OneHotEncoder
+
+from src.cache import content_hash
+from src.config import (
+    CLEAN_TRANSACTIONS_PATH,
+    MODEL_PATH,
+    IMPORTANCE_DIR,
+    IMPORTANCE_REPEATS,
+    IMPORTANCE_MAX_ROWS,
+    IMPORTANCE_JOBS
+)
+
+# Feature Importances pro Quellfeature (nicht pro OneHot-Spalte).
+# - Zuordnung kodierte Spalte -> Quellfeature über output_indices_ des ColumnTransformers und die
+#   Kategorien des OneHotEncoders, ohne Namensvergleich
+# - Permutation Importance auf dem Test-Split: die Spalten eines Features werden gemeinsam mit
+#   derselben Zeilen-Permutation vertauscht (ein OneHot-Block bleibt gültig); die Testdaten werden
+#   einmal kodiert, die Baseline einmal berechnet, die (Feature, Wiederholung)-Läufe laufen parallel
+#   in Threads auf demselben Modell und Array (Baum-Vorhersagen geben den GIL frei)
+
+
+def source_columns(preprocess) -> dict[str, np.ndarray]:
+    # Quellfeature -> Indizes der kodierten Spalten, in Reihenfolge der Modell-Eingabe
+    groups = {}
+    for name, transformer, columns in preprocess.transformers_:
+        if name == "remainder" or transformer == "drop":
+            continue
+        offset = preprocess.output_indices_[name].start
+        if isinstance(transformer, OneHotEncoder):
+            drop_idx = transformer.drop_idx_ if transformer.drop_idx_ is not None else [None] * len(columns)
+            sizes = [len(c) - (d is not None) for c, d in zip(transformer.categories_, drop_idx)]
+        elif preprocess.output_indices_[name].stop - offset != len(columns):
+            # Abgeleitete Spalten (z.B. Graph-Features): jede Ausgabespalte ist ein eigenes Feature
+            columns = list(transformer.get_feature_names_out())
+            sizes = [1] * len(columns)
+        else:
+            sizes = [1] * len(columns)
+        for column, size in zip(columns, sizes):
+            groups[column] = np.arange(offset, offset + size)
+            offset += size
+    return groups
+
+
+def impurity_importance(model) -> pd.Series:
+    # Impurity-Importances des Modells, pro Quellfeature aufsummiert
+    importances = model[-1].feature_importances_
+    groups = source_columns(model.named_steps["preprocess"])
+    return pd.Series({f: importances[cols].sum() for f, cols in groups.items()}).sort_values(ascending=False)
+
+
+def _score_permuted(estimator, X, y, cols, seed) -> float:
+    rng = np.random.default_rng(seed)
+    X_perm = X.copy()
+    X_perm[:, cols] = X[rng.permutation(len(X))][:, cols]
+    return roc_auc_score(y, estimator.predict_proba(X_perm)[:, 1])
+
+
+def permutation_importance(
+    model,
+    X_test: pd.DataFrame,
+    y_test: pd.Series,
+    repeats: int = IMPORTANCE_REPEATS,
+    max_rows: int = IMPORTANCE_MAX_ROWS,
+    n_jobs: int = IMPORTANCE_JOBS,
+    seed: int = 42
+) -> pd.DataFrame:
+    if len(X_test) > max_rows:
+        X_test = X_test.sample(max_rows, random_state=seed)
+        y_test = y_test.loc[X_test.index]
+
+    preprocess, estimator = model.named_steps["preprocess"], model[-1]
+    X = preprocess.transform(X_test)
+    X = np.ascontiguousarray(X.toarray() if hasattr(X, "toarray") else X, dtype=np.float32)
+    y = y_test.to_numpy()
+    groups = source_columns(preprocess)
+
+    # Baseline einmal; ROC-AUC ist unabhängig von der Downsampling-Korrektur (monoton)
+    baseline = roc_auc_score(y, estimator.predict_proba(X)[:, 1])
+
+    # Parallel über Aufgaben statt innerhalb des Forests -> kein verschachteltes Threading
+    n_jobs_before = estimator.get_params().get("n_jobs")
+    if n_jobs_before is not None:
+        estimator.set_params(n_jobs=1)
+    try:
+        tasks = [(f, r) for f in groups for r in range(repeats)]
+        scores = Parallel(n_jobs=n_jobs, prefer="threads")(
+            delayed(_score_permuted)(estimator, X, y, groups[f], seed + r) for f, r in tasks
+        )
+    finally:
+        if n_jobs_before is not None:
+            estimator.set_params(n_jobs=n_jobs_before)
+
+    drops = pd.DataFrame(tasks, columns=["feature", "repeat"]).assign(drop=baseline - np.array(scores))
+    result = drops.groupby("feature")["drop"].agg(["mean", "std"]).sort_values("mean", ascending=False)
+    result.index.name = None
+    result.attrs.update({"baseline_roc_auc": baseline, "rows": len(y), "repeats": repeats})
+    return result
+
+
+def print_importance_report(model, X_test: pd.DataFrame, y_test: pd.Series, repeats: int = IMPORTANCE_REPEATS) -> pd.DataFrame:
+    report = pd.DataFrame({"impurity": impurity_importance(model)}) if hasattr(model[-1], "feature_importances_") else pd.DataFrame()
+    if repeats > 0:
+        perm = permutation_importance(model, X_test, y_test, repeats)
+        report = report.join(perm.rename(columns={"mean": "perm_auc_drop", "std": "perm_std"}), how="outer")
+        report = report.sort_values("perm_auc_drop", ascending=False)
+        print(f"\n Permutation Importance: ROC-AUC-Verlust auf {perm.attrs['rows']} Testzeilen, "
+              f"{repeats} Wiederholungen, Baseline {perm.attrs['baseline_roc_auc']:.4f}")
+
+    print("\n Feature Importances pro Quellfeature:")
+    print(report.round(5).to_string())
+    return report
+
+
+def save_importance_report(report: pd.DataFrame, path: Path) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report.to_dict(orient="index"), indent=2))
+    return path
+
+
+if __name__ == "__main__":
+    from src.randomforest.model_random_forest import load_model, _load_xy, _train_test_split
+
+    parser = argparse.ArgumentParser(description="Feature Importances für ein gespeichertes Modell")
+    parser.add_argument("--model", type=Path, default=MODEL_PATH)
+    parser.add_argument("--input", type=Path, default=CLEAN_TRANSACTIONS_PATH)
+    parser.add_argument("--repeats", type=int, default=IMPORTANCE_REPEATS)
+    args = parser.parse_args()
+
+    # Ergebnis pro Modell + Daten + Wiederholungen zwischenspeichern
+    key = f"{content_hash(args.model, {})[:16]}_{content_hash(args.input, {})[:16]}_{args.repeats}_{IMPORTANCE_MAX_ROWS}"
+    cached = IMPORTANCE_DIR / f"{key}.json"
+    if cached.exists():
+        print(f"\n Aus Cache: {cached}")
+        print(pd.read_json(cached, orient="index").to_string())
+    else:
+        X, y = _load_xy(args.input)
+        _X_train, X_test, _y_train, y_test = _train_test_split(X, y)
+        report = print_importance_report(load_model(args.model), X_test, y_test, args.repeats)
+        save_importance_report(report, cached)
@@ -1,7 +1,11 @@
+import hashlib
+import json
 from pathlib import Path
 
+import joblib
 import numpy as np
 import pandas as pd
+import sklearn
 
 from sklearn.compose import ColumnTransformer
 from sklearn.ensemble import RandomForestClassifier
@@ -10,7 +14,11 @@ from sklearn.model_selection import train_test_split
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import OneHotEncoder
 
-from src.config import CLEAN_TRANSACTIONS_PATH
+from src.config import CLEAN_TRANSACTIONS_PATH, MODEL_PATH, IMPORTANCE_REPORT_PATH, NEG_SAMPLE_RATE, USE_GRAPH_FEATURES
+from src.etl.artifacts import read_table
+from src.graph.memgraph import GRAPH_FEATURES, GRAPH_INPUT_COLS, GraphFeatures
+from src.metrics import instrumented
+from src.randomforest.importance import print_importance_report, save_importance_report
 
 
 TARGET = "Fraud_Label"
@@ -54,27 +62,104 @@ NUMERIC_FEATURES = [
     "Transaction_Distance",
 ]
 
+# Eingabespalten der Pipeline: FEATURE_COLS + Knoten-Spalten des Graphen, falls Graph-Features aktiv
+MODEL_INPUT_COLS = FEATURE_COLS + (
+    [c for c in GRAPH_INPUT_COLS if c not in FEATURE_COLS] if USE_GRAPH_FEATURES else []
+)
+
+
+def feature_fingerprint() -> str:
+    # Hash über Feature-Liste und -Typen: ein gespeichertes Modell passt nur zu genau diesem Schema
+    schema = {"features": FEATURE_COLS, "categorical": CATEGORICAL_FEATURES, "numeric": NUMERIC_FEATURES}
+    if USE_GRAPH_FEATURES:
+        schema["graph"] = GRAPH_FEATURES
+    return hashlib.sha256(json.dumps(schema).encode()).hexdigest()[:16]
+
+
+def save_model(model: Pipeline, path: Path = MODEL_PATH, backend: str = "random_forest") -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    artifact = {
+        "pipeline": model,
+        "backend": backend,
+        "fingerprint": feature_fingerprint(),
+        "features": MODEL_INPUT_COLS,
+        "sklearn_version": sklearn.__version__,
+    }
+    # Erst temporär schreiben, dann ersetzen -> ein Abbruch hinterlässt kein halbes Modell
+    tmp = path.with_suffix(".tmp")
+    joblib.dump(artifact, tmp)
+    tmp.replace(path)
+    return path
+
+
+def load_model(path: Path = MODEL_PATH, backend: str | None = None) -> Pipeline:
+    # backend: nur dieses Backend akzeptieren (serve.py/compact.py brauchen den Random Forest)
+    artifact = joblib.load(path)
+    # Ältere Artefakte ohne "backend": am Pipeline-Schritt erkennen
+    saved = artifact.get("backend") or ("random_forest" if "rf" in artifact["pipeline"].named_steps else "hist_gb")
+    if backend is not None and saved != backend:
+        raise ValueError(f"Modell {path} ist ein {saved!r}-Modell, hier wird {backend!r} benötigt – mit --backend {backend} trainieren")
+    if artifact["fingerprint"] != feature_fingerprint():
+        raise ValueError(
+            f"Modell {path} wurde mit anderem Feature-Schema trainiert "
+            f"({artifact['fingerprint']} != {feature_fingerprint()}) – bitte neu trainieren"
+        )
+    if artifact["sklearn_version"] != sklearn.__version__:
+        print(f"\n Modell mit scikit-learn {artifact['sklearn_version']} gespeichert, geladen mit {sklearn.__version__}")
+    return artifact["pipeline"]
+
+
+def _load_xy(path: Path = CLEAN_TRANSACTIONS_PATH) -> tuple[pd.DataFrame, pd.Series]:
+    # Nur die benötigten Spalten lesen
+    df = read_table(path, columns=MODEL_INPUT_COLS + [TARGET])
+
+    X = df[MODEL_INPUT_COLS].copy()
+    y = df[TARGET].astype(int)
+    return X, y
 
-def random_forest(path: Path = CLEAN_TRANSACTIONS_PATH):
 
-    df = pd.read_csv(path)
+def downsample_negatives(X: pd.DataFrame, y: pd.Series, rate: float, seed: int = 42):
+    # Alle Frauds behalten, von den Nicht-Frauds nur den Anteil rate
+    keep = (y.to_numpy() == 1) | (np.random.default_rng(seed).random(len(y)) < rate)
+    return X[keep], y[keep]
 
-    X = df[FEATURE_COLS].copy()
-    y = df[TARGET].astype(int)
 
-    preprocess = ColumnTransformer(
-        transformers=[
-            ("cat", OneHotEncoder(handle_unknown="ignore"), CATEGORICAL_FEATURES),
-            ("num", "passthrough", NUMERIC_FEATURES),
-        ],
-        remainder="drop",
-    )
+def correct_proba(proba: np.ndarray, rate: float) -> np.ndarray:
+    # Rückrechnung auf die Originalverteilung: in der Stichprobe sind die Fraud-Odds um 1/rate zu hoch
+    if rate >= 1:
+        return proba
+    return rate * proba / (rate * proba + 1 - proba)
+
+
+def fraud_proba(model, X) -> np.ndarray:
+    # Fraud-Wahrscheinlichkeit für Pipeline, Forest oder kompakten Forest, korrigiert um das Downsampling
+    estimator = model[-1] if isinstance(model, Pipeline) else model
+    return correct_proba(model.predict_proba(X)[:, 1], getattr(estimator, "neg_sample_rate_", 1.0))
+
+
+def print_evaluation(name: str, y_test: pd.Series, y_proba: np.ndarray) -> None:
+    # Gemeinsamer Bericht aller Backends (Schwelle 0.5 auf der korrigierten Wahrscheinlichkeit, wie predict)
+    y_pred = (y_proba > 0.5).astype(int)
+
+    print(f"\n === {name} Evaluation ===")
+    print("ROC-AUC:", roc_auc_score(y_test, y_proba))
+    print("\n Confusion Matrix:\n", confusion_matrix(y_test, y_pred))
+    print("\n Classification Report:\n", classification_report(y_test, y_pred, digits=4, zero_division=0))
 
+
+def graph_transformers() -> list:
+    # Graph-Features als eigener Block im ColumnTransformer (fit nur auf den Trainingszeilen)
+    return [("graph", GraphFeatures(), GRAPH_INPUT_COLS)] if USE_GRAPH_FEATURES else []
+
+
+def _build_pipeline(**rf_params) -> Pipeline:
     # OneHotEncoding für kategorische vars
     preprocess = ColumnTransformer(
         transformers=[
             ("cat", OneHotEncoder(handle_unknown="ignore"), CATEGORICAL_FEATURES),
             ("num", "passthrough", NUMERIC_FEATURES),
+            *graph_transformers(),
         ],
         remainder="drop"
     )
@@ -89,63 +174,51 @@ def random_forest(path: Path = CLEAN_TRANSACTIONS_PATH):
         random_state=42,
         n_jobs=-1
     )
+    # Überschreibungen, z.B. die besten Parameter aus dem Tuning
+    rf.set_params(**rf_params)
 
-    model = Pipeline(steps=[
+    return Pipeline(steps=[
         ("preprocess", preprocess),
         ("rf", rf)
     ])
 
+
+def _train_test_split(X: pd.DataFrame, y: pd.Series):
     # Train/Test Split
-    X_train, X_test, y_train, y_test = train_test_split(
+    return train_test_split(
         X, y,
         test_size=0.2,
         random_state=42,
         stratify=y
     )
 
-    # Trainieren
-    model.fit(X_train, y_train)
-
-    # Evaluation
-    y_pred = model.predict(X_test)
-    y_proba = model.predict_proba(X_test)[:, 1]
 
-    print("\n === Random Forest Evaluation ===")
-    print("ROC-AUC:", roc_auc_score(y_test, y_proba))
-    print("\n Confusion Matrix:\n", confusion_matrix(y_test, y_pred))
-    print("\n Classification Report:\n", classification_report(y_test, y_pred, digits=4))
+@instrumented("random_forest")
+def random_forest(
+    path: Path = CLEAN_TRANSACTIONS_PATH,
+    model_path: Path = MODEL_PATH,
+    rf_params: dict | None = None,
+    neg_sample_rate: float = NEG_SAMPLE_RATE,
+    importance_path: Path = IMPORTANCE_REPORT_PATH
+):
+    X, y = _load_xy(path)
 
-    # Feature Importances / Gewichtung
-    ohe = model.named_steps["preprocess"].named_transformers_["cat"]
-    cat_names = ohe.get_feature_names_out(CATEGORICAL_FEATURES)
-    all_feature_names = np.concatenate([cat_names, np.array(NUMERIC_FEATURES)])
+    rf_params = dict(rf_params or {})
+    X_train, X_test, y_train, y_test = _train_test_split(X, y)
+    if neg_sample_rate < 1:
+        # Mit Downsampling ohne class_weight trainieren, sonst stimmt die Rückrechnung nicht
+        X_train, y_train = downsample_negatives(X_train, y_train, neg_sample_rate)
+        rf_params.setdefault("class_weight", None)
+        print(f"\n Negatives Downsampling: {len(y_train)} Trainingszeilen (Rate {neg_sample_rate})")
 
-    importances = model.named_steps["rf"].feature_importances_
-    fi = pd.Series(importances, index=all_feature_names).sort_values(ascending=False)
+    model = _build_pipeline(**rf_params)
 
-    print("\n Top 20 Feature Importances:")
-    print(fi.head(20))
-
-    # Feature-Namen in Modell-Reihenfolge
-    ohe = model.named_steps["preprocess"].named_transformers_["cat"]
-    cat_names = ohe.get_feature_names_out(CATEGORICAL_FEATURES)
-    all_names = list(cat_names) + NUMERIC_FEATURES
-
-    fi = pd.Series(model.named_steps["rf"].feature_importances_, index=all_names)
-
-    # Aggregation: Kategorien aufsummieren
-    fi_agg = {}
-
-    # kategorische Variablen: summe über alle OneHot-Spalten, die mit "Feature_" anfangen
-    for f in CATEGORICAL_FEATURES:
-        fi_agg[f] = fi[fi.index.str.startswith(f + "_")].sum()
-
-    # numerische Variablen: genau den Feature-Namen nehmen
-    for f in NUMERIC_FEATURES:
-        fi_agg[f] = fi.get(f, 0.0)
-
-    fi_agg = pd.Series(fi_agg).sort_values(ascending=False)
+    # Trainieren und für das Batch-Scoring speichern; die Rate reist mit dem Modell
+    model.fit(X_train, y_train)
+    model.named_steps["rf"].neg_sample_rate_ = neg_sample_rate
+    print("\n Modell gespeichert:", save_model(model, model_path))
 
-    print("\n Aggregierte Feature Importances:")
-    print(fi_agg)
+    print_evaluation("Random Forest", y_test, fraud_proba(model, X_test))
 
+    # Importances pro Quellfeature: Impurity + Permutation auf dem Test-Split, neben dem Modell gespeichert
+    save_importance_report(print_importance_report(model, X_test, y_test), importance_path)
@@ -0,0 +1,64 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import DATA_PATH, CHUNK_SIZE, MODEL_PATH, SCORES_PATH
+from src.etl.artifacts import TableWriter
+from src.etl.extract import extract_transactions_chunked
+from src.etl.transform import transform_chunk
+from src.metrics import instrumented
+from src.randomforest.model_random_forest import MODEL_INPUT_COLS, fraud_proba, load_model
+
+# Batch-Scoring mit dem gespeicherten Random-Forest-Modell: die Rohdaten werden in Chunks gelesen,
+# mit denselben Schritten wie im ETL transformiert und pro Chunk bewertet.
+# Der Speicherbedarf hängt nur von chunksize ab, nicht von der Dateigröße.
+
+
+@instrumented("score")
+def score_transactions(
+    input_path: Path = DATA_PATH,
+    output_path: Path = SCORES_PATH,
+    model_path: Path = MODEL_PATH,
+    chunksize: int = CHUNK_SIZE
+) -> Path:
+    model = load_model(model_path)
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    scored = 0
+    rejected = 0
+    writer = TableWriter(output_path)
+    try:
+        for chunk in extract_transactions_chunked(chunksize, input_path):
+            # Neue Transaktionen haben (noch) kein Fraud_Label
+            clean, rejects, _partials = transform_chunk(chunk, require_label=False)
+            rejected += len(rejects)
+            if clean.empty:
+                continue
+
+            proba = fraud_proba(model, clean[MODEL_INPUT_COLS])
+            writer.write(pd.DataFrame({
+                "Transaction_ID": clean["Transaction_ID"].to_numpy(),
+                "User_ID": clean["User_ID"].to_numpy(),
+                "Fraud_Probability": proba.astype(np.float32),
+            }))
+            scored += len(clean)
+    finally:
+        writer.close()
+
+    print(f"\n Scoring fertig: {scored} Transaktionen bewertet | {rejected} Rejects nicht bewertet -> {output_path}")
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transaktionen mit dem gespeicherten Random Forest bewerten")
+    parser.add_argument("--input", type=Path, default=DATA_PATH)
+    parser.add_argument("--output", type=Path, default=SCORES_PATH)
+    parser.add_argument("--model", type=Path, default=MODEL_PATH)
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    score_transactions(args.input, args.output, args.model, args.chunksize)
@@ -0,0 +1,258 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import MODEL_PATH, COMPACT_MODEL_DIR, SERVE_HOST, SERVE_PORT, SERVE_MAX_BATCH, SERVE_MAX_WAIT_MS
+from src.randomforest.compact import CompactForest
+from src.randomforest.model_random_forest import CATEGORICAL_FEATURES, NUMERIC_FEATURES, fraud_proba, load_model
+
+# Online-Scoring: kleiner asyncio-HTTP-Server um das gespeicherte Random-Forest-Modell.
+#   POST /score  – eine Transaktion (JSON-Objekt) oder eine Liste -> Fraud_Probability
+#   GET  /stats  – Anfragen, Batches, Durchsatz, Latenz p50/p99
+# Anfragen werden zu Micro-Batches gesammelt (höchstens SERVE_MAX_BATCH Zeilen oder
+# SERVE_MAX_WAIT_MS Wartezeit) und gemeinsam bewertet. Das OneHot-Encoding läuft über
+# vorberechnete Lookup-Tabellen direkt in ein float32-Array, ohne DataFrame und ColumnTransformer.
+# Mit --compact wird der kompakte Array-Export (src/randomforest/compact.py) statt der Pipeline geladen.
+
+
+class FeatureEncoder:
+    # Gleiche Spaltenreihenfolge wie der ColumnTransformer: erst OneHot-Blöcke, dann numerische Features
+    def __init__(self, categories: list):
+        self.lookup = {}
+        offset = 0
+        for feature, values in zip(CATEGORICAL_FEATURES, categories):
+            self.lookup[feature] = {str(c): offset + i for i, c in enumerate(values)}
+            offset += len(values)
+        self.numeric_offset = offset
+        self.width = offset + len(NUMERIC_FEATURES)
+
+    @classmethod
+    def from_model(cls, model):
+        # Graph-Features brauchen die Knotenstatistiken des Trainingsgraphen -> nur Batch-Scoring
+        if "graph" in model.named_steps["preprocess"].named_transformers_:
+            raise ValueError("Online-Scoring unterstützt keine Graph-Features (USE_GRAPH_FEATURES)")
+        return cls(model.named_steps["preprocess"].named_transformers_["cat"].categories_)
+
+    @staticmethod
+    def _derive(row: dict) -> dict:
+        # Rohfelder wie im ETL ableiten, falls die abgeleiteten Features fehlen
+        if "Hour" not in row and "Timestamp" in row:
+            row["Hour"] = pd.Timestamp(row["Timestamp"]).hour
+        if "Amount_to_Balance_Ratio" not in row and "Account_Balance" in row:
+            balance = float(row["Account_Balance"])
+            row["Amount_to_Balance_Ratio"] = float(row["Transaction_Amount"]) / balance if balance else 0.0
+        return row
+
+    def encode(self, rows: list[dict]) -> np.ndarray:
+        X = np.zeros((len(rows), self.width), dtype=np.float32)
+        for i, row in enumerate(rows):
+            row = self._derive(row)
+            for feature in CATEGORICAL_FEATURES:
+                # Normalisierung wie im ETL (strip + lower); unbekannte Werte -> alle Spalten 0
+                col = self.lookup[feature].get(str(row.get(feature, "")).strip().lower())
+                if col is not None:
+                    X[i, col] = 1.0
+            for j, feature in enumerate(NUMERIC_FEATURES):
+                X[i, self.numeric_offset + j] = float(row[feature])
+        return X
+
+
+class Stats:
+    def __init__(self, window: int = 10_000):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=window)
+
+    def as_dict(self) -> dict:
+        uptime = time.perf_counter() - self.started
+        lat = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        return {
+            "requests": self.requests,
+            "rows": self.rows,
+            "batches": self.batches,
+            "errors": self.errors,
+            "avg_batch_rows": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "throughput_rows_per_s": round(self.rows / uptime, 1),
+            "latency_ms_p50": round(float(np.percentile(lat, 50)), 3),
+            "latency_ms_p99": round(float(np.percentile(lat, 99)), 3),
+            "uptime_s": round(uptime, 1),
+        }
+
+
+class MicroBatcher:
+    def __init__(self, model, max_batch: int = SERVE_MAX_BATCH, max_wait_ms: float = SERVE_MAX_WAIT_MS):
+        if isinstance(model, CompactForest):
+            self.encoder = FeatureEncoder(model.categories)
+            self.rf = model
+        else:
+            if "rf" not in model.named_steps:
+                raise ValueError("Online-Scoring unterstützt nur das Backend 'random_forest'")
+            self.encoder = FeatureEncoder.from_model(model)
+            self.rf = model.named_steps["rf"]
+            # Kleine Batches: Thread-Pool pro Aufruf kostet mehr, als er bringt
+            self.rf.set_params(n_jobs=1)
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.stats = Stats()
+
+    async def score(self, rows: list[dict]) -> list[float]:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((rows, future))
+        return await future
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            # Auf die erste Anfrage warten, dann bis Batch voll oder Wartezeit um ist
+            items = [await self.queue.get()]
+            n_rows = len(items[0][0])
+            deadline = loop.time() + self.max_wait
+            while n_rows < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                items.append(item)
+                n_rows += len(item[0])
+
+            try:
+                await self._score_batch(loop, items)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Unerwarteter Fehler: offene Anfragen scheitern lassen, die Batch-Schleife läuft weiter
+                for _rows, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _predict(self, rows: list[dict]) -> np.ndarray:
+        return fraud_proba(self.rf, self.encoder.encode(rows))
+
+    async def _score_batch(self, loop, items) -> None:
+        rows = [row for item_rows, _future in items for row in item_rows]
+        try:
+            # Vorhersage im Thread-Pool, damit ein großer Batch die Event-Loop nicht blockiert
+            proba = await loop.run_in_executor(None, self._predict, rows)
+        except Exception:
+            # Eine fehlerhafte Anfrage darf den Batch der anderen nicht verwerfen -> einzeln wiederholen
+            await self._score_individually(loop, items)
+            return
+
+        start = 0
+        for item_rows, future in items:
+            if not future.done():
+                future.set_result(proba[start:start + len(item_rows)].tolist())
+            start += len(item_rows)
+        self.stats.batches += 1
+        self.stats.rows += len(rows)
+
+    async def _score_individually(self, loop, items) -> None:
+        for item_rows, future in items:
+            try:
+                proba = await loop.run_in_executor(None, self._predict, item_rows)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            if not future.done():
+                future.set_result(proba.tolist())
+            self.stats.batches += 1
+            self.stats.rows += len(item_rows)
+
+async def _read_request(reader: asyncio.StreamReader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    method, target, _version = lines[0].split(" ", 2)
+    headers = {k.strip().lower(): v.strip() for k, v in (l.split(":", 1) for l in lines[1:] if ":" in l)}
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return method, target, headers, body
+
+
+def _response(status: str, payload: dict, keep_alive: bool) -> bytes:
+    body = json.dumps(payload).encode()
+    head = (
+        f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode() + body
+
+
+async def _handle(batcher: MicroBatcher, reader, writer) -> None:
+    try:
+        while True:
+            try:
+                method, target, headers, body = await _read_request(reader)
+            except (asyncio.IncompleteReadError, ValueError):
+                break
+            keep_alive = headers.get("connection", "keep-alive").lower() != "close"
+            start = time.perf_counter()
+
+            if method == "GET" and target == "/stats":
+                response = _response("200 OK", batcher.stats.as_dict(), keep_alive)
+            elif method == "POST" and target == "/score":
+                try:
+                    payload = json.loads(body)
+                    rows = payload if isinstance(payload, list) else [payload]
+                    if not all(isinstance(row, dict) for row in rows):
+                        raise TypeError("jede Zeile muss ein JSON-Objekt sein")
+                    proba = await batcher.score(rows)
+                    response = _response("200 OK", {"Fraud_Probability": proba}, keep_alive)
+                    batcher.stats.requests += 1
+                    batcher.stats.latencies.append(time.perf_counter() - start)
+                except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+                    batcher.stats.errors += 1
+                    response = _response("400 Bad Request", {"error": f"{type(e).__name__}: {e}"}, keep_alive)
+                except Exception as e:
+                    batcher.stats.errors += 1
+                    response = _response("500 Internal Server Error", {"error": f"{type(e).__name__}: {e}"}, keep_alive)
+            else:
+                response = _response("404 Not Found", {"error": f"{method} {target}"}, keep_alive)
+
+            writer.write(response)
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+
+
+async def serve(
+    model_path: Path = MODEL_PATH,
+    host: str = SERVE_HOST,
+    port: int = SERVE_PORT,
+    compact_dir: Path | None = None
+) -> None:
+    batcher = MicroBatcher(CompactForest(compact_dir) if compact_dir else load_model(model_path, backend="random_forest"))
+    batch_task = asyncio.create_task(batcher.run())
+    server = await asyncio.start_server(lambda r, w: _handle(batcher, r, w), host, port)
+    print(f"\n Scoring-Server läuft auf http://{host}:{port} (POST /score, GET /stats)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batch_task.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Online-Scoring mit dem gespeicherten Random Forest")
+    parser.add_argument("--model", type=Path, default=MODEL_PATH)
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--compact", type=Path, nargs="?", const=COMPACT_MODEL_DIR,
+                        help="kompakten Array-Export statt der Pipeline laden")
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.model, args.host, args.port, args.compact))
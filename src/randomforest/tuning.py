@@ -0,0 +1,131 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 – aktiviert HalvingGridSearchCV
+from sklearn.model_selection import HalvingGridSearchCV, StratifiedKFold
+
+from src.cache import content_hash
+from src.config import (
+    CLEAN_TRANSACTIONS_PATH,
+    MODEL_PATH,
+    TUNE_DIR,
+    CV_FOLDS,
+    TUNE_JOBS,
+    TUNE_GRID,
+    TUNE_MIN_ESTIMATORS,
+    TUNE_MAX_ESTIMATORS,
+    USE_GRAPH_FEATURES
+)
+from src.metrics import instrumented
+from src.randomforest.model_random_forest import (
+    feature_fingerprint,
+    random_forest,
+    _build_pipeline,
+    _load_xy
+)
+
+# Kreuzvalidierung und Modellauswahl für den Random Forest.
+# FEATURE_COLS werden einmal mit dem OneHotEncoder der Pipeline kodiert und als dichtes float32-Array
+# (.npy) unter TUNE_DIR/<Hash der Eingabe> abgelegt. Die Worker bekommen eine memmap davon
+# (joblib übergibt memmaps als Referenz), statt X pro Fold/Kandidat zu pickeln und neu zu kodieren.
+# Successive Halving: alle Kandidaten aus TUNE_GRID starten mit TUNE_MIN_ESTIMATORS Bäumen,
+# pro Runde bleibt das beste Drittel mit dreimal so vielen Bäumen übrig.
+# Mit USE_GRAPH_FEATURES wird nicht vorab kodiert: die Graph-Features enthalten Labels und würden
+# sonst aus den Validierungs-Folds in die Trainings-Folds lecken -> die ganze Pipeline wird pro Fold gefittet.
+
+
+def encode_features(path: Path = CLEAN_TRANSACTIONS_PATH, directory: Path = TUNE_DIR) -> tuple[np.ndarray, np.ndarray]:
+    # Schlüssel aus Dateiinhalt und Feature-Schema -> erneute Läufe auf gleichen Daten kodieren nicht neu
+    key = f"{content_hash(path, {})[:16]}_{feature_fingerprint()}"
+    target = Path(directory) / key
+    if not (target / "y.npy").exists():
+        X, y = _load_xy(path)
+        if USE_GRAPH_FEATURES:
+            raise ValueError("Graph-Features hängen von den Labels ab und können nicht vorab kodiert werden")
+        encoded = _build_pipeline().named_steps["preprocess"].fit_transform(X)
+        encoded = encoded.toarray() if hasattr(encoded, "toarray") else encoded
+
+        target.mkdir(parents=True, exist_ok=True)
+        np.save(target / "X.npy", np.ascontiguousarray(encoded, dtype=np.float32))
+        # y zuletzt schreiben: existiert y.npy, ist der Eintrag vollständig
+        np.save(target / "y.npy", y.to_numpy(np.int8))
+        print(f"\n Features kodiert: {encoded.shape[0]} x {encoded.shape[1]} -> {target}")
+
+    return np.load(target / "X.npy", mmap_mode="r"), np.load(target / "y.npy", mmap_mode="r")
+
+
+@instrumented("random_forest")
+def tune_random_forest(
+    path: Path = CLEAN_TRANSACTIONS_PATH,
+    grid: dict = TUNE_GRID,
+    folds: int = CV_FOLDS,
+    n_jobs: int = TUNE_JOBS
+) -> dict:
+    # Ein Forest pro Worker (n_jobs=1), parallelisiert wird über Kandidaten x Folds
+    if USE_GRAPH_FEATURES:
+        X, y = _load_xy(path)
+        estimator = _build_pipeline()
+        estimator.named_steps["rf"].set_params(n_jobs=1)
+        prefix = "rf__"
+    else:
+        X, y = encode_features(path)
+        estimator = _build_pipeline().named_steps["rf"].set_params(n_jobs=1)
+        prefix = ""
+
+    search = HalvingGridSearchCV(
+        estimator,
+        {prefix + name: values for name, values in grid.items()},
+        resource=prefix + "n_estimators",
+        min_resources=TUNE_MIN_ESTIMATORS,
+        max_resources=TUNE_MAX_ESTIMATORS,
+        factor=3,
+        cv=StratifiedKFold(folds, shuffle=True, random_state=42),
+        scoring="roc_auc",
+        refit=False,
+        n_jobs=n_jobs,
+        random_state=42
+    )
+
+    start = time.perf_counter()
+    search.fit(X, y)
+    duration = time.perf_counter() - start
+
+    results = pd.DataFrame(search.cv_results_)
+    table = results[["iter", "n_resources", "params", "mean_test_score", "std_test_score", "mean_fit_time"]]
+    print(f"\n === Successive Halving ({folds} Folds, {len(results)} Fits in {search.n_iterations_} Runden, {duration:.1f}s) ===")
+    print(table.sort_values(["iter", "mean_test_score"], ascending=[True, False]).to_string(index=False))
+
+    best = {name.removeprefix(prefix): value for name, value in search.best_params_.items()}
+    best["n_estimators"] = int(best["n_estimators"])
+    best_row = results.iloc[search.best_index_]
+    summary = {
+        "params": best,
+        "roc_auc_mean": float(best_row["mean_test_score"]),
+        "roc_auc_std": float(best_row["std_test_score"]),
+        "folds": folds,
+        "rows": int(len(y)),
+        "duration_s": round(duration, 1),
+    }
+    print(f"\n Beste Parameter: {best} | ROC-AUC {summary['roc_auc_mean']:.4f} ± {summary['roc_auc_std']:.4f}")
+
+    TUNE_DIR.mkdir(parents=True, exist_ok=True)
+    (TUNE_DIR / "best_params.json").write_text(json.dumps(summary, indent=2))
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Random Forest kreuzvalidieren und Hyperparameter wählen")
+    parser.add_argument("--input", type=Path, default=CLEAN_TRANSACTIONS_PATH)
+    parser.add_argument("--folds", type=int, default=CV_FOLDS)
+    parser.add_argument("--jobs", type=int, default=TUNE_JOBS)
+    parser.add_argument("--fit-best", action="store_true", help="Modell mit den besten Parametern trainieren und speichern")
+    args = parser.parse_args()
+
+    summary = tune_random_forest(args.input, TUNE_GRID, args.folds, args.jobs)
+    if args.fit_best:
+        random_forest(args.input, MODEL_PATH, summary["params"])
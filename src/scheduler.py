@@ -0,0 +1,136 @@
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from src.config import MAX_PARALLEL_STAGES
+from src.metrics import instrumented
+
+# Kleiner DAG-Scheduler für die Pipeline-Stages: {Name: (Funktion, [Abhängigkeiten])}.
+# Stages, deren Abhängigkeiten erfolgreich waren, laufen parallel in einem Prozess-Pool
+# (höchstens max_parallel gleichzeitig). Schlägt eine Stage fehl, werden nur die von ihr
+# abhängigen Stages übersprungen, alle anderen laufen weiter.
+
+
+class StageSkipped(Exception):
+    # Von einer Stage geworfen, wenn sie bewusst nicht laufen kann (z.B. optionaler Dienst fehlt):
+    # Status "übersprungen" statt "fehlgeschlagen", ohne Traceback
+    pass
+
+
+def _run_stage(func):
+    # Läuft im Worker-Prozess; Fehler als Text zurückgeben, damit nichts Unpicklebares zurückkommt
+    start = time.perf_counter()
+    try:
+        instrumented("pipeline")(func)()
+        return None, time.perf_counter() - start, None
+    except StageSkipped as e:
+        return None, time.perf_counter() - start, str(e)
+    except Exception:
+        return traceback.format_exc(), time.perf_counter() - start, None
+
+
+def _check_stages(stages: dict) -> None:
+    for name, (_func, deps) in stages.items():
+        unknown = [d for d in deps if d not in stages]
+        if unknown:
+            raise ValueError(f"Stage '{name}' hängt von unbekannten Stages ab: {unknown}")
+
+    # Zyklen erkennen: solange Stages ohne offene Abhängigkeiten entfernen
+    open_deps = {name: set(deps) for name, (_func, deps) in stages.items()}
+    while open_deps:
+        ready = [name for name, deps in open_deps.items() if not deps]
+        if not ready:
+            raise ValueError(f"Zyklische Abhängigkeiten zwischen Stages: {sorted(open_deps)}")
+        for name in ready:
+            del open_deps[name]
+        for deps in open_deps.values():
+            deps.difference_update(ready)
+
+
+def _print_summary(status: dict, durations: dict, wall: float) -> None:
+    print("\n === Pipeline-Status ===")
+    for name, state in status.items():
+        duration = f"{durations[name]:.1f}s" if name in durations else "-"
+        print(f" {name:<16} {state:<14} {duration:>8}")
+    print(f" Gesamtlaufzeit: {wall:.1f}s (Summe der Stages: {sum(durations.values()):.1f}s)")
+
+
+def run_stages(stages: dict, max_parallel: int = MAX_PARALLEL_STAGES) -> dict:
+    _check_stages(stages)
+    status = {name: "wartend" for name in stages}
+    durations = {}
+    start = time.perf_counter()
+
+    def finish(name, error, duration, skipped=None):
+        durations[name] = duration
+        if skipped is not None:
+            status[name] = "übersprungen"
+            print(f"\n [{name}] übersprungen: {skipped}")
+        elif error is None:
+            status[name] = "ok"
+            print(f"\n [{name}] fertig nach {duration:.1f}s")
+        else:
+            status[name] = "fehlgeschlagen"
+            print(f"\n [{name}] fehlgeschlagen nach {duration:.1f}s:\n{error}")
+
+    def runnable():
+        # Stages mit fehlgeschlagenen/übersprungenen Abhängigkeiten überspringen, bereite zurückgeben
+        ready = []
+        for name, (_func, deps) in stages.items():
+            if status[name] != "wartend":
+                continue
+            if any(status[d] in ("fehlgeschlagen", "übersprungen") for d in deps):
+                status[name] = "übersprungen"
+                print(f"\n [{name}] übersprungen (Abhängigkeit fehlgeschlagen oder übersprungen)")
+            elif all(status[d] == "ok" for d in deps):
+                ready.append(name)
+        return ready
+
+    # Ohne Parallelität im eigenen Prozess ausführen (z.B. zum Debuggen)
+    if max_parallel <= 1:
+        while ready := runnable():
+            for name in ready:
+                print(f"\n [{name}] gestartet")
+                status[name] = "läuft"
+                finish(name, *_run_stage(stages[name][0]))
+        _print_summary(status, durations, time.perf_counter() - start)
+        return status
+
+    running = {}
+    started = {}
+    pool = ProcessPoolExecutor(max_workers=max_parallel)
+    try:
+        while True:
+            # runnable() muss vor jedem Einreichen neu laufen, damit Übersprünge weitergereicht werden
+            while len(running) < max_parallel and (ready := runnable()):
+                name = ready[0]
+                print(f"\n [{name}] gestartet")
+                status[name] = "läuft"
+                started[name] = time.perf_counter()
+                try:
+                    future = pool.submit(_run_stage, stages[name][0])
+                except BrokenProcessPool:
+                    # Ein abgestürzter Worker macht den Pool unbrauchbar (seine Stages enden mit Fehler)
+                    # -> neuer Pool für die übrigen Stages
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = ProcessPoolExecutor(max_workers=max_parallel)
+                    future = pool.submit(_run_stage, stages[name][0])
+                running[future] = name
+
+            if not running:
+                break
+
+            done, _pending = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    finish(name, *future.result())
+                except Exception:
+                    # z.B. abgestürzter Worker-Prozess
+                    finish(name, traceback.format_exc(), time.perf_counter() - started[name])
+    finally:
+        pool.shutdown()
+
+    _print_summary(status, durations, time.perf_counter() - start)
+    return status
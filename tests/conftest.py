@@ -0,0 +1,31 @@
+import pytest
+
+import src.bench.generate
+import src.metrics
+
+
+@pytest.fixture(autouse=True)
+def _no_metrics(monkeypatch):
+    # Tests schreiben keine Messwerte nach data/cleaned/metrics.jsonl
+    monkeypatch.setattr(src.metrics, "METRICS_PATH", None)
+
+
+@pytest.fixture(scope="session")
+def raw_csv(tmp_path_factory):
+    # Kleiner synthetischer Datensatz mit erneut gelieferten IDs und fehlerhaften Zeilen
+    # (wenige Tage -> wenige Partitionen im inkrementellen ETL)
+    path = tmp_path_factory.mktemp("raw") / "transactions.csv"
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(src.bench.generate, "DAYS", 7)
+        return src.bench.generate.write_transactions(path, 3_000, duplicate_rate=0.05, dirty_rate=0.02)
+
+
+@pytest.fixture(scope="session")
+def full_etl(raw_csv):
+    # Referenz: kompletter ETL im Speicher -> (clean, rejects, user_aggregation)
+    from src.etl.extract import extract_transactions
+    from src.etl.transform import transform_transactions
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(src.metrics, "METRICS_PATH", None)
+        return transform_transactions(extract_transactions(raw_csv))
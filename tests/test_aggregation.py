@@ -0,0 +1,43 @@
+import pandas as pd
+
+from src.etl.aggregation import aggregate, argmax_by, finalize, merge_partials, partial_aggregate, value_counts_by
+
+SPECS = {
+    "Total_Transactions": ("Transaction_ID", "count"),
+    "Most_Frequent_Location": ("Location", "mode"),
+}
+
+
+def test_argmax_by_breaks_ties_with_smallest_value():
+    df = pd.DataFrame({
+        "User_ID": ["u1", "u1", "u1", "u1", "u2", "u2", "u2"],
+        "Location": ["tokyo", "london", "tokyo", "london", "sydney", "mumbai", "sydney"],
+    })
+    top = argmax_by(value_counts_by(df, "User_ID", "Location"))
+    assert top.to_dict() == {"u1": "london", "u2": "sydney"}
+
+
+def test_merged_mode_ties_resolve_to_smallest_value():
+    # Je Chunk gewinnt ein anderer Wert, zusammen herrscht Gleichstand -> kleinster Wert
+    first = pd.DataFrame({"Transaction_ID": ["t1", "t2"], "User_ID": ["u1", "u1"], "Location": ["tokyo", "tokyo"]})
+    second = pd.DataFrame({"Transaction_ID": ["t3", "t4"], "User_ID": ["u1", "u1"], "Location": ["london", "london"]})
+
+    merged = merge_partials(partial_aggregate(first, "User_ID", SPECS), partial_aggregate(second, "User_ID", SPECS), SPECS)
+    result = finalize(merged, SPECS)
+
+    assert result["Most_Frequent_Location"].tolist() == ["london"]
+    assert result["Total_Transactions"].tolist() == [4]
+    pd.testing.assert_frame_equal(result, aggregate(pd.concat([second, first]), "User_ID", SPECS))
+
+
+def test_mode_with_categorical_column_matches_string_column():
+    df = pd.DataFrame({
+        "Transaction_ID": ["t1", "t2", "t3", "t4"],
+        "User_ID": ["u1", "u1", "u2", "u2"],
+        "Location": ["tokyo", "london", "mumbai", "mumbai"],
+    })
+    categorical = df.assign(Location=pd.Categorical(df["Location"], categories=["tokyo", "mumbai", "london"]))
+
+    expected = aggregate(df, "User_ID", SPECS)
+    actual = aggregate(categorical, "User_ID", SPECS)
+    assert actual["Most_Frequent_Location"].astype(str).tolist() == expected["Most_Frequent_Location"].tolist() == ["london", "mumbai"]
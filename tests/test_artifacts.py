@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+from pyarrow import feather
+
+from src.etl.artifacts import TableWriter
+from src.etl.schema import REJECT_ARROW_TYPES, coerce_numeric_columns
+from src.etl.transform import _split_rejects_and_clean
+
+
+def _rows(**overrides):
+    row = {
+        "Transaction_ID": "tx_1",
+        "User_ID": "user_1",
+        "Timestamp": pd.Timestamp("2023-01-01 10:00", tz="UTC"),
+        "Transaction_Amount": 10.0,
+        "Daily_Transaction_Count": 1,
+        "Failed_Transaction_Count_7d": 0,
+        "Avg_Transaction_Amount_7d": 5.0,
+        "Card_Age": 10,
+        "Transaction_Distance": 1.0,
+        "IP_Address_Flag": 0,
+        "Previous_Fraudulent_Activity": 0,
+        "Is_Weekend": 0,
+        "Fraud_Label": 0,
+    }
+    return pd.DataFrame([row, {**row, "Transaction_ID": "tx_2", **overrides}])
+
+
+def test_feather_rejects_keep_invalid_binary_values(tmp_path):
+    clean, rejects = _split_rejects_and_clean(coerce_numeric_columns(_rows(Is_Weekend=0.5)))
+    assert rejects["Transaction_ID"].tolist() == ["tx_2"]
+
+    path = tmp_path / "rejects.feather"
+    writer = TableWriter(path, types=REJECT_ARROW_TYPES)
+    writer.write(clean.iloc[:0])
+    writer.write(rejects)
+    # Folgender Chunk mit gültigen Integer-Werten wird an dasselbe Schema angeglichen
+    writer.write(_rows().iloc[:1].assign(Transaction_ID="tx_3"))
+    writer.close()
+
+    table = feather.read_table(path).to_pandas()
+    assert table["Transaction_ID"].tolist() == ["tx_2", "tx_3"]
+    assert np.allclose(table["Is_Weekend"], [0.5, 0])
+
+
+def test_feather_clean_uses_declared_types_for_all_null_columns(tmp_path):
+    path = tmp_path / "clean.feather"
+    writer = TableWriter(path)
+    writer.write(pd.DataFrame({"Card_Type": pd.Categorical([None]), "Is_Weekend": np.array([np.nan], dtype="float32")}))
+    writer.write(pd.DataFrame({"Card_Type": pd.Categorical(["visa"]), "Is_Weekend": np.array([1], dtype="int8")}))
+    writer.close()
+
+    table = feather.read_table(path)
+    assert str(table.schema.field("Card_Type").type) == "string"
+    assert str(table.schema.field("Is_Weekend").type) == "int8"
+    assert table.column("Card_Type").to_pylist() == [None, "visa"]
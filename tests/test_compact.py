@@ -0,0 +1,21 @@
+import numpy as np
+
+from src.randomforest.compact import CompactForest, export_compact
+from src.randomforest.model_random_forest import MODEL_INPUT_COLS, TARGET, _build_pipeline
+
+
+def test_compact_forest_matches_sklearn_predict_proba(tmp_path, full_etl):
+    clean = full_etl[0]
+    assert clean["Card_Age"].isna().any()
+
+    model = _build_pipeline(n_estimators=25, n_jobs=1)
+    model.fit(clean[MODEL_INPUT_COLS], clean[TARGET].astype(int))
+    forest = CompactForest(export_compact(model, tmp_path))
+
+    encoded = model.named_steps["preprocess"].transform(clean[MODEL_INPUT_COLS])
+    encoded = encoded.toarray() if hasattr(encoded, "toarray") else encoded
+    expected = model.named_steps["rf"].predict_proba(encoded)
+    actual = forest.predict_proba(encoded)
+
+    assert actual.shape == expected.shape
+    np.testing.assert_allclose(actual, expected, atol=1e-6)
@@ -0,0 +1,34 @@
+import pandas as pd
+
+from src.etl.extract import extract_transactions
+from src.etl.load import load_data
+from src.etl.parallel import transform_transactions_parallel
+from src.main import run_etl_stream
+
+TABLES = {
+    "clean_transactions": ["Transaction_ID"],
+    "rejects": ["Transaction_ID", "Timestamp", "User_ID"],
+    "user_aggregation": ["User_ID"],
+}
+
+
+def _read(directory, name):
+    df = pd.read_csv(directory / f"{name}.csv")
+    return df.sort_values(TABLES[name], na_position="last", kind="stable").reset_index(drop=True)
+
+
+def _assert_same_outputs(expected, actual):
+    for name in TABLES:
+        pd.testing.assert_frame_equal(_read(actual, name), _read(expected, name), obj=name)
+
+
+def test_stream_and_parallel_etl_match_full_etl(tmp_path, raw_csv, full_etl):
+    load_data(*full_etl, tmp_path / "full", "csv")
+    # Zeilen ohne Transaction_ID: im vollen ETL fasst drop_duplicates sie zu einer zusammen
+    assert full_etl[1]["Transaction_ID"].isna().sum() == 1
+
+    run_etl_stream(raw_csv, tmp_path / "stream", 500)
+    _assert_same_outputs(tmp_path / "full", tmp_path / "stream")
+
+    load_data(*transform_transactions_parallel(extract_transactions(raw_csv), workers=2), tmp_path / "parallel", "csv")
+    _assert_same_outputs(tmp_path / "full", tmp_path / "parallel")
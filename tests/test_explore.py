@@ -0,0 +1,16 @@
+import numpy as np
+
+from src.explore.explore import _kde
+
+
+def test_kde_matches_grid_and_integrates_to_one():
+    values = np.random.default_rng(0).normal(5, 1, 50_000)
+    grid, density = _kde(values, points=512)
+
+    assert len(grid) == len(density) == 512
+    step = grid[1] - grid[0]
+    assert abs(grid[np.argmax(density)] - 5) < 0.2
+    assert abs((grid * density).sum() * step - 5) < 0.02
+    assert abs(density.sum() * step - 1) < 1e-6
+    # Maximum der Normalverteilung: 1 / sqrt(2 pi) ~ 0.399
+    assert abs(density.max() - 0.399) < 0.02
@@ -0,0 +1,47 @@
+import pandas as pd
+
+import src.etl.incremental as incremental
+from src.etl.artifacts import read_table
+from src.etl.extract import extract_transactions
+from src.etl.transform import transform_transactions
+
+
+def _sorted(df, key):
+    return df.sort_values(key, kind="stable").reset_index(drop=True)
+
+
+def _use_partitions(monkeypatch, root):
+    monkeypatch.setattr(incremental, "PARTITIONS_DIR", root)
+    monkeypatch.setattr(incremental, "MANIFEST_PATH", root / "_manifest.json")
+    monkeypatch.setattr(incremental, "TX_INDEX_DIR", root / "_txindex")
+    monkeypatch.setattr(incremental, "CLEAN_DIR", root / "clean_transactions")
+    monkeypatch.setattr(incremental, "REJECTS_DIR", root / "rejects")
+    monkeypatch.setattr(incremental, "USER_PARTIALS_DIR", root / "user_partials")
+    monkeypatch.setattr(incremental, "USER_STATE_PATH", root / "_user_state.pkl")
+    monkeypatch.setattr(incremental, "STAGING_DIR", root / "_staging")
+
+
+def test_two_incremental_runs_match_full_etl(tmp_path, monkeypatch, raw_csv):
+    _use_partitions(monkeypatch, tmp_path / "partitions")
+    lines = raw_csv.read_bytes().splitlines(keepends=True)
+    half = len(lines) // 2
+
+    # Zweiter Lauf über die verlängerte Quelle, dazu eine unvollständige letzte Zeile
+    source = tmp_path / "source.csv"
+    source.write_bytes(b"".join(lines[:half]))
+    incremental.run_incremental_etl(tmp_path / "out", "csv", 5_000, source)
+    source.write_bytes(b"".join(lines) + lines[1][:10])
+    incremental.run_incremental_etl(tmp_path / "out", "csv", 5_000, source)
+
+    clean = read_table(tmp_path / "partitions" / "clean_transactions")
+    users = read_table(tmp_path / "out" / "user_aggregation.csv")
+
+    full_clean, _rejects, full_users = transform_transactions(extract_transactions(raw_csv))
+    full_clean.to_csv(tmp_path / "full_clean.csv", index=False)
+    full_users.to_csv(tmp_path / "full_users.csv", index=False)
+    full_clean = pd.read_csv(tmp_path / "full_clean.csv")
+    full_users = pd.read_csv(tmp_path / "full_users.csv")
+
+    assert clean["Transaction_ID"].is_unique
+    pd.testing.assert_frame_equal(_sorted(clean, "Transaction_ID"), _sorted(full_clean, "Transaction_ID"))
+    pd.testing.assert_frame_equal(_sorted(users, "User_ID"), _sorted(full_users, "User_ID"))
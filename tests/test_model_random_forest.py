@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+
+from src.randomforest.model_random_forest import correct_proba, downsample_negatives
+
+
+def test_correct_proba_recovers_base_rate():
+    base = np.array([0.001, 0.03, 0.2, 0.5, 0.9])
+    for rate in (0.05, 0.2, 0.5):
+        # Fraud-Anteil nach dem Downsampling der Nicht-Frauds mit rate
+        sampled = base / (base + rate * (1 - base))
+        np.testing.assert_allclose(correct_proba(sampled, rate), base)
+    np.testing.assert_array_equal(correct_proba(base, 1.0), base)
+
+
+def test_correct_proba_on_downsampled_group_rates():
+    rng = np.random.default_rng(0)
+    rates = {"a": 0.01, "b": 0.05, "c": 0.2}
+    group = pd.Series(rng.choice(list(rates), 400_000))
+    y = pd.Series((rng.random(len(group)) < group.map(rates)).astype(int))
+
+    X, y_sampled = downsample_negatives(group.to_frame("group"), y, rate=0.1)
+    sampled = y_sampled.groupby(X["group"]).mean()
+    corrected = pd.Series(correct_proba(sampled.to_numpy(), 0.1), index=sampled.index)
+
+    for name, rate in rates.items():
+        assert abs(corrected[name] - rate) < 0.15 * rate
@@ -0,0 +1,33 @@
+from neo4j.exceptions import ServiceUnavailable
+
+import src.main as main
+from src.scheduler import run_stages
+
+
+def _ok():
+    pass
+
+
+def _fail():
+    raise RuntimeError("kaputt")
+
+
+def _neo4j_down():
+    raise ServiceUnavailable("Couldn't connect to localhost:7687")
+
+
+def test_neo4j_unavailable_skips_stage_and_dependents(monkeypatch):
+    monkeypatch.setattr(main, "import_transactions_to_neo4j", _neo4j_down)
+    status = run_stages({
+        "etl": (_ok, []),
+        "neo4j": (main.run_neo4j, ["etl"]),
+        "report": (_ok, ["neo4j"]),
+        "explore": (_ok, ["etl"]),
+    }, max_parallel=1)
+    assert status == {"etl": "ok", "neo4j": "übersprungen", "report": "übersprungen", "explore": "ok"}
+
+
+def test_unexpected_neo4j_error_fails_stage(monkeypatch):
+    monkeypatch.setattr(main, "import_transactions_to_neo4j", _fail)
+    status = run_stages({"etl": (_ok, []), "neo4j": (main.run_neo4j, ["etl"])}, max_parallel=1)
+    assert status == {"etl": "ok", "neo4j": "fehlgeschlagen"}
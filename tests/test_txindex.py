@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+from src.etl.txindex import TransactionIndex, hash_ids
+
+
+def _transactions(n, ids, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Transaction_ID": pd.Series([f"tx_{i}" for i in rng.integers(0, ids, n)], dtype="string"),
+        "Timestamp": pd.to_datetime(rng.integers(0, 30 * 86_400, n), unit="s", utc=True),
+    })
+
+
+def _register(index, df, chunk):
+    for start in range(0, len(df), chunk):
+        part = df.iloc[start:start + chunk]
+        index.register(part["Transaction_ID"], part["Timestamp"])
+
+
+def _filter(index, df, chunk):
+    kept = []
+    for start in range(0, len(df), chunk):
+        part = df.iloc[start:start + chunk]
+        kept.append(part[index.filter_batch(part["Transaction_ID"], part["Timestamp"])])
+    return pd.concat(kept)
+
+
+def test_filter_batch_keeps_latest_row_once_across_spills():
+    df = _transactions(5_000, 1_500, seed=0)
+    # Kleiner Puffer -> viele Flushes (Merge mit dem Lauf auf der Platte)
+    index = TransactionIndex(buffer_rows=100)
+    _register(index, df, 700)
+    kept = _filter(index, df, 300)
+
+    latest = df.groupby("Transaction_ID")["Timestamp"].max()
+    assert kept["Transaction_ID"].is_unique
+    assert len(kept) == len(latest)
+    pd.testing.assert_series_equal(kept.set_index("Transaction_ID")["Timestamp"].sort_index(), latest.sort_index())
+
+
+def test_commit_and_reopen_dedups_across_runs(tmp_path):
+    first = _transactions(2_000, 1_000, seed=1)
+    index = TransactionIndex(tmp_path, buffer_rows=128)
+    _register(index, first, 500)
+    loaded = _filter(index, first, 500)
+    index.commit()
+
+    # Zweiter Lauf: erneut gelieferte Zeilen (gleicher Timestamp), neuere Versionen und neue IDs
+    replays = loaded.sample(200, random_state=0)
+    newer = loaded.sample(100, random_state=1).assign(Timestamp=lambda d: d["Timestamp"] + pd.Timedelta(days=60))
+    fresh = _transactions(300, 1_000, seed=2).assign(Transaction_ID=lambda d: "new_" + d["Transaction_ID"])
+    delta = pd.concat([replays, newer, fresh], ignore_index=True)
+
+    index = TransactionIndex(tmp_path, buffer_rows=128)
+    assert len(index.keys) == loaded["Transaction_ID"].nunique()
+    _register(index, delta, 150)
+    assert index.superseded == newer["Transaction_ID"].nunique()
+
+    # Wie im inkrementellen ETL: bisherige Zeilen (Timestamp aus dem Index) vor dem Delta filtern
+    ids = loaded["Transaction_ID"]
+    existing = loaded[index.filter_batch(ids, index.loaded_timestamps(ids))]
+    result = pd.concat([existing, _filter(index, delta, 150)])
+
+    latest = pd.concat([loaded, delta]).groupby("Transaction_ID")["Timestamp"].max()
+    assert result["Transaction_ID"].is_unique
+    pd.testing.assert_series_equal(result.set_index("Transaction_ID")["Timestamp"].sort_index(), latest.sort_index())
+
+    index.commit()
+    reopened = TransactionIndex(tmp_path)
+    assert len(reopened) == len(latest)
+    found, stored = reopened.lookup(hash_ids(pd.Series(latest.index)))
+    assert found.all()
+    assert (stored == pd.DatetimeIndex(latest.to_numpy()).as_unit("ns").asi8).all()
+
+
+def test_bloom_false_positives_are_not_reported_as_known(tmp_path):
+    known = _transactions(2_000, 2_000, seed=3).drop_duplicates("Transaction_ID")
+    # Sehr hohe Fehlerrate -> fast jeder unbekannte Schlüssel passiert den Bloom-Filter
+    index = TransactionIndex(tmp_path, fp_rate=0.9)
+    index.register(known["Transaction_ID"], known["Timestamp"])
+    index.commit()
+
+    index = TransactionIndex(tmp_path, fp_rate=0.9)
+    unknown = pd.Series([f"other_{i}" for i in range(2_000)], dtype="string")
+    keys = hash_ids(unknown)
+    assert index.bloom.might_contain(keys).sum() > 1_000
+
+    found, _stored = index.lookup(keys)
+    assert not found.any()
+    index.register(unknown, pd.Series(pd.Timestamp("2024-01-01", tz="UTC"), index=unknown.index))
+    assert index.superseded == 0
+    assert index.filter_batch(unknown, pd.Series(pd.Timestamp("2024-01-01", tz="UTC"), index=unknown.index)).all()